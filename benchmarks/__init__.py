@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from .generator import (
+    PartFileGenerator,
+)
+
+from .suite import (
+    BENCHMARKS,
+    BenchmarkSuite,
+    get_peak_rss,
+)
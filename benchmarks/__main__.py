@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import argparse
+import json
+import logging
+import sys
+
+from lib import ConfigManager, LavaLogFormatter
+from .generator import PartFileGenerator
+from .suite import BENCHMARKS, BenchmarkSuite
+
+logger = logging.getLogger("benchmarks")
+
+
+def main():
+    """
+    Run the benchmark suite and write its results out as JSON.
+    :return: None
+    """
+    args = parse_arguments()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(LavaLogFormatter())
+    logger.addHandler(stream_handler)
+    logger.setLevel(logging.INFO)
+    generator = PartFileGenerator(
+        seed=args.seed,
+        server_count=args.server_count,
+        vocabulary_size=args.vocabulary_size,
+    )
+    suite = BenchmarkSuite(
+        sizes=args.sizes,
+        file_count=args.file_count,
+        benchmarks=args.benchmarks,
+        generator=generator,
+        work_directory=args.work_directory,
+    )
+    logger.info("Now running %s with %s." % (suite, generator))
+    report = suite.run()
+    if args.output_path is None:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output_path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        logger.info("Benchmark results written to %s." % (args.output_path,))
+
+
+def parse_arguments():
+    """
+    Parse command line arguments and return them.
+    :return: The parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time the lava-hadoop-processing pipeline against synthetic Hadoop part files.",
+    )
+    parser.add_argument(
+        "--sizes",
+        "-s",
+        required=False,
+        help="The total sizes (in megabytes) of the part files to run every benchmark against.",
+        nargs="+",
+        action="store",
+        dest="sizes",
+        type=float,
+        metavar="<1 10 50>",
+        default=ConfigManager.BENCHMARK_SIZES,
+    )
+    parser.add_argument(
+        "--files",
+        required=False,
+        help="The number of part files to split the data for every size across.",
+        action="store",
+        dest="file_count",
+        type=int,
+        metavar="<file count>",
+        default=ConfigManager.BENCHMARK_FILE_COUNT,
+    )
+    parser.add_argument(
+        "--benchmarks",
+        "-b",
+        required=False,
+        help="The benchmarks to run. All of them are run by default.",
+        nargs="+",
+        action="store",
+        dest="benchmarks",
+        type=str,
+        choices=BENCHMARKS,
+        metavar="<benchmark>",
+        default=None,
+    )
+    parser.add_argument(
+        "--servers",
+        required=False,
+        help="The number of distinct server types to generate entries for.",
+        action="store",
+        dest="server_count",
+        type=int,
+        metavar="<server count>",
+        default=ConfigManager.BENCHMARK_SERVER_COUNT,
+    )
+    parser.add_argument(
+        "--vocabulary",
+        required=False,
+        help="The number of distinct URL segments to generate entries for.",
+        action="store",
+        dest="vocabulary_size",
+        type=int,
+        metavar="<vocabulary size>",
+        default=ConfigManager.BENCHMARK_VOCABULARY_SIZE,
+    )
+    parser.add_argument(
+        "--seed",
+        required=False,
+        help="The seed to generate part files with.",
+        action="store",
+        dest="seed",
+        type=int,
+        metavar="<seed>",
+        default=ConfigManager.BENCHMARK_SEED,
+    )
+    parser.add_argument(
+        "--work-directory",
+        required=False,
+        help="The directory to write part files and benchmark output to. A temporary directory is used (and "
+             "removed) by default.",
+        action="store",
+        dest="work_directory",
+        type=str,
+        metavar="<work directory>",
+        default=None,
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        required=False,
+        help="The file to write the JSON results to. Results are written to standard output by default.",
+        action="store",
+        dest="output_path",
+        type=str,
+        metavar="<output file>",
+        default=None,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from bisect import bisect_right
+import os
+import random
+
+from lib import ConfigManager
+from lib.parsing.resultentry import RECORD_ENTRY, RECORD_SEPARATOR, SERVER_NAME_ENTRY, SERVER_PATH_ENTRY
+
+SERVER_TEMPLATES = [
+    ("Apache/2.%s.%s (%s)", (4, 60, ["Ubuntu", "CentOS", "Debian", "Unix", "Win64", "Red Hat"])),
+    ("Apache/2.%s.%s", (4, 60)),
+    ("nginx/1.%s.%s", (26, 12)),
+    ("nginx", ()),
+    ("Microsoft-IIS/%s", (["5.0", "6.0", "7.0", "7.5", "8.0", "8.5", "10.0"],)),
+    ("lighttpd/1.4.%s", (60,)),
+    ("LiteSpeed", ()),
+    ("openresty/1.%s.%s.%s", (22, 8, 4)),
+    ("cloudflare", ()),
+    ("Apache-Coyote/1.%s", (2,)),
+    ("Jetty(9.%s.%s.v2019%s)", (5, 30, 1000)),
+    ("gunicorn/19.%s.%s", (10, 2)),
+    ("Caddy", ()),
+    ("Kestrel", ()),
+    ("AmazonS3", ()),
+    ("gws", ()),
+]
+COMMON_SEGMENTS = [
+    "index.php", "index.html", "wp-admin", "wp-content", "wp-includes", "images", "img", "css", "js", "static",
+    "assets", "uploads", "api", "v1", "v2", "admin", "login", "search", "blog", "news", "about", "contact",
+    "products", "category", "tag", "feed", "rss", "media", "files", "download", "cgi-bin", "includes", "modules",
+    "themes", "plugins", "user", "account", "cart", "checkout", "robots.txt", "favicon.ico", "sitemap.xml",
+    "[[INTEGER]]", "[[HEX]]", "[[UUID]]", "page-[[INTEGER]]", "v[[INTEGER]]", "[[INTEGER]].html",
+]
+SYLLABLES = [
+    "ar", "be", "co", "da", "el", "fo", "ga", "hi", "in", "jo", "ka", "lo", "me", "no", "or", "pa", "qu", "ra",
+    "se", "to", "un", "ve", "wa", "xe", "yo", "ze",
+]
+EXTENSIONS = ["", "", "", ".php", ".html", ".js", ".css", ".aspx", ".jsp", ".png"]
+
+
+class PartFileGenerator(object):
+    """
+    This class writes synthetic Hadoop part files in the format produced by lavalamp's Common Crawl analysis.
+    Files contain records processed (00), server name (01), and server path (02) entries. Server types are
+    drawn from thousands of realistic banners and URL segments from a large vocabulary, both with Zipf
+    distributed popularity, and URL segment counts follow a Zipf distribution as well. A share of the server
+    path entries are wrapped across lines in the same way that URL segments containing newlines are.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            seed=ConfigManager.BENCHMARK_SEED,
+            server_count=ConfigManager.BENCHMARK_SERVER_COUNT,
+            vocabulary_size=ConfigManager.BENCHMARK_VOCABULARY_SIZE,
+            zipf_exponent=ConfigManager.BENCHMARK_ZIPF_EXPONENT,
+            wrap_rate=ConfigManager.BENCHMARK_WRAP_RATE,
+            max_segments_per_server=ConfigManager.BENCHMARK_MAX_SEGMENTS_PER_SERVER,
+    ):
+        self._seed = seed
+        self._random = random.Random(seed)
+        self._zipf_exponent = zipf_exponent
+        self._wrap_rate = wrap_rate
+        self._max_segments_per_server = max_segments_per_server
+        self._server_types = self.__create_server_types(server_count)
+        self._url_segments = self.__create_url_segments(vocabulary_size)
+        self._server_weights = self.get_zipf_weights(len(self._server_types), zipf_exponent)
+        self._segment_weights = self.get_zipf_weights(len(self._url_segments), zipf_exponent)
+
+    # Static Methods
+
+    @staticmethod
+    def get_zipf_weights(size=None, exponent=None):
+        """
+        Get the cumulative weights of a Zipf distribution over the given number of ranks.
+        :param size: The number of ranks.
+        :param exponent: The exponent of the distribution.
+        :return: A list containing the cumulative weight of every rank, starting with the most popular.
+        """
+        cumulative_weights = []
+        total = 0.0
+        for rank in range(1, size + 1):
+            total += 1.0 / rank ** exponent
+            cumulative_weights.append(total)
+        return cumulative_weights
+
+    # Class Methods
+
+    # Public Methods
+
+    def write_part_file(self, file_path=None, target_size=None):
+        """
+        Write a synthetic part file of roughly the given size to the given path.
+        :param file_path: The path to write the part file to.
+        :param target_size: The number of bytes to write. Writing stops at the first server boundary after
+        this many bytes have been written.
+        :return: A dictionary containing the file_path, the number of bytes written, and the entry_count.
+        """
+        rnd = self._random
+        separator = RECORD_SEPARATOR
+        written = 0
+        entry_count = 0
+        with open(file_path, "w") as f:
+            while written < target_size:
+                lines = []
+                if not written or rnd.random() < 0.01:
+                    lines.append("< %s%srecords >\t%s" % (RECORD_ENTRY, separator, rnd.randint(1000, 1000000)))
+                server_type = self._server_types[self.__sample_rank(self._server_weights)]
+                segment_total = 0
+                for _ in range(rnd.randint(1, self._max_segments_per_server)):
+                    rank = self.__sample_rank(self._segment_weights)
+                    url_segment = self._url_segments[rank]
+                    if rnd.random() < self._wrap_rate:
+                        url_segment = self.__wrap_segment(url_segment)
+                    count = self.__get_segment_count(rank)
+                    segment_total += count
+                    lines.append(
+                        "< %s%s%s%s%s >\t%s"
+                        % (SERVER_PATH_ENTRY, separator, server_type, separator, url_segment, count)
+                    )
+                lines.append(
+                    "< %s%s%s >\t%s"
+                    % (SERVER_NAME_ENTRY, separator, server_type, segment_total + rnd.randint(0, segment_total))
+                )
+                contents = "\n".join(lines) + "\n"
+                f.write(contents)
+                written += len(contents)
+                entry_count += len(lines)
+        return {"file_path": file_path, "bytes": written, "entry_count": entry_count}
+
+    def write_part_files(self, directory=None, file_count=None, target_size=None):
+        """
+        Write the given number of synthetic part files (part-00000, part-00001, etc) to the given directory.
+        :param directory: The directory to write the part files to.
+        :param file_count: The number of part files to write.
+        :param target_size: The total number of bytes to write across all of the part files.
+        :return: A list containing the summary of every part file written (see write_part_file).
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        file_size = max(target_size // max(file_count, 1), 1)
+        return [
+            self.write_part_file(
+                file_path=os.path.join(directory, "%s%05d" % (ConfigManager.RESULT_FILE_PREAMBLE, x)),
+                target_size=file_size,
+            )
+            for x in range(file_count)
+        ]
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __create_server_types(self, server_count):
+        """
+        Create the given number of distinct server types from the server banner templates.
+        :param server_count: The number of server types to create.
+        :return: A list of server types in popularity order.
+        """
+        rnd = self._random
+        server_types = []
+        seen = set()
+        attempts = 0
+        while len(server_types) < server_count:
+            attempts += 1
+            template, ranges = SERVER_TEMPLATES[min(int(rnd.expovariate(0.35)), len(SERVER_TEMPLATES) - 1)]
+            values = tuple([rnd.choice(x) if isinstance(x, list) else rnd.randrange(x) for x in ranges])
+            server_type = template % values
+            if server_type in seen:
+                if attempts < server_count * 20:
+                    continue
+                server_type = "%s build-%s" % (server_type, len(server_types))
+            seen.add(server_type)
+            server_types.append(server_type)
+        return server_types
+
+    def __create_url_segments(self, vocabulary_size):
+        """
+        Create the given number of distinct URL segments, starting with common real-world ones.
+        :param vocabulary_size: The number of URL segments to create.
+        :return: A list of URL segments in popularity order.
+        """
+        rnd = self._random
+        url_segments = list(COMMON_SEGMENTS[:vocabulary_size])
+        seen = set(url_segments)
+        while len(url_segments) < vocabulary_size:
+            word = "".join([rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 5))])
+            if rnd.random() < 0.2:
+                word = "%s-%s" % (word, rnd.randint(1, 999))
+            url_segment = word + rnd.choice(EXTENSIONS)
+            if url_segment in seen:
+                continue
+            seen.add(url_segment)
+            url_segments.append(url_segment)
+        return url_segments
+
+    def __get_segment_count(self, rank):
+        """
+        Get a count for the URL segment of the given popularity rank, following a Zipf distribution.
+        :param rank: The zero-based popularity rank of the URL segment.
+        :return: The count of the URL segment.
+        """
+        scale = 100000.0 * self._random.uniform(0.5, 1.5)
+        return max(int(scale / (rank + 1) ** self._zipf_exponent), 1)
+
+    def __sample_rank(self, cumulative_weights):
+        """
+        Sample a zero-based rank from the given cumulative weights.
+        :param cumulative_weights: The cumulative weights to sample from (see get_zipf_weights).
+        :return: The sampled rank.
+        """
+        rank = bisect_right(cumulative_weights, self._random.random() * cumulative_weights[-1])
+        return min(rank, len(cumulative_weights) - 1)
+
+    def __wrap_segment(self, url_segment):
+        """
+        Insert a line break into the given URL segment at a point where it survives the line stripping that
+        reassembles wrapped records.
+        :param url_segment: The URL segment to wrap.
+        :return: The wrapped URL segment, or the URL segment itself if it can not be wrapped.
+        """
+        candidates = [
+            x for x in range(1, len(url_segment))
+            if not url_segment[x - 1].isspace() and not url_segment[x - 1].isdigit() and not url_segment[x].isspace()
+        ]
+        if not candidates:
+            return url_segment
+        index = self._random.choice(candidates)
+        return "%s\n%s" % (url_segment[:index], url_segment[index:])
+
+    # Properties
+
+    @property
+    def seed(self):
+        """
+        Get the seed that this generator's random numbers are drawn from.
+        :return: the seed that this generator's random numbers are drawn from.
+        """
+        return self._seed
+
+    @property
+    def server_types(self):
+        """
+        Get the server types that this generator writes entries for, in popularity order.
+        :return: the server types that this generator writes entries for, in popularity order.
+        """
+        return self._server_types
+
+    @property
+    def url_segments(self):
+        """
+        Get the URL segments that this generator writes entries for, in popularity order.
+        :return: the URL segments that this generator writes entries for, in popularity order.
+        """
+        return self._url_segments
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s servers, %s segments (seed %s)>" % (
+            self.__class__.__name__,
+            len(self._server_types),
+            len(self._url_segments),
+            self.seed,
+        )
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+from lib import CCResultEntry, CCResultFileParser, CCResultParser, ConfigManager, get_peak_rss, HitListParser
+from .generator import PartFileGenerator
+
+logger = logging.getLogger(__name__)
+
+ITER_RAW_RESULTS_BENCHMARK = "iter_raw_results"
+ENTRY_CONSTRUCTION_BENCHMARK = "CCResultEntry"
+PROCESS_FILE_BENCHMARK = "process_file"
+AGGREGATE_FILE_BENCHMARK = "aggregate_file"
+HIT_LISTS_BENCHMARK = "generate_hit_lists_for_all_servers"
+BENCHMARKS = [
+    ITER_RAW_RESULTS_BENCHMARK,
+    ENTRY_CONSTRUCTION_BENCHMARK,
+    PROCESS_FILE_BENCHMARK,
+    AGGREGATE_FILE_BENCHMARK,
+    HIT_LISTS_BENCHMARK,
+]
+
+
+def set_library_log_level(log_level=None):
+    """
+    Set the level of every logger created by the library, so that debug logging does not skew timings.
+    :param log_level: The logging level to apply.
+    :return: None
+    """
+    ConfigManager.LOGGING_LEVEL = log_level
+    for name, library_logger in logging.Logger.manager.loggerDict.items():
+        if isinstance(library_logger, logging.Logger) and name.startswith("lib."):
+            library_logger.setLevel(log_level)
+
+
+def _bench_aggregate_file(data_directory=None, work_directory=None):
+    """
+    Aggregate every part file in the given directory into a single SegmentAggregator.
+    :param data_directory: The directory containing the part files.
+    :param work_directory: A scratch directory (unused).
+    :return: None, so that the entries written to the part files are counted.
+    """
+    results_parser = CCResultParser(data_directory)
+    aggregator = None
+    for file_path in results_parser.get_result_file_paths():
+        aggregator, _ = results_parser.aggregate_file(file_path=file_path, aggregator=aggregator)
+    return None
+
+
+def _bench_entry_construction(data_directory=None, work_directory=None):
+    """
+    Construct a CCResultEntry for every raw entry found in the part files in the given directory. The raw
+    entries are read before timing starts.
+    :param data_directory: The directory containing the part files.
+    :param work_directory: A scratch directory (unused).
+    :return: A tuple containing (1) the number of entries constructed and (2) the number of seconds taken.
+    """
+    raw_entries = []
+    for file_path in CCResultParser(data_directory).get_result_file_paths():
+        raw_entries.extend(CCResultFileParser(file_path).iter_raw_results())
+    start_time = time.time()
+    for raw_entry in raw_entries:
+        CCResultEntry(raw_entry)
+    return len(raw_entries), time.time() - start_time
+
+
+def _bench_hit_lists(data_directory=None, work_directory=None):
+    """
+    Generate hit lists for every server type in results processed from the part files in the given
+    directory. The part files are processed before timing starts.
+    :param data_directory: The directory containing the part files.
+    :param work_directory: A scratch directory to write processed results and hit lists to.
+    :return: A tuple containing (1) the number of URL segments in the processed results, (2) the number of
+    seconds taken, and (3) the size of the processed URL segments files in bytes.
+    """
+    output_directory = os.path.join(work_directory, "processed")
+    CCResultParser(data_directory).aggregate_files_in_directory(output_directory=output_directory)
+    segment_count = 0
+    segment_bytes = 0
+    hit_list_parser = HitListParser(results_directory=output_directory)
+    for server_type in hit_list_parser.get_server_types():
+        file_path = os.path.join(output_directory, server_type, ConfigManager.URL_PATH_FILE_NAME)
+        if os.path.isfile(file_path):
+            segment_bytes += os.path.getsize(file_path)
+            with open(file_path, "r") as f:
+                segment_count += sum([1 for x in f if not x.startswith(ConfigManager.URL_SEGMENTS_HEADER_PREAMBLE)])
+    start_time = time.time()
+    hit_list_parser.generate_hit_lists_for_all_servers()
+    return segment_count, time.time() - start_time, segment_bytes
+
+
+def _bench_iter_raw_results(data_directory=None, work_directory=None):
+    """
+    Read every raw entry from the part files in the given directory.
+    :param data_directory: The directory containing the part files.
+    :param work_directory: A scratch directory (unused).
+    :return: The number of raw entries read.
+    """
+    raw_count = 0
+    for file_path in CCResultParser(data_directory).get_result_file_paths():
+        for _ in CCResultFileParser(file_path).iter_raw_results():
+            raw_count += 1
+    return raw_count
+
+
+def _bench_process_file(data_directory=None, work_directory=None):
+    """
+    Process every part file in the given directory without aggregating, writing results to a scratch
+    directory.
+    :param data_directory: The directory containing the part files.
+    :param work_directory: A scratch directory to write results to.
+    :return: None, so that the entries written to the part files are counted.
+    """
+    results_parser = CCResultParser(data_directory)
+    output_directory = os.path.join(work_directory, "processed")
+    for file_path in results_parser.get_result_file_paths():
+        results_parser.process_file(file_path=file_path, output_directory=output_directory)
+    return None
+
+
+def _run_benchmark_in_worker(worker_args):
+    """
+    Run a single benchmark within a fresh worker process, so that its peak resident set size is measured on
+    its own.
+    :param worker_args: A tuple containing (1) the name of the benchmark, (2) the directory containing the
+    part files, (3) a scratch directory, and (4) the logging level to apply to the library's loggers.
+    :return: A dictionary containing the entries counted, the seconds taken, the bytes read (or None to use
+    the size of the part files), and the peak_rss_mb of the worker.
+    """
+    name, data_directory, work_directory, log_level = worker_args
+    set_library_log_level(log_level)
+    function = BENCHMARK_FUNCTIONS[name]
+    start_time = time.time()
+    result = function(data_directory=data_directory, work_directory=work_directory)
+    elapsed_seconds = time.time() - start_time
+    entries, bytes_read = result, None
+    if isinstance(result, tuple):
+        entries, elapsed_seconds = result[:2]
+        if len(result) > 2:
+            bytes_read = result[2]
+    return {
+        "entries": entries,
+        "seconds": elapsed_seconds,
+        "bytes": bytes_read,
+        "peak_rss_mb": get_peak_rss(),
+    }
+
+
+BENCHMARK_FUNCTIONS = {
+    ITER_RAW_RESULTS_BENCHMARK: _bench_iter_raw_results,
+    ENTRY_CONSTRUCTION_BENCHMARK: _bench_entry_construction,
+    PROCESS_FILE_BENCHMARK: _bench_process_file,
+    AGGREGATE_FILE_BENCHMARK: _bench_aggregate_file,
+    HIT_LISTS_BENCHMARK: _bench_hit_lists,
+}
+
+
+class BenchmarkSuite(object):
+    """
+    This class times the stages of the processing pipeline against synthetic part files of several sizes
+    and reports their throughput. Every benchmark runs in a fresh worker process so that its peak resident
+    set size is measured on its own.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            sizes=ConfigManager.BENCHMARK_SIZES,
+            file_count=ConfigManager.BENCHMARK_FILE_COUNT,
+            benchmarks=None,
+            generator=None,
+            work_directory=None,
+            log_level=logging.WARNING,
+    ):
+        self._sizes = sizes
+        self._file_count = file_count
+        self._benchmarks = benchmarks or list(BENCHMARKS)
+        self._generator = generator or PartFileGenerator()
+        self._work_directory = work_directory
+        self._log_level = log_level
+        for name in self._benchmarks:
+            if name not in BENCHMARKS:
+                raise ValueError("%s is not a valid benchmark." % (name,))
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def run(self):
+        """
+        Generate part files for every size and run every benchmark against them.
+        :return: A dictionary containing the environment that the benchmarks ran in and a list of results,
+        each containing the benchmark name, the data size_mb, the part file count, the entries processed,
+        the seconds taken, the bytes read, entries_per_second, mb_per_second, and peak_rss_mb.
+        """
+        work_directory = self._work_directory or tempfile.mkdtemp(prefix="lava-bench-")
+        results = []
+        try:
+            for size in self.sizes:
+                results.extend(self.__run_size(size=size, work_directory=work_directory))
+        finally:
+            if self._work_directory is None:
+                shutil.rmtree(work_directory, ignore_errors=True)
+        return {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": multiprocessing.cpu_count(),
+            "generator": repr(self.generator),
+            "results": results,
+        }
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __run_benchmark(self, name=None, data_directory=None, work_directory=None):
+        """
+        Run the given benchmark within a fresh worker process.
+        :param name: The name of the benchmark to run.
+        :param data_directory: The directory containing the part files.
+        :param work_directory: A scratch directory for the benchmark, removed once it completes.
+        :return: The result of the benchmark (see _run_benchmark_in_worker).
+        """
+        os.makedirs(work_directory)
+        pool = multiprocessing.Pool(processes=1)
+        try:
+            result = pool.apply(_run_benchmark_in_worker, ((name, data_directory, work_directory, self._log_level),))
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            shutil.rmtree(work_directory, ignore_errors=True)
+        return result
+
+    def __run_size(self, size=None, work_directory=None):
+        """
+        Generate part files of the given total size and run every benchmark against them.
+        :param size: The total size of the part files in megabytes.
+        :param work_directory: The directory to write part files and benchmark output to.
+        :return: A list containing the result of every benchmark.
+        """
+        data_directory = os.path.join(work_directory, "data-%s" % (size,))
+        start_time = time.time()
+        part_files = self.generator.write_part_files(
+            directory=data_directory,
+            file_count=self.file_count,
+            target_size=int(size * 1048576),
+        )
+        data_bytes = sum([x["bytes"] for x in part_files])
+        entry_count = sum([x["entry_count"] for x in part_files])
+        logger.info(
+            "Generated %s part files (%.2f MB, %s entries) in %.2f seconds."
+            % (len(part_files), data_bytes / 1048576.0, entry_count, time.time() - start_time)
+        )
+        results = []
+        for name in self._benchmarks:
+            result = self.__run_benchmark(
+                name=name,
+                data_directory=data_directory,
+                work_directory=os.path.join(work_directory, "%s-%s" % (name, size)),
+            )
+            if result["entries"] is None:
+                result["entries"] = entry_count
+            if result["bytes"] is None:
+                result["bytes"] = data_bytes
+            seconds = result["seconds"] or float("nan")
+            result.update({
+                "benchmark": name,
+                "size_mb": size,
+                "file_count": len(part_files),
+                "entries_per_second": result["entries"] / seconds,
+                "mb_per_second": result["bytes"] / 1048576.0 / seconds,
+            })
+            logger.info(
+                "%s on %s MB: %.2f seconds, %.0f entries/s, %.2f MB/s, %.1f MB peak RSS."
+                % (
+                    name,
+                    size,
+                    result["seconds"],
+                    result["entries_per_second"],
+                    result["mb_per_second"],
+                    result["peak_rss_mb"] or 0.0,
+                )
+            )
+            results.append(result)
+        shutil.rmtree(data_directory, ignore_errors=True)
+        return results
+
+    # Properties
+
+    @property
+    def benchmarks(self):
+        """
+        Get the names of the benchmarks that this suite runs.
+        :return: the names of the benchmarks that this suite runs.
+        """
+        return self._benchmarks
+
+    @property
+    def file_count(self):
+        """
+        Get the number of part files that the data for every size is split across.
+        :return: the number of part files that the data for every size is split across.
+        """
+        return self._file_count
+
+    @property
+    def generator(self):
+        """
+        Get the PartFileGenerator that writes the part files benchmarked against.
+        :return: the PartFileGenerator that writes the part files benchmarked against.
+        """
+        return self._generator
+
+    @property
+    def sizes(self):
+        """
+        Get the total sizes (in megabytes) of the part files that every benchmark is run against.
+        :return: the total sizes (in megabytes) of the part files that every benchmark is run against.
+        """
+        return self._sizes
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s (%s MB)>" % (
+            self.__class__.__name__,
+            ", ".join(self.benchmarks),
+            ", ".join([str(x) for x in self.sizes]),
+        )
@@ -2,8 +2,11 @@
 from __future__ import absolute_import
 
 from .cclogging import (
+    configure_worker_logging,
     get_logger_for_name,
     LavaLogFormatter,
+    QueueLogHandler,
+    QueueLogListener,
 )
 
 from .config import (
@@ -14,4 +17,12 @@ from .lavalamp import (
     LavaUIFactory,
 )
 
+from .metrics import (
+    get_peak_rss,
+    get_run_metrics,
+    PROFILERS,
+    RunMetrics,
+    RunProfiler,
+)
+
 from .parsing import *
@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 
 import logging
+import threading
 
 from .config import ConfigManager
 
@@ -21,6 +22,99 @@ def get_logger_for_name(name):
     return logger
 
 
+def configure_worker_logging(log_queue, log_level=None):
+    """
+    Route all log records emitted in the current (worker) process through the given queue so that
+    a single QueueLogListener in the parent process can write them out.
+    :param log_queue: The multiprocessing queue to send log records through.
+    :param log_level: The logging level to apply to the worker's loggers.
+    :return: None
+    """
+    if log_level is not None:
+        ConfigManager.LOGGING_LEVEL = log_level
+    queue_handler = QueueLogHandler(log_queue)
+    for logger in logging.Logger.manager.loggerDict.values():
+        if not isinstance(logger, logging.Logger):
+            continue
+        if not logger.handlers:
+            continue
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        if log_level is not None:
+            logger.setLevel(log_level)
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    This class handles sending log records to a multiprocessing queue.
+    """
+
+    def __init__(self, log_queue):
+        super(QueueLogHandler, self).__init__()
+        self._log_queue = log_queue
+
+    def emit(self, record):
+        """
+        Send the given record through the queue, flattening it so that it can be pickled.
+        :param record: The record to send.
+        :return: None
+        """
+        try:
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            self._log_queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueLogListener(object):
+    """
+    This class handles pulling log records sent by QueueLogHandler instances off of a queue and
+    passing them to the local logger of the same name.
+    """
+
+    def __init__(self, log_queue):
+        self._log_queue = log_queue
+        self._thread = None
+
+    def start(self):
+        """
+        Start pulling records off of the queue in a background thread.
+        :return: None
+        """
+        self._thread = threading.Thread(target=self.__monitor)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Handle all records remaining in the queue and stop the background thread.
+        :return: None
+        """
+        if self._thread is None:
+            return
+        self._log_queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def __monitor(self):
+        """
+        Pull records off of the queue until the stop sentinel is received.
+        :return: None
+        """
+        while True:
+            record = self._log_queue.get()
+            if record is None:
+                break
+            logger = logging.getLogger(record.name)
+            if logger.isEnabledFor(record.levelno):
+                logger.handle(record)
+
+
 class LavaLogFormatter(logging.Formatter):
     """
     This class handles formatting logs.
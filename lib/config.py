@@ -11,10 +11,76 @@ class ConfigManager(object):
 
     OUTPUT_DIRECTORY = "parsed_results"
     IGNORE_THRESHOLD = 100
-    REPORT_INTERVAL = 100000
+    REPORT_INTERVAL = 10
     SERVER_COUNT_FILE_NAME = "entry_count"
     URL_PATH_FILE_NAME = "url_segments"
+    BINARY_URL_PATH_FILE_NAME = "url_segments.bin"
+    COERCED_PATH_FILE_NAME = "coerced_segments"
+    BINARY_COERCED_PATH_FILE_NAME = "coerced_segments.bin"
     RESULT_FILE_PREAMBLE = "part-"
     HIT_LIST_FILE_PREAMBLE = "hit_list_"
+    COERCED_HIT_LIST_INFIX = "coerced_"
+    STATE_DIRECTORY_NAME = ".lava_state"
+    MANIFEST_FILE_NAME = "manifest.json"
+    CHECKPOINT_INTERVAL = 256 * 1024 * 1024
     LOGGING_LEVEL = logging.DEBUG
     DEFAULT_THRESHOLDS = [50, 75, 90, 95, 99, 99.7, 99.9]
+    HIT_LIST_ENGINE = "auto"
+    INCLUDE_COERCED = False
+    COERCED_HIT_LISTS = False
+    FUSED_PIPELINE = False
+    AGGREGATE_RESULTS = True
+    SERVER_TYPE_GRANULARITY = "exact"
+    FAMILY_ROLLUP = False
+    FAMILY_DIRECTORY_NAME = "_families"
+    UNKNOWN_SERVER_FAMILY = "unknown"
+    SERVER_FAMILY_RULES = [
+        (r"^apache(?![-\w])", "Apache"),
+        (r"^microsoft-iis\b", "Microsoft-IIS"),
+        (r"^nginx\b", "nginx"),
+        (r"^openresty\b", "openresty"),
+        (r"^lighttpd\b", "lighttpd"),
+        (r"^litespeed\b", "LiteSpeed"),
+        (r"^cloudflare", "cloudflare"),
+        (r"^apache-coyote\b", "Apache-Coyote"),
+    ]
+    WORKER_COUNT = 1
+    RANKED_OUTPUT = False
+    URL_SEGMENTS_HEADER_PREAMBLE = "#lava-url-segments"
+    OUTPUT_FORMAT = "text"
+    RESULT_STORE = "files"
+    SQLITE_DATABASE_NAME = "results.sqlite"
+    SQLITE_BATCH_SIZE = 50000
+    USE_MMAP = False
+    MEMORY_LIMIT = 0
+    SPILL_DIRECTORY_PREAMBLE = ".lava_spill-"
+    SPILL_BATCH_SIZE = 1000
+    SPILL_MERGE_FAN_IN = 64
+    SPILL_ENTRY_OVERHEAD = 120
+    READ_BLOCK_SIZE = 4 * 1024 * 1024
+    MAX_RECORD_LENGTH = 1024 * 1024
+    THREADED_DECOMPRESSION = True
+    DECOMPRESSION_QUEUE_DEPTH = 4
+    MAX_OPEN_FILES = 256
+    RESERVED_FILE_HANDLES = 32
+    S3_ENDPOINT_URL = None
+    S3_MAX_CONNECTIONS = 16
+    S3_PART_SIZE = 8 * 1024 * 1024
+    S3_READ_AHEAD = 4
+    S3_MAX_ATTEMPTS = 5
+    WRITE_FLUSH_SIZE = 8 * 1024 * 1024
+    SERVICE_HOST = "127.0.0.1"
+    SERVICE_PORT = 8642
+    SERVICE_CACHE_SIZE = 1024
+    SERVICE_RESPONSE_PREAMBLE = "#lava-hit-list"
+    BENCHMARK_SIZES = [1, 10, 50]
+    BENCHMARK_FILE_COUNT = 4
+    BENCHMARK_SEED = 1
+    BENCHMARK_SERVER_COUNT = 2000
+    BENCHMARK_VOCABULARY_SIZE = 50000
+    BENCHMARK_ZIPF_EXPONENT = 1.1
+    BENCHMARK_WRAP_RATE = 0.01
+    BENCHMARK_MAX_SEGMENTS_PER_SERVER = 200
+    PROFILE_TOP_COUNT = 25
+    PROFILE_DUMP_SUFFIX = ".prof"
+    METRICS_FILE_NAME = "lava-metrics.json"
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+import cProfile
+import json
+import pstats
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from .cclogging import get_logger_for_name
+from .config import ConfigManager
+
+logger = get_logger_for_name(__name__)
+
+CPROFILE_PROFILER = "cprofile"
+TRACEMALLOC_PROFILER = "tracemalloc"
+PROFILERS = [CPROFILE_PROFILER, TRACEMALLOC_PROFILER]
+
+
+def get_peak_rss(children=False):
+    """
+    Get the peak resident set size of the current process or of its finished child processes.
+    :param children: Whether to get the largest peak resident set size of the child processes that have
+    been waited for, instead of that of the current process.
+    :return: The peak resident set size in megabytes, or None if it can not be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_rss / 1048576.0
+    return peak_rss / 1024.0
+
+
+def get_run_metrics():
+    """
+    Get the RunMetrics that the current process records its metrics to.
+    :return: The RunMetrics for the current process.
+    """
+    return _run_metrics
+
+
+class RunMetrics(object):
+    """
+    This class collects metrics about a single invocation: the time spent in every stage, what happened to
+    every results file, the number of URL segments written for every server type, and the time taken to
+    generate hit lists for every server type. Metrics are recorded once per file, flush, stage, or server
+    type rather than once per entry, so collecting them does not slow down processing.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self):
+        self._start_time = time.time()
+        self._stages = {}
+        self._stage_order = []
+        self._files = []
+        self._segments_written = {}
+        self._hit_lists = []
+        self._counters = {}
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def add_file(self, file_metrics=None):
+        """
+        Add the metrics of a results file that were recorded in another process (see record_file).
+        :param file_metrics: The dictionary of metrics recorded for the file.
+        :return: None
+        """
+        self._files.append(file_metrics)
+
+    def get_report(self, interrupted=False):
+        """
+        Get a report of every metric collected so far.
+        :param interrupted: Whether or not the invocation was interrupted before it finished.
+        :return: A dictionary containing the elapsed_seconds, the timings of every stage, per-file metrics and
+        their totals, the URL segments written for every server type, hit list timings, counters, and peak
+        memory usage.
+        """
+        totals = {}
+        for key in ["records_read", "entries_parsed", "entries_ignored", "invalid_entries", "bad_records",
+                    "bytes_read", "seconds"]:
+            totals[key] = sum([x[key] for x in self._files])
+        totals["files"] = len(self._files)
+        totals["mb_per_second"] = totals["bytes_read"] / 1048576.0 / totals["seconds"] if totals["seconds"] else 0.0
+        segments_written = sorted(self._segments_written.items(), key=lambda x: x[1], reverse=True)
+        return {
+            "interrupted": interrupted,
+            "elapsed_seconds": time.time() - self._start_time,
+            "stages": [dict(self._stages[x], stage=x) for x in self._stage_order],
+            "files": self._files,
+            "file_totals": totals,
+            "segments_written": {
+                "total": sum([x[1] for x in segments_written]),
+                "server_types": len(segments_written),
+                "by_server_type": [{"server_type": x, "segments": y} for x, y in segments_written],
+            },
+            "hit_lists": self._hit_lists,
+            "counters": self._counters,
+            "peak_rss_mb": get_peak_rss(),
+            "peak_worker_rss_mb": get_peak_rss(children=True),
+        }
+
+    def increment(self, name=None, value=1):
+        """
+        Add the given value to the given counter.
+        :param name: The name of the counter.
+        :param value: The value to add.
+        :return: None
+        """
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def record_file(self, file_parser=None, stage=None, processed_count=0, ignored_count=0):
+        """
+        Record the metrics of a results file once it has been read.
+        :param file_parser: The CCResultFileParser that the results file was read with.
+        :param stage: The name of the stage that the file was read in (ex: aggregate).
+        :param processed_count: The number of entries that were processed.
+        :param ignored_count: The number of entries that were ignored for falling below the ignore threshold.
+        :return: The dictionary of metrics recorded for the file.
+        """
+        file_metrics = {
+            "file_path": file_parser.file_path,
+            "stage": stage,
+            "compression": file_parser.compression,
+            "records_read": file_parser.record_count,
+            "entries_parsed": processed_count,
+            "entries_ignored": ignored_count,
+            "invalid_entries": file_parser.invalid_entry_count,
+            "bad_records": file_parser.bad_record_count,
+            "bytes_read": file_parser.bytes_read,
+            "seconds": file_parser.elapsed_seconds,
+            "mb_per_second": file_parser.throughput,
+        }
+        self._files.append(file_metrics)
+        return file_metrics
+
+    def record_hit_lists(self, summaries=None):
+        """
+        Record the summaries of the hit lists generated for a number of server types.
+        :param summaries: A list containing the summary of the hit lists generated for every server type (see
+        HitListParser.generate_hit_lists_for_server).
+        :return: None
+        """
+        for summary in summaries:
+            self._hit_lists.append({
+                "server_type": summary["server_type"],
+                "hits_count": summary["hits_count"],
+                "largest_cutoff": max(list(summary["cutoffs"].values()) + [0]),
+                "seconds": summary["elapsed_seconds"],
+            })
+
+    def record_segments_written(self, server_type=None, segment_count=None):
+        """
+        Record that the given number of URL segments were written for the given server type.
+        :param server_type: The server type that URL segments were written for.
+        :param segment_count: The number of URL segments written.
+        :return: None
+        """
+        self._segments_written[server_type] = self._segments_written.get(server_type, 0) + segment_count
+
+    @contextmanager
+    def stage(self, name=None):
+        """
+        Time the code run within the returned context as the given stage. Stages that are entered more than
+        once accumulate their time.
+        :param name: The name of the stage.
+        :return: A context manager that times the stage.
+        """
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = {"seconds": 0.0, "calls": 0}
+            self._stage_order.append(name)
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            stage["seconds"] += time.time() - start_time
+            stage["calls"] += 1
+
+    def write_report(self, file_path=None, interrupted=False, profiler=None):
+        """
+        Write a report of every metric collected so far to the given file as JSON.
+        :param file_path: The path to write the report to.
+        :param interrupted: Whether or not the invocation was interrupted before it finished.
+        :param profiler: The RunProfiler whose report should be included, or None.
+        :return: None
+        """
+        report = self.get_report(interrupted=interrupted)
+        if profiler is not None:
+            report["profile"] = profiler.get_report()
+        with open(file_path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    @property
+    def files(self):
+        """
+        Get the metrics recorded for every results file.
+        :return: the metrics recorded for every results file.
+        """
+        return self._files
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s stages, %s files>" % (self.__class__.__name__, len(self._stages), len(self._files))
+
+
+class RunProfiler(object):
+    """
+    This class captures either a cProfile profile or tracemalloc allocation statistics for the current
+    process while it is running. Worker processes are not profiled.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, profiler=CPROFILE_PROFILER, top_count=ConfigManager.PROFILE_TOP_COUNT):
+        if profiler not in PROFILERS:
+            raise ValueError("%s is not a valid profiler." % (profiler,))
+        if profiler == TRACEMALLOC_PROFILER and tracemalloc is None:
+            raise ImportError("tracemalloc is required to use the %s profiler." % (profiler,))
+        self._profiler = profiler
+        self._top_count = top_count
+        self._profile = None
+        self._snapshot = None
+        self._traced_memory = None
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def dump(self, file_path=None):
+        """
+        Write the raw cProfile statistics to the given file so that they can be loaded with pstats.
+        :param file_path: The path to write the statistics to.
+        :return: None
+        """
+        if self._profile is not None:
+            self._profile.dump_stats(file_path)
+            logger.debug("Profile statistics written to %s." % (file_path,))
+
+    def get_report(self):
+        """
+        Get a report of the captured profile.
+        :return: A dictionary containing the profiler and the functions with the most cumulative time (for
+        cProfile) or the lines that allocated the most memory along with the current and peak traced memory
+        (for tracemalloc).
+        """
+        if self.profiler == CPROFILE_PROFILER:
+            if self._profile is None:
+                return {"profiler": self.profiler, "functions": []}
+            stats = pstats.Stats(self._profile).stats
+            functions = sorted(stats.items(), key=lambda x: x[1][3], reverse=True)[:self.top_count]
+            return {
+                "profiler": self.profiler,
+                "functions": [
+                    {
+                        "function": "%s:%s(%s)" % key,
+                        "calls": calls,
+                        "total_seconds": total_seconds,
+                        "cumulative_seconds": cumulative_seconds,
+                    }
+                    for key, (_, calls, total_seconds, cumulative_seconds, _) in functions
+                ],
+            }
+        if self._snapshot is None:
+            return {"profiler": self.profiler, "allocations": []}
+        current, peak = self._traced_memory
+        return {
+            "profiler": self.profiler,
+            "traced_mb": current / 1048576.0,
+            "peak_traced_mb": peak / 1048576.0,
+            "allocations": [
+                {"location": str(x.traceback), "size_mb": x.size / 1048576.0, "count": x.count}
+                for x in self._snapshot.statistics("lineno")[:self.top_count]
+            ],
+        }
+
+    def start(self):
+        """
+        Start capturing.
+        :return: None
+        """
+        if self.profiler == CPROFILE_PROFILER:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            tracemalloc.start()
+
+    def stop(self):
+        """
+        Stop capturing.
+        :return: None
+        """
+        if self.profiler == CPROFILE_PROFILER:
+            self._profile.disable()
+        else:
+            self._traced_memory = tracemalloc.get_traced_memory()
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    @property
+    def profiler(self):
+        """
+        Get the profiler that this instance captures with.
+        :return: the profiler that this instance captures with.
+        """
+        return self._profiler
+
+    @property
+    def top_count(self):
+        """
+        Get the number of functions or allocation sites to include in reports.
+        :return: the number of functions or allocation sites to include in reports.
+        """
+        return self._top_count
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s>" % (self.__class__.__name__, self.profiler)
+
+
+_run_metrics = RunMetrics()
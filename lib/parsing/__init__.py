@@ -1,19 +1,114 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+from .aggregator import (
+    SegmentAggregator,
+)
+
+from .binarysegments import (
+    BINARY_FORMAT,
+    BinarySegmentFile,
+    convert_segments_file,
+    convert_segments_in_directory,
+    InvalidSegmentFileError,
+    OUTPUT_FORMATS,
+    pack_binary_segments,
+    read_text_segments,
+    TEXT_FORMAT,
+    unpack_binary_segments,
+)
+
+from .compression import (
+    Bz2StreamReader,
+    detect_compression,
+    open_decompressed_stream,
+    ThreadedBlockReader,
+    UnsupportedCompressionError,
+    ZlibStreamReader,
+)
+
+from .coverageindex import (
+    CoverageIndex,
+)
+
+from .externalaggregator import (
+    ExternalSegmentAggregator,
+)
+
 from .hitlist import (
     HitListParser,
 )
 
+from .hitlistservice import (
+    HitListService,
+)
+
+from .manifest import (
+    ProcessingManifest,
+)
+
+from .objectstore import (
+    get_location_size,
+    get_object_store,
+    is_object_url,
+    OBJECT_URL_PREFIX,
+    parse_object_url,
+    S3ObjectReader,
+    S3ObjectStore,
+)
+
 from .parser import (
     CCResultParser,
 )
 
+from .progress import (
+    format_duration,
+    ProgressCounter,
+    ProgressReporter,
+)
+
 from .resultentry import (
     CCResultEntry,
+    decode_raw_entry,
     InvalidEntryError,
 )
 
 from .resultfile import (
     CCResultFileParser,
 )
+
+from .segmentfile import (
+    COERCED_REGEX,
+    format_segments_header,
+    is_coerced_segment,
+    parse_segments_header,
+    split_coerced_segments,
+)
+
+from .segmenttable import (
+    SegmentTable,
+)
+
+from .servertype import (
+    EXACT_GRANULARITY,
+    FAMILY_GRANULARITY,
+    GRANULARITIES,
+    ServerTypeCanonicalizer,
+    VERSION_GRANULARITY,
+)
+
+from .sqlitestore import (
+    FILES_STORE,
+    SQLITE_STORE,
+    SQLiteResultStore,
+    STORES,
+)
+
+from .workers import (
+    get_worker_progress_counter,
+    initialize_worker,
+)
+
+from .writer import (
+    ServerFileWriterPool,
+)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+try:
+    from sys import intern
+except ImportError:
+    pass
+
+from ..cclogging import get_logger_for_name
+
+logger = get_logger_for_name(__name__)
+
+
+class SegmentAggregator(object):
+    """
+    This class aggregates server and URL segment counts across any number of lavalamp Common Crawl
+    results files so that counts for the same key are summed before any thresholds are applied.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self):
+        self._server_counts = {}
+        self._segment_counts = {}
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def add_segment_count(self, server_type=None, url_segment=None, count=None):
+        """
+        Add the given count to the running total for the given URL segment of the given server type.
+        :param server_type: The server type that the URL segment was found for.
+        :param url_segment: The URL segment.
+        :param count: The number of times that the URL segment was seen.
+        :return: None
+        """
+        segments = self._segment_counts.get(server_type)
+        if segments is None:
+            segments = self._segment_counts[intern(server_type)] = {}
+        if url_segment in segments:
+            segments[url_segment] += count
+        else:
+            segments[intern(url_segment)] = count
+
+    def add_server_count(self, server_type=None, count=None):
+        """
+        Add the given count to the running total for the given server type.
+        :param server_type: The server type.
+        :param count: The number of times that the server type was seen.
+        :return: None
+        """
+        if server_type in self._server_counts:
+            self._server_counts[server_type] += count
+        else:
+            self._server_counts[intern(server_type)] = count
+
+    def group_by(self, key_function=None, keys=None):
+        """
+        Create a new aggregator holding the counts of this aggregator merged by the given function of their
+        server types (ex: to roll server types up into server families).
+        :param key_function: A function mapping a server type to the server type to merge its counts into.
+        :param keys: The merged server types to include, or None to include all of them.
+        :return: A new SegmentAggregator holding the merged counts.
+        """
+        grouped = SegmentAggregator()
+        for server_type, count in self._server_counts.items():
+            key = key_function(server_type)
+            if keys is None or key in keys:
+                grouped.add_server_count(server_type=key, count=count)
+        for server_type, segments in self._segment_counts.items():
+            key = key_function(server_type)
+            if keys is not None and key not in keys:
+                continue
+            add_segment_count = grouped.add_segment_count
+            for url_segment, count in segments.items():
+                add_segment_count(key, url_segment, count)
+        return grouped
+
+    def iter_servers(self, ignore_threshold=0):
+        """
+        Iterate over the aggregated results for every server type, applying the given ignore threshold
+        to the merged counts.
+        :param ignore_threshold: The minimum merged count that a server type or URL segment must have
+        to be included.
+        :return: A generator yielding tuples containing (1) the server type, (2) the total count for the
+        server type or None if it fell below the threshold, and (3) a list of (URL segment, count) tuples
+        sorted by URL segment.
+        """
+        server_types = set(self._server_counts.keys())
+        server_types.update(self._segment_counts.keys())
+        for server_type in sorted(server_types):
+            total_count = self._server_counts.get(server_type)
+            if total_count is not None and total_count < ignore_threshold:
+                total_count = None
+            segments = self._segment_counts.get(server_type, {})
+            url_segments = sorted(
+                [(url_segment, count) for url_segment, count in segments.items() if count >= ignore_threshold]
+            )
+            if total_count is None and not url_segments:
+                continue
+            yield server_type, total_count, url_segments
+
+    def merge(self, other):
+        """
+        Merge the counts held by the given aggregator into this aggregator.
+        :param other: The SegmentAggregator to merge in.
+        :return: None
+        """
+        for server_type, count in other._server_counts.items():
+            self.add_server_count(server_type=server_type, count=count)
+        for server_type, segments in other._segment_counts.items():
+            own_segments = self._segment_counts.get(server_type)
+            if own_segments is None:
+                own_segments = self._segment_counts[intern(server_type)] = {}
+            for url_segment, count in segments.items():
+                if url_segment in own_segments:
+                    own_segments[url_segment] += count
+                else:
+                    own_segments[intern(url_segment)] = count
+
+    def subtract(self, other):
+        """
+        Remove the counts held by the given aggregator from this aggregator. Keys whose counts drop to zero
+        are removed entirely.
+        :param other: The SegmentAggregator whose counts should be removed.
+        :return: None
+        """
+        for server_type, count in other._server_counts.items():
+            if server_type not in self._server_counts:
+                continue
+            self._server_counts[server_type] -= count
+            if self._server_counts[server_type] <= 0:
+                del self._server_counts[server_type]
+        for server_type, segments in other._segment_counts.items():
+            own_segments = self._segment_counts.get(server_type)
+            if own_segments is None:
+                continue
+            for url_segment, count in segments.items():
+                if url_segment not in own_segments:
+                    continue
+                own_segments[url_segment] -= count
+                if own_segments[url_segment] <= 0:
+                    del own_segments[url_segment]
+            if not own_segments:
+                del self._segment_counts[server_type]
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    @property
+    def segment_count(self):
+        """
+        Get the number of distinct (server type, URL segment) pairs held by this aggregator.
+        :return: the number of distinct (server type, URL segment) pairs held by this aggregator.
+        """
+        return sum([len(x) for x in self._segment_counts.values()])
+
+    @property
+    def server_count(self):
+        """
+        Get the number of distinct server types held by this aggregator.
+        :return: the number of distinct server types held by this aggregator.
+        """
+        return len(self.server_types)
+
+    @property
+    def server_types(self):
+        """
+        Get the set of server types held by this aggregator.
+        :return: the set of server types held by this aggregator.
+        """
+        return set(self._server_counts.keys()) | set(self._segment_counts.keys())
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s servers, %s segments>" % (
+            self.__class__.__name__,
+            self.server_count,
+            self.segment_count,
+        )
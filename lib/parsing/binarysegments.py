@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from array import array
+import mmap
+import os
+import struct
+import sys
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+from .segmentfile import format_segments_header, parse_segments_header
+
+logger = get_logger_for_name(__name__)
+
+TEXT_FORMAT = "text"
+BINARY_FORMAT = "binary"
+OUTPUT_FORMATS = [TEXT_FORMAT, BINARY_FORMAT]
+
+BINARY_SEGMENTS_MAGIC = b"LAVASEG1"
+BINARY_SEGMENTS_VERSION = 1
+SORTED_FLAG = 0x1
+EXCLUDES_COERCED_FLAG = 0x2
+
+# Magic, version, flags, segment count, total count, offset index position, string table position.
+HEADER_STRUCT = struct.Struct("<8sIIqqqq")
+COUNT_STRUCT = struct.Struct("<q")
+
+# Python 2's array module has no "q" typecode, but its "l" is 64 bits wide on the platforms lavalamp runs on.
+try:
+    INT64_TYPECODE = array("q").typecode
+except ValueError:
+    INT64_TYPECODE = "l"
+
+# URL segments are native strings, which are already UTF-8 encoded bytes on Python 2.
+SEGMENTS_ARE_UNICODE = str is not bytes
+
+
+class InvalidSegmentFileError(Exception):
+    """
+    This is an exception for denoting that a binary url_segments file is malformed.
+    """
+
+
+def pack_binary_segments(url_segments=None, is_sorted=False, excludes_coerced=False):
+    """
+    Pack the given URL segments into the binary url_segments layout. The layout consists of a fixed header
+    holding the segment count, the sum of all segment counts, and the positions of the sections that follow,
+    then an array of little-endian 64-bit counts, an index of segment_count + 1 little-endian 64-bit offsets
+    into the string table, and finally the string table of UTF-8 encoded URL segments.
+    :param url_segments: A list of (URL segment, count) tuples, in the order that they should be stored.
+    :param is_sorted: Whether or not the URL segments are sorted by descending count.
+    :param excludes_coerced: Whether or not URL segments that contain coerced values were split out of the
+    given URL segments (see split_coerced_segments).
+    :return: The packed contents of the binary url_segments file.
+    """
+    counts = array(INT64_TYPECODE, [x[1] for x in url_segments])
+    if SEGMENTS_ARE_UNICODE:
+        encoded_segments = [x[0].encode("utf-8") for x in url_segments]
+    else:
+        encoded_segments = [x[0] for x in url_segments]
+    offsets = array(INT64_TYPECODE, [0])
+    position = 0
+    for encoded_segment in encoded_segments:
+        position += len(encoded_segment)
+        offsets.append(position)
+    if sys.byteorder != "little":
+        counts.byteswap()
+        offsets.byteswap()
+    segment_count = len(url_segments)
+    offsets_position = HEADER_STRUCT.size + COUNT_STRUCT.size * segment_count
+    strings_position = offsets_position + COUNT_STRUCT.size * (segment_count + 1)
+    header = HEADER_STRUCT.pack(
+        BINARY_SEGMENTS_MAGIC,
+        BINARY_SEGMENTS_VERSION,
+        (SORTED_FLAG if is_sorted else 0) | (EXCLUDES_COERCED_FLAG if excludes_coerced else 0),
+        segment_count,
+        sum([x[1] for x in url_segments]),
+        offsets_position,
+        strings_position,
+    )
+    return b"".join([header, _array_to_bytes(counts), _array_to_bytes(offsets)] + encoded_segments)
+
+
+def convert_segments_file(server_directory=None, to_format=BINARY_FORMAT):
+    """
+    Convert the url_segments and coerced_segments files found in the given server type directory to the
+    given format. The files in the other format are left in place, and the order of the URL segments and
+    the flags in their headers are preserved.
+    :param server_directory: The server type directory containing the files to convert.
+    :param to_format: The format to convert to (one of OUTPUT_FORMATS).
+    :return: Whether or not a url_segments file was found and converted.
+    """
+    if to_format not in OUTPUT_FORMATS:
+        raise ValueError("%s is not a valid url_segments format." % (to_format,))
+    file_names = [
+        (ConfigManager.URL_PATH_FILE_NAME, ConfigManager.BINARY_URL_PATH_FILE_NAME),
+        (ConfigManager.COERCED_PATH_FILE_NAME, ConfigManager.BINARY_COERCED_PATH_FILE_NAME),
+    ]
+    converted = []
+    for text_file_name, binary_file_name in file_names:
+        text_path = os.path.join(server_directory, text_file_name)
+        binary_path = os.path.join(server_directory, binary_file_name)
+        if to_format == BINARY_FORMAT:
+            converted.append(_convert_text_to_binary(text_path=text_path, binary_path=binary_path))
+        else:
+            converted.append(_convert_binary_to_text(binary_path=binary_path, text_path=text_path))
+    return converted[0]
+
+
+def convert_segments_in_directory(results_directory=ConfigManager.OUTPUT_DIRECTORY, to_format=BINARY_FORMAT):
+    """
+    Convert the url_segments files of every server type found in the given directory to the given format.
+    :param results_directory: The directory containing the processed results of a Common Crawl analysis.
+    :param to_format: The format to convert to (one of OUTPUT_FORMATS).
+    :return: The number of url_segments files that were converted.
+    """
+    converted_count = 0
+    for server_type in sorted(os.listdir(results_directory)):
+        server_directory = os.path.join(results_directory, server_type)
+        if not os.path.isdir(server_directory):
+            continue
+        if convert_segments_file(server_directory=server_directory, to_format=to_format):
+            converted_count += 1
+    logger.debug(
+        "Converted %s url_segments files in %s to %s."
+        % (converted_count, results_directory, to_format)
+    )
+    return converted_count
+
+
+def unpack_binary_segments(contents=None, position=0):
+    """
+    Unpack the URL segments packed into the given contents at the given position (see pack_binary_segments).
+    Packed URL segments can be concatenated, in which case the returned position is where the next ones start.
+    :param contents: The bytes holding the packed URL segments.
+    :param position: The position in the contents that the packed URL segments start at.
+    :return: A tuple containing (1) a list of (URL segment, count) tuples in stored order and (2) the position
+    in the contents immediately after the packed URL segments.
+    """
+    if len(contents) < position + HEADER_STRUCT.size:
+        raise InvalidSegmentFileError("The packed URL segments at position %s are truncated." % (position,))
+    (
+        magic,
+        version,
+        _,
+        segment_count,
+        _,
+        offsets_position,
+        strings_position,
+    ) = HEADER_STRUCT.unpack_from(contents, position)
+    if magic != BINARY_SEGMENTS_MAGIC or version != BINARY_SEGMENTS_VERSION:
+        raise InvalidSegmentFileError("No packed URL segments were found at position %s." % (position,))
+    strings_start = position + strings_position
+    if strings_start > len(contents):
+        raise InvalidSegmentFileError("The packed URL segments at position %s are truncated." % (position,))
+    counts = _bytes_to_array(contents[position + HEADER_STRUCT.size:position + offsets_position])
+    offsets = _bytes_to_array(contents[position + offsets_position:strings_start])
+    end = strings_start + offsets[-1]
+    if end > len(contents):
+        raise InvalidSegmentFileError("The packed URL segments at position %s are truncated." % (position,))
+    url_segments = [contents[strings_start + offsets[x]:strings_start + offsets[x + 1]] for x in range(segment_count)]
+    if SEGMENTS_ARE_UNICODE:
+        url_segments = [x.decode("utf-8") for x in url_segments]
+    return list(zip(url_segments, counts)), end
+
+
+def read_text_segments(file_path=None):
+    """
+    Read all of the URL segments found in the given text url_segments file.
+    :param file_path: The path to the text url_segments file.
+    :return: A tuple containing (1) a list of (URL segment, count) tuples in file order and (2) the file's
+    parsed header (see parse_segments_header), or None if the file does not have one.
+    """
+    url_segments = []
+    file_header = None
+    with open(file_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            header = parse_segments_header(line)
+            if header is not None:
+                file_header = header
+                continue
+            url_segment, segment_count = line.split("\t")
+            url_segments.append((url_segment, int(segment_count)))
+    return url_segments, file_header
+
+
+def _array_to_bytes(values):
+    """
+    Get the raw contents of the given array.
+    :param values: The array to get the contents of.
+    :return: The raw contents of the array.
+    """
+    if hasattr(values, "tobytes"):
+        return values.tobytes()
+    return values.tostring()
+
+
+def _bytes_to_array(contents):
+    """
+    Get an array of the little-endian 64-bit integers stored in the given bytes.
+    :param contents: The bytes to read integers from.
+    :return: An array of the integers.
+    """
+    values = array(INT64_TYPECODE)
+    if hasattr(values, "frombytes"):
+        values.frombytes(contents)
+    else:
+        values.fromstring(contents)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _convert_binary_to_text(binary_path=None, text_path=None):
+    """
+    Convert the given binary url_segments file to a text url_segments file.
+    :param binary_path: The path to the binary file to convert.
+    :param text_path: The path to write the text file to.
+    :return: Whether or not the binary file was found and converted.
+    """
+    if not os.path.isfile(binary_path):
+        return False
+    with BinarySegmentFile(binary_path) as segment_file:
+        contents = []
+        if segment_file.is_sorted or segment_file.excludes_coerced:
+            header = format_segments_header(
+                segment_count=segment_file.segment_count,
+                total_count=segment_file.total_count,
+                is_sorted=segment_file.is_sorted,
+                excludes_coerced=segment_file.excludes_coerced,
+            )
+            contents.append("%s\n" % (header,))
+        contents.extend(["%s\t%s\n" % (x, y) for x, y in segment_file.iter_segments()])
+    with open(text_path, "w+") as f:
+        f.write("".join(contents))
+    return True
+
+
+def _convert_text_to_binary(text_path=None, binary_path=None):
+    """
+    Convert the given text url_segments file to a binary url_segments file.
+    :param text_path: The path to the text file to convert.
+    :param binary_path: The path to write the binary file to.
+    :return: Whether or not the text file was found and converted.
+    """
+    if not os.path.isfile(text_path):
+        return False
+    url_segments, header = read_text_segments(text_path)
+    contents = pack_binary_segments(
+        url_segments=url_segments,
+        is_sorted=header is not None and header["sorted"],
+        excludes_coerced=header is not None and header["excludes_coerced"],
+    )
+    with open(binary_path, "wb+") as f:
+        f.write(contents)
+    return True
+
+
+class BinarySegmentFile(object):
+    """
+    This class provides read-only access to a binary url_segments file (see pack_binary_segments) through a
+    memory map. Opening the file only reads its header, counts are read straight out of the map, and URL
+    segments are decoded only when they are requested.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, file_path):
+        self._file_path = file_path
+        self._file = open(file_path, "rb")
+        self._views = []
+        try:
+            file_size = os.fstat(self._file.fileno()).st_size
+            if file_size < HEADER_STRUCT.size:
+                raise InvalidSegmentFileError("%s is too small to be a binary url_segments file." % (file_path,))
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        self._counts = self._offsets = None
+        try:
+            (
+                magic,
+                version,
+                flags,
+                self._segment_count,
+                self._total_count,
+                self._offsets_position,
+                self._strings_position,
+            ) = HEADER_STRUCT.unpack_from(self._map, 0)
+            if magic != BINARY_SEGMENTS_MAGIC or version != BINARY_SEGMENTS_VERSION:
+                raise InvalidSegmentFileError("%s is not a binary url_segments file." % (file_path,))
+            if self._strings_position > file_size:
+                raise InvalidSegmentFileError("%s is truncated." % (file_path,))
+            self._is_sorted = bool(flags & SORTED_FLAG)
+            self._excludes_coerced = bool(flags & EXCLUDES_COERCED_FLAG)
+            self._counts = self.__get_int64_sequence(HEADER_STRUCT.size, self._segment_count)
+            self._offsets = self.__get_int64_sequence(self._offsets_position, self._segment_count + 1)
+        except BaseException:
+            self.close()
+            raise
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Release all views of the memory map and close the map and the underlying file.
+        :return: None
+        """
+        if self._map is None:
+            return
+        self._counts = self._offsets = None
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+        self._map = None
+        self._file.close()
+
+    def get_count(self, index):
+        """
+        Get the count of the URL segment at the given index.
+        :param index: The index of the URL segment.
+        :return: The count of the URL segment at the given index.
+        """
+        return self._counts[index]
+
+    def get_segment(self, index):
+        """
+        Get the URL segment at the given index.
+        :param index: The index of the URL segment.
+        :return: The URL segment at the given index.
+        """
+        start = self._strings_position + self._offsets[index]
+        end = self._strings_position + self._offsets[index + 1]
+        if SEGMENTS_ARE_UNICODE:
+            return self._map[start:end].decode("utf-8")
+        return self._map[start:end]
+
+    def iter_segments(self):
+        """
+        Iterate over all of the URL segments in this file in stored order.
+        :return: A generator yielding (URL segment, count) tuples.
+        """
+        counts = self._counts
+        offsets = self._offsets
+        mapped = self._map
+        strings_position = self._strings_position
+        segments_are_unicode = SEGMENTS_ARE_UNICODE
+        for index in range(self._segment_count):
+            start = strings_position + offsets[index]
+            end = strings_position + offsets[index + 1]
+            if segments_are_unicode:
+                yield mapped[start:end].decode("utf-8"), counts[index]
+            else:
+                yield mapped[start:end], counts[index]
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __get_int64_sequence(self, position, length):
+        """
+        Get a sequence of the given number of little-endian 64-bit integers stored at the given position of
+        the memory map. Where possible, the sequence is a view of the map rather than a copy.
+        :param position: The position of the first integer.
+        :param length: The number of integers.
+        :return: An indexable sequence of integers.
+        """
+        end = position + COUNT_STRUCT.size * length
+        if end > len(self._map):
+            raise InvalidSegmentFileError("%s is truncated." % (self.file_path,))
+        if sys.byteorder == "little" and hasattr(memoryview, "cast"):
+            view = memoryview(self._map)
+            self._views.append(view)
+            sliced = view[position:end]
+            self._views.append(sliced)
+            cast = sliced.cast("q")
+            self._views.append(cast)
+            return cast
+        return _bytes_to_array(self._map[position:end])
+
+    # Properties
+
+    @property
+    def counts(self):
+        """
+        Get the counts of all of the URL segments in this file in stored order.
+        :return: the counts of all of the URL segments in this file in stored order.
+        """
+        return self._counts
+
+    @property
+    def excludes_coerced(self):
+        """
+        Get whether or not URL segments that contain coerced values were split out of this file.
+        :return: whether or not URL segments that contain coerced values were split out of this file.
+        """
+        return self._excludes_coerced
+
+    @property
+    def file_path(self):
+        """
+        Get the path to the binary url_segments file.
+        :return: the path to the binary url_segments file.
+        """
+        return self._file_path
+
+    @property
+    def is_sorted(self):
+        """
+        Get whether or not the URL segments in this file are sorted by descending count.
+        :return: whether or not the URL segments in this file are sorted by descending count.
+        """
+        return self._is_sorted
+
+    @property
+    def segment_count(self):
+        """
+        Get the number of URL segments in this file.
+        :return: the number of URL segments in this file.
+        """
+        return self._segment_count
+
+    @property
+    def total_count(self):
+        """
+        Get the sum of the counts of all of the URL segments in this file.
+        :return: the sum of the counts of all of the URL segments in this file.
+        """
+        return self._total_count
+
+    # Representation and Comparison
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._segment_count
+
+    def __repr__(self):
+        return "<%s - %s (%s segments)>" % (self.__class__.__name__, self.file_path, self.segment_count)
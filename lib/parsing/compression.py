@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import bz2
+import gzip
+import os
+import threading
+import zlib
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+
+logger = get_logger_for_name(__name__)
+
+GZIP = "gzip"
+BZIP2 = "bzip2"
+DEFLATE = "deflate"
+ZSTD = "zstd"
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": GZIP,
+    ".bz2": BZIP2,
+    ".deflate": DEFLATE,
+    ".zst": ZSTD,
+}
+
+
+class UnsupportedCompressionError(Exception):
+    """
+    This is an exception for denoting that a results file uses a compression format that can not be read.
+    """
+
+
+def detect_compression(file_path, leading_bytes=None):
+    """
+    Determine the compression format used by the file at the given path, first by its extension and then
+    by its leading magic bytes.
+    :param file_path: The path to the file to inspect.
+    :param leading_bytes: The first (up to four) bytes of the file, or None to read them from the file.
+    :return: One of GZIP, BZIP2, DEFLATE, or ZSTD, or None if the file does not appear to be compressed.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+    if leading_bytes is None:
+        with open(file_path, "rb") as f:
+            leading_bytes = f.read(4)
+    return detect_compression_from_bytes(leading_bytes)
+
+
+def detect_compression_from_bytes(leading_bytes):
+    """
+    Determine the compression format indicated by the given leading bytes of a file.
+    :param leading_bytes: The first (up to four) bytes of the file.
+    :return: One of GZIP, BZIP2, DEFLATE, or ZSTD, or None if the bytes do not match a known format.
+    """
+    if leading_bytes[:2] == b"\x1f\x8b":
+        return GZIP
+    elif leading_bytes[:3] == b"BZh":
+        return BZIP2
+    elif leading_bytes[:4] == b"\x28\xb5\x2f\xfd":
+        return ZSTD
+    elif len(leading_bytes) >= 2:
+        first, second = bytearray(leading_bytes[:2])
+        if first & 0x0f == 8 and (first << 8 | second) % 31 == 0:
+            return DEFLATE
+    return None
+
+
+def open_decompressed_stream(file_object, compression=None):
+    """
+    Wrap the given binary file object in a stream that decompresses its contents as they are read.
+    :param file_object: The binary file object to read compressed data from.
+    :param compression: The compression format of the data (see detect_compression).
+    :return: A file-like object whose read method returns decompressed bytes.
+    """
+    if compression == GZIP:
+        return gzip.GzipFile(fileobj=file_object, mode="rb")
+    elif compression == BZIP2:
+        return Bz2StreamReader(file_object)
+    elif compression == DEFLATE:
+        return ZlibStreamReader(file_object)
+    elif compression == ZSTD:
+        if zstandard is None:
+            raise UnsupportedCompressionError(
+                "The zstandard package is required to read zstd-compressed results files."
+            )
+        return zstandard.ZstdDecompressor().stream_reader(file_object, read_across_frames=True)
+    raise UnsupportedCompressionError("Unknown compression format: %s" % (compression,))
+
+
+class Bz2StreamReader(object):
+    """
+    This class decompresses bzip2 data as it is read, including the concatenated bzip2 streams written by
+    Hadoop's BZip2Codec. Unlike bz2.BZ2File on Python 2, it reads from any file object rather than a file name.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, file_object, chunk_size=ConfigManager.READ_BLOCK_SIZE):
+        self._file_object = file_object
+        self._chunk_size = chunk_size
+        self._decompressor = bz2.BZ2Decompressor()
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Close the underlying file object.
+        :return: None
+        """
+        self._file_object.close()
+
+    def read(self, size=-1):
+        """
+        Read and decompress the next chunk of data from the underlying file object.
+        :param size: Ignored. Chunks are sized by the amount of compressed data read at once.
+        :return: The next chunk of decompressed bytes, or an empty byte string once all data has been read.
+        """
+        while True:
+            compressed = self._file_object.read(self._chunk_size)
+            if not compressed:
+                return b""
+            decompressed = b""
+            while compressed:
+                try:
+                    decompressed += self._decompressor.decompress(compressed)
+                except EOFError:
+                    # The previous stream ended exactly at the end of the last chunk read.
+                    self._decompressor = bz2.BZ2Decompressor()
+                    continue
+                compressed = self._decompressor.unused_data
+                if compressed:
+                    self._decompressor = bz2.BZ2Decompressor()
+            if decompressed:
+                return decompressed
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s>" % (self.__class__.__name__, self._file_object)
+
+
+class ZlibStreamReader(object):
+    """
+    This class decompresses the zlib-wrapped deflate streams written by Hadoop's DefaultCodec as they are read.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, file_object, chunk_size=ConfigManager.READ_BLOCK_SIZE):
+        self._file_object = file_object
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj()
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Close the underlying file object.
+        :return: None
+        """
+        self._file_object.close()
+
+    def read(self, size=-1):
+        """
+        Read and decompress the next chunk of data from the underlying file object.
+        :param size: Ignored. Chunks are sized by the amount of compressed data read at once.
+        :return: The next chunk of decompressed bytes, or an empty byte string once all data has been read.
+        """
+        while True:
+            compressed = self._file_object.read(self._chunk_size)
+            if not compressed:
+                return self._decompressor.flush()
+            decompressed = self._decompressor.decompress(compressed)
+            while self._decompressor.unused_data:
+                unused_data = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj()
+                decompressed += self._decompressor.decompress(unused_data)
+            if decompressed:
+                return decompressed
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s>" % (self.__class__.__name__, self._file_object)
+
+
+class ThreadedBlockReader(object):
+    """
+    This class reads blocks from a (typically decompressing) stream on a background thread so that
+    decompression overlaps with parsing. Blocks are handed over through a bounded queue.
+    """
+
+    # Class Members
+
+    _END = object()
+
+    # Instantiation
+
+    def __init__(
+            self,
+            stream,
+            block_size=ConfigManager.READ_BLOCK_SIZE,
+            queue_depth=ConfigManager.DECOMPRESSION_QUEUE_DEPTH,
+    ):
+        self._stream = stream
+        self._block_size = block_size
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._stop_event = threading.Event()
+        self._error = None
+        self._finished = False
+        self._thread = threading.Thread(target=self.__read_blocks)
+        self._thread.daemon = True
+        self._thread.start()
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Stop the background thread and close the underlying stream.
+        :return: None
+        """
+        self._stop_event.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(0.05)
+        self._stream.close()
+
+    def read(self, size=-1):
+        """
+        Get the next block read from the underlying stream.
+        :param size: Ignored. Blocks are sized by the background reader.
+        :return: The next block of bytes, or an empty byte string once the stream has been exhausted.
+        """
+        if self._finished:
+            return b""
+        block = self._queue.get()
+        if block is self._END:
+            self._finished = True
+            if self._error is not None:
+                raise self._error
+            return b""
+        return block
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __put(self, item):
+        """
+        Put the given item on the queue, giving up if this reader is closed while waiting.
+        :param item: The item to put on the queue.
+        :return: Whether or not the item was put on the queue.
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __read_blocks(self):
+        """
+        Read blocks from the underlying stream until it is exhausted or this reader is closed.
+        :return: None
+        """
+        try:
+            while not self._stop_event.is_set():
+                block = self._stream.read(self._block_size)
+                if not block:
+                    break
+                if not self.__put(block):
+                    return
+        except Exception as e:
+            self._error = e
+        self.__put(self._END)
+
+    # Properties
+
+    # Representation and Comparison
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<%s - %s>" % (self.__class__.__name__, self._stream)
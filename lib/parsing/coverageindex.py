@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from array import array
+from bisect import bisect_left
+import time
+
+from ..cclogging import get_logger_for_name
+from .binarysegments import INT64_TYPECODE
+from .segmenttable import SegmentTable
+
+logger = get_logger_for_name(__name__)
+
+
+class CoverageIndex(object):
+    """
+    This class holds the ranked URL segments of every server type found in processed lavalamp Common Crawl
+    results alongside an array of their cumulative counts. Once the index is loaded, the hit list for any
+    coverage threshold is found with a binary search over the cumulative counts instead of a walk over the
+    URL segments.
+
+    URL segments are held once in a SegmentTable shared by every server type. Every server type holds an array
+    of the IDs of its ranked URL segments in parallel with the array of their cumulative counts, and strings are
+    only looked up again when hit lists are rendered.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, segment_table=None):
+        self._segment_table = segment_table if segment_table is not None else SegmentTable()
+        self._hits_counts = {}
+        self._segment_ids = {}
+        self._cumulative_counts = {}
+
+    # Static Methods
+
+    @staticmethod
+    def get_target_count(hits_count=None, threshold=None):
+        """
+        Get the smallest cumulative count that reaches the given coverage threshold. Coverage is compared in
+        the same way as in HitListParser.get_threshold_cutoffs, so that cut-offs found through the index
+        match those of generated hit lists exactly.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param threshold: The coverage threshold (as a percentage).
+        :return: The smallest cumulative count whose coverage is at least the given threshold.
+        """
+        target_percent = 0.01 * threshold
+        target_count = max(int(target_percent * hits_count), 0)
+        while target_count > 0 and float(target_count - 1) / hits_count >= target_percent:
+            target_count -= 1
+        while float(target_count) / hits_count < target_percent:
+            target_count += 1
+        return target_count
+
+    # Class Methods
+
+    @classmethod
+    def from_hit_list_parser(cls, hit_list_parser=None, server_types=None):
+        """
+        Create a coverage index holding the ranked URL segments of the given server types, as read by the
+        given HitListParser.
+        :param hit_list_parser: The HitListParser to read ranked URL segments through.
+        :param server_types: The server types to load, or None to load every server type that the parser
+        finds.
+        :return: The loaded CoverageIndex.
+        """
+        start_time = time.time()
+        if server_types is None:
+            server_types = hit_list_parser.get_server_types()
+        to_return = cls()
+        for server_type in server_types:
+            hits_count, ranked_segments = hit_list_parser.get_ranked_segment_counts(server_type=server_type)
+            to_return.add_server_type(
+                server_type=server_type,
+                hits_count=hits_count,
+                ranked_segments=ranked_segments,
+            )
+        logger.debug(
+            "Loaded coverage index from %s in %.2f seconds (%s)."
+            % (hit_list_parser.results_directory, time.time() - start_time, to_return)
+        )
+        return to_return
+
+    # Public Methods
+
+    def add_server_type(self, server_type=None, hits_count=None, ranked_segments=None):
+        """
+        Add the given ranked URL segments for the given server type to the index.
+        :param server_type: The server type that the URL segments were found for.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param ranked_segments: A list of (URL segment, count) tuples ranked by descending count.
+        :return: None
+        """
+        cumulative_counts = array(INT64_TYPECODE)
+        coverage_count = 0
+        for _, segment_count in ranked_segments:
+            coverage_count += segment_count
+            cumulative_counts.append(coverage_count)
+        self._hits_counts[server_type] = hits_count
+        self._segment_ids[server_type] = self._segment_table.add_segments([x[0] for x in ranked_segments])
+        self._cumulative_counts[server_type] = cumulative_counts
+
+    def get_coverage(self, server_type=None, segment_count=None):
+        """
+        Get the coverage of the given number of leading ranked URL segments for the given server type.
+        :param server_type: The server type to get the coverage for.
+        :param segment_count: The number of leading ranked URL segments.
+        :return: The coverage of the URL segments (as a percentage).
+        """
+        hits_count = self._hits_counts[server_type]
+        if segment_count <= 0 or not hits_count:
+            return 0.0
+        return 100.0 * self._cumulative_counts[server_type][segment_count - 1] / hits_count
+
+    def get_cutoff(self, server_type=None, threshold=None):
+        """
+        Get the number of leading ranked URL segments required to reach the given coverage threshold for the
+        given server type.
+        :param server_type: The server type to get the cut-off for.
+        :param threshold: The coverage threshold (as a percentage).
+        :return: The number of leading ranked URL segments required to reach the threshold, or the total
+        number of URL segments if the threshold can not be reached.
+        """
+        hits_count = self._hits_counts[server_type]
+        cumulative_counts = self._cumulative_counts[server_type]
+        if not hits_count:
+            return len(cumulative_counts)
+        target_count = self.get_target_count(hits_count=hits_count, threshold=threshold)
+        index = bisect_left(cumulative_counts, target_count)
+        return min(index + 1, len(cumulative_counts))
+
+    def get_hits_count(self, server_type=None):
+        """
+        Get the total number of hits that coverage is measured against for the given server type.
+        :param server_type: The server type to get the hits count for.
+        :return: The total number of hits for the server type.
+        """
+        return self._hits_counts[server_type]
+
+    def get_segment_count(self, server_type=None):
+        """
+        Get the number of ranked URL segments held for the given server type.
+        :param server_type: The server type to get the number of URL segments for.
+        :return: The number of ranked URL segments held for the server type.
+        """
+        return len(self._segment_ids[server_type])
+
+    def get_top_segments(self, server_type=None, segment_count=None):
+        """
+        Get the given number of leading ranked URL segments for the given server type.
+        :param server_type: The server type to get the URL segments for.
+        :param segment_count: The number of leading ranked URL segments to get.
+        :return: A list of URL segments ranked by descending count.
+        """
+        return self._segment_table.get_segments(self._segment_ids[server_type][:segment_count])
+
+    def has_server_type(self, server_type=None):
+        """
+        Check whether or not the given server type is held by this index.
+        :param server_type: The server type to check for.
+        :return: Whether or not the given server type is held by this index.
+        """
+        return server_type in self._segment_ids
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    @property
+    def segment_count(self):
+        """
+        Get the number of ranked URL segments held by this index across all server types.
+        :return: the number of ranked URL segments held by this index across all server types.
+        """
+        return sum([len(x) for x in self._segment_ids.values()])
+
+    @property
+    def segment_table(self):
+        """
+        Get the SegmentTable that the URL segments of every server type are held in.
+        :return: the SegmentTable that the URL segments of every server type are held in.
+        """
+        return self._segment_table
+
+    @property
+    def server_types(self):
+        """
+        Get the server types held by this index, sorted by name.
+        :return: the server types held by this index, sorted by name.
+        """
+        return sorted(self._segment_ids.keys())
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s servers, %s segments, %s distinct>" % (
+            self.__class__.__name__,
+            len(self._segment_ids),
+            self.segment_count,
+            self._segment_table.segment_count,
+        )
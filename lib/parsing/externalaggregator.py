@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import heapq
+import os
+import tempfile
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from sys import intern
+except ImportError:
+    pass
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+
+logger = get_logger_for_name(__name__)
+
+RUN_FILE_SUFFIX = ".run"
+
+
+class ExternalSegmentAggregator(object):
+    """
+    This class aggregates server and URL segment counts in the same way as SegmentAggregator while keeping its
+    memory use within a given limit. Counts are buffered in memory until their estimated size passes the limit,
+    at which point they are sorted by (server type, URL segment) and spilled to a run file on disk. Iterating
+    over the aggregated results streams a k-way merge of every run, summing the counts of each key as it goes,
+    so only the URL segments of a single server type are held in memory at once. As one batch of every run is
+    read at a time during the merge, the number of runs merged at once is also capped by the memory limit.
+    """
+
+    # Class Members
+
+    _prepare_lock = threading.Lock()
+
+    # Instantiation
+
+    def __init__(
+            self,
+            memory_limit=ConfigManager.MEMORY_LIMIT,
+            spill_directory=None,
+            batch_size=ConfigManager.SPILL_BATCH_SIZE,
+            merge_fan_in=ConfigManager.SPILL_MERGE_FAN_IN,
+    ):
+        if memory_limit <= 0:
+            raise ValueError("%s is not a valid memory limit." % (memory_limit,))
+        self._memory_limit = int(memory_limit * 1048576)
+        self._spill_directory = spill_directory if spill_directory is not None else tempfile.gettempdir()
+        self._batch_size = batch_size
+        self._merge_fan_in = max(
+            min(merge_fan_in, self._memory_limit // (batch_size * ConfigManager.SPILL_ENTRY_OVERHEAD)),
+            2,
+        )
+        self._server_counts = {}
+        self._segment_counts = {}
+        self._buffered_size = 0
+        self._server_types = set()
+        self._run_paths = []
+        self._spill_count = 0
+
+    # Static Methods
+
+    @staticmethod
+    def iter_run(run_path=None):
+        """
+        Iterate over the counts stored in the given run file.
+        :param run_path: The path to the run file.
+        :return: A generator yielding (server type, URL segment, count) tuples sorted by server type and URL
+        segment. The total count of a server type is yielded with an empty URL segment, ahead of its URL segments.
+        """
+        with open(run_path, "rb") as f:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    return
+                for record in batch:
+                    yield record
+
+    @staticmethod
+    def iter_summed(records=None):
+        """
+        Sum the counts of adjacent records that share the same key.
+        :param records: An iterable of (server type, URL segment, count) tuples sorted by server type and URL
+        segment.
+        :return: A generator yielding a (server type, URL segment, count) tuple for every distinct key.
+        """
+        last_server_type = last_url_segment = last_count = None
+        for server_type, url_segment, count in records:
+            if url_segment == last_url_segment and server_type == last_server_type:
+                last_count += count
+                continue
+            if last_server_type is not None:
+                yield last_server_type, last_url_segment, last_count
+            last_server_type, last_url_segment, last_count = server_type, url_segment, count
+        if last_server_type is not None:
+            yield last_server_type, last_url_segment, last_count
+
+    # Class Methods
+
+    # Public Methods
+
+    def add_segment_count(self, server_type=None, url_segment=None, count=None):
+        """
+        Add the given count to the running total for the given URL segment of the given server type, spilling
+        the buffered counts to disk if they no longer fit within the memory limit.
+        :param server_type: The server type that the URL segment was found for.
+        :param url_segment: The URL segment.
+        :param count: The number of times that the URL segment was seen.
+        :return: None
+        """
+        segments = self._segment_counts.get(server_type)
+        if segments is None:
+            segments = self._segment_counts[intern(server_type)] = {}
+            self._server_types.add(server_type)
+        if url_segment in segments:
+            segments[url_segment] += count
+            return
+        segments[url_segment] = count
+        self._buffered_size += len(url_segment) + ConfigManager.SPILL_ENTRY_OVERHEAD
+        if self._buffered_size > self._memory_limit:
+            self.spill()
+
+    def add_server_count(self, server_type=None, count=None):
+        """
+        Add the given count to the running total for the given server type.
+        :param server_type: The server type.
+        :param count: The number of times that the server type was seen.
+        :return: None
+        """
+        if server_type in self._server_counts:
+            self._server_counts[server_type] += count
+        else:
+            self._server_counts[intern(server_type)] = count
+            self._server_types.add(server_type)
+
+    def group_by(self, key_function=None, keys=None):
+        """
+        Create a new aggregator holding the counts of this aggregator merged by the given function of their
+        server types (ex: to roll server types up into server families). The new aggregator spills to the same
+        directory within the same memory limit.
+        :param key_function: A function mapping a server type to the server type to merge its counts into.
+        :param keys: The merged server types to include, or None to include all of them.
+        :return: A new ExternalSegmentAggregator holding the merged counts.
+        """
+        grouped = ExternalSegmentAggregator(
+            memory_limit=self._memory_limit / 1048576.0,
+            spill_directory=self._spill_directory,
+            batch_size=self._batch_size,
+            merge_fan_in=self._merge_fan_in,
+        )
+        for server_type, total_count, url_segments in self.iter_servers():
+            key = key_function(server_type)
+            if keys is not None and key not in keys:
+                continue
+            if total_count is not None:
+                grouped.add_server_count(server_type=key, count=total_count)
+            add_segment_count = grouped.add_segment_count
+            for url_segment, count in url_segments:
+                add_segment_count(key, url_segment, count)
+        return grouped
+
+    def iter_servers(self, ignore_threshold=0):
+        """
+        Iterate over the aggregated results for every server type, applying the given ignore threshold
+        to the merged counts. Buffered counts are spilled first, and runs are merged down until there are no
+        more than the merge fan-in of them.
+        :param ignore_threshold: The minimum merged count that a server type or URL segment must have
+        to be included.
+        :return: A generator yielding tuples containing (1) the server type, (2) the total count for the
+        server type or None if it fell below the threshold, and (3) a list of (URL segment, count) tuples
+        sorted by URL segment.
+        """
+        with self._prepare_lock:
+            self.spill()
+            while len(self._run_paths) > self._merge_fan_in:
+                self.__merge_runs(self._merge_fan_in)
+            run_paths = list(self._run_paths)
+        records = self.iter_summed(heapq.merge(*[self.iter_run(x) for x in run_paths]))
+        current_server_type = total_count = None
+        url_segments = []
+        for server_type, url_segment, count in records:
+            if server_type != current_server_type:
+                if current_server_type is not None and (total_count is not None or url_segments):
+                    yield current_server_type, total_count, url_segments
+                current_server_type = server_type
+                total_count = None
+                url_segments = []
+            if not url_segment:
+                total_count = count if count >= ignore_threshold else None
+            elif count >= ignore_threshold:
+                url_segments.append((url_segment, count))
+        if current_server_type is not None and (total_count is not None or url_segments):
+            yield current_server_type, total_count, url_segments
+
+    def merge(self, other):
+        """
+        Merge the counts held by the given aggregator into this aggregator. The run files of another
+        ExternalSegmentAggregator are taken over rather than read.
+        :param other: The ExternalSegmentAggregator or SegmentAggregator to merge in.
+        :return: None
+        """
+        if not isinstance(other, ExternalSegmentAggregator):
+            for server_type, total_count, url_segments in other.iter_servers():
+                if total_count is not None:
+                    self.add_server_count(server_type=server_type, count=total_count)
+                for url_segment, count in url_segments:
+                    self.add_segment_count(server_type, url_segment, count)
+            return
+        for server_type, count in other._server_counts.items():
+            self.add_server_count(server_type=server_type, count=count)
+        for server_type, segments in other._segment_counts.items():
+            for url_segment, count in segments.items():
+                self.add_segment_count(server_type, url_segment, count)
+        self._server_types.update(other._server_types)
+        self._run_paths.extend(other._run_paths)
+        self._spill_count += other._spill_count
+        other._run_paths = []
+
+    def remove_runs(self):
+        """
+        Remove every run file held by this aggregator from disk.
+        :return: None
+        """
+        for run_path in self._run_paths:
+            if os.path.isfile(run_path):
+                os.remove(run_path)
+        self._run_paths = []
+
+    def spill(self):
+        """
+        Write the buffered counts to a new run file sorted by server type and URL segment, and clear them from
+        memory.
+        :return: None
+        """
+        if not self._server_counts and not self._segment_counts:
+            return
+        server_types = set(self._server_counts.keys())
+        server_types.update(self._segment_counts.keys())
+        records = []
+        for server_type in sorted(server_types):
+            if server_type in self._server_counts:
+                records.append((server_type, "", self._server_counts[server_type]))
+            segments = self._segment_counts.pop(server_type, None)
+            if segments:
+                records.extend([(server_type, x, y) for x, y in sorted(segments.items())])
+        run_path = self.__write_run(records)
+        logger.debug(
+            "Spilled %s buffered counts (%.1f MB estimated) to %s."
+            % (len(records), self._buffered_size / 1048576.0, run_path)
+        )
+        self._run_paths.append(run_path)
+        self._spill_count += 1
+        self._server_counts = {}
+        self._segment_counts = {}
+        self._buffered_size = 0
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __merge_runs(self, run_count):
+        """
+        Merge the given number of this aggregator's smallest run files into a single run file, summing the
+        counts of every key, and remove the merged run files.
+        :param run_count: The number of run files to merge.
+        :return: None
+        """
+        self._run_paths.sort(key=os.path.getsize)
+        run_paths = self._run_paths[:run_count]
+        merged_path = self.__write_run(self.iter_summed(heapq.merge(*[self.iter_run(x) for x in run_paths])))
+        logger.debug("Merged %s run files into %s." % (len(run_paths), merged_path))
+        for run_path in run_paths:
+            os.remove(run_path)
+        self._run_paths = self._run_paths[run_count:] + [merged_path]
+
+    def __write_run(self, records):
+        """
+        Write the given records to a new run file in batches.
+        :param records: An iterable of (server type, URL segment, count) tuples sorted by server type and URL
+        segment.
+        :return: The path to the run file.
+        """
+        file_descriptor, run_path = tempfile.mkstemp(suffix=RUN_FILE_SUFFIX, dir=self._spill_directory)
+        with os.fdopen(file_descriptor, "wb") as f:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self._batch_size:
+                    pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                    batch = []
+            if batch:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+        return run_path
+
+    # Properties
+
+    @property
+    def memory_limit(self):
+        """
+        Get the number of bytes that buffered counts may take up before they are spilled.
+        :return: the number of bytes that buffered counts may take up before they are spilled.
+        """
+        return self._memory_limit
+
+    @property
+    def run_count(self):
+        """
+        Get the number of run files held by this aggregator.
+        :return: the number of run files held by this aggregator.
+        """
+        return len(self._run_paths)
+
+    @property
+    def server_count(self):
+        """
+        Get the number of distinct server types held by this aggregator.
+        :return: the number of distinct server types held by this aggregator.
+        """
+        return len(self._server_types)
+
+    @property
+    def server_types(self):
+        """
+        Get the set of server types held by this aggregator.
+        :return: the set of server types held by this aggregator.
+        """
+        return set(self._server_types)
+
+    @property
+    def spill_count(self):
+        """
+        Get the number of times that buffered counts were spilled to a run file, including by aggregators that
+        were merged in.
+        :return: the number of times that buffered counts were spilled to a run file.
+        """
+        return self._spill_count
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s servers, %s runs, %.1f MB buffered>" % (
+            self.__class__.__name__,
+            self.server_count,
+            self.run_count,
+            self._buffered_size / 1048576.0,
+        )
@@ -1,15 +1,61 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+from collections import Counter
+import multiprocessing
+from operator import itemgetter
 import os
-import re
+import time
 
-from ..cclogging import get_logger_for_name
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ..cclogging import get_logger_for_name, QueueLogListener
 from ..config import ConfigManager
+from ..metrics import get_run_metrics
+from .binarysegments import BinarySegmentFile
+from .segmentfile import COERCED_REGEX, is_coerced_segment, parse_segments_header, split_coerced_segments
+from .sqlitestore import SQLITE_STORE, SQLiteResultStore, STORES
+from .workers import initialize_worker
 
 logger = get_logger_for_name(__name__)
 
 
+def _generate_hit_lists_in_worker(worker_args):
+    """
+    Generate the hit lists for a single server type within a worker process.
+    :param worker_args: A tuple containing (1) the results directory path, (2) the hit list engine, (3)
+    whether or not to include coerced URL segments, (4) whether or not to generate coerced hit lists, (5)
+    the results store, (6) the server type, (7) the list of thresholds, and (8) the hit list file name
+    preamble.
+    :return: The summary of the hit lists generated for the server type (see generate_hit_lists_for_server).
+    """
+    (
+        results_directory,
+        engine,
+        include_coerced,
+        coerced_hit_lists,
+        store,
+        server_type,
+        thresholds,
+        hit_list_preamble,
+    ) = worker_args
+    hit_list_parser = HitListParser(
+        results_directory=results_directory,
+        engine=engine,
+        include_coerced=include_coerced,
+        coerced_hit_lists=coerced_hit_lists,
+        store=store,
+    )
+    return hit_list_parser.generate_hit_lists_for_server(
+        server_type=server_type,
+        thresholds=thresholds,
+        hit_list_preamble=hit_list_preamble,
+    )
+
+
 class HitListParser(object):
     """
     This class is responsible for generating hit lists by servers based on the parsed results
@@ -18,15 +64,123 @@ class HitListParser(object):
 
     # Class Members
 
-    COERCED_REGEX = re.compile("\[\[.*?\]\]")
+    COERCED_REGEX = COERCED_REGEX
+    AUTO_ENGINE = "auto"
+    NUMPY_ENGINE = "numpy"
+    PYTHON_ENGINE = "python"
+    ENGINES = [AUTO_ENGINE, NUMPY_ENGINE, PYTHON_ENGINE]
 
     # Instantiation
 
-    def __init__(self, results_directory=ConfigManager.OUTPUT_DIRECTORY):
+    def __init__(
+            self,
+            results_directory=ConfigManager.OUTPUT_DIRECTORY,
+            engine=ConfigManager.HIT_LIST_ENGINE,
+            include_coerced=ConfigManager.INCLUDE_COERCED,
+            coerced_hit_lists=ConfigManager.COERCED_HIT_LISTS,
+            store=ConfigManager.RESULT_STORE,
+    ):
         self._results_directory = results_directory
+        self._engine = engine
+        self._include_coerced = include_coerced
+        self._coerced_hit_lists = coerced_hit_lists
+        self._store = store
+        if store not in STORES:
+            raise ValueError("%s is not a valid results store." % (store,))
+        if engine not in self.ENGINES:
+            raise ValueError("%s is not a valid hit list engine." % (engine,))
+        if engine == self.NUMPY_ENGINE and numpy is None:
+            raise ImportError("NumPy is required to use the %s hit list engine." % (engine,))
+        self._use_numpy = numpy is not None and engine != self.PYTHON_ENGINE
 
     # Static Methods
 
+    @staticmethod
+    def get_threshold_cutoffs(segment_counts=None, hits_count=None, thresholds=None):
+        """
+        Find the number of ranked URL segments required to reach every one of the given coverage thresholds
+        in a single walk over the cumulative coverage of the segments.
+        :param segment_counts: An iterable of the counts of the URL segments, in ranked order. Iteration stops
+        as soon as the largest threshold has been reached.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :return: A dictionary mapping every threshold to the number of leading URL segments required to
+        reach it. Thresholds that can not be reached map to the total number of URL segments.
+        """
+        pending = sorted([(0.01 * x, x) for x in set(thresholds)])
+        cutoffs = {}
+        coverage_count = 0
+        segments_seen = 0
+        for segment_count in segment_counts:
+            segments_seen += 1
+            coverage_count += segment_count
+            coverage_percent = float(coverage_count) / hits_count
+            while pending and coverage_percent >= pending[0][0]:
+                cutoffs[pending.pop(0)[1]] = segments_seen
+            if not pending:
+                break
+        for _, threshold in pending:
+            cutoffs[threshold] = segments_seen
+        return cutoffs
+
+    @staticmethod
+    def rank_segments_with_numpy(url_segments=None, hits_count=None, thresholds=None):
+        """
+        Rank the given URL segments by count and find the cut-off for every one of the given coverage
+        thresholds using NumPy. Counts are held in an int64 array, only the segments needed to reach the
+        largest threshold are ranked (see select_ranked_segments), and their cumulative coverage is searched
+        for all thresholds at once.
+        :param url_segments: A list of (URL segment, count) tuples in file order.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :return: A tuple containing (1) a list of the leading ranked URL segments needed by the largest
+        cut-off and (2) a dictionary mapping every threshold to the number of leading URL segments required
+        to reach it (see get_threshold_cutoffs).
+        """
+        thresholds = sorted(set(thresholds))
+        counts = numpy.fromiter((x[1] for x in url_segments), dtype=numpy.int64, count=len(url_segments))
+        candidates = numpy.arange(len(counts))
+        if thresholds:
+            values, frequencies = numpy.unique(counts, return_counts=True)
+            coverage_percents = numpy.cumsum((values * frequencies)[::-1]) / float(hits_count)
+            index = numpy.searchsorted(coverage_percents, 0.01 * thresholds[-1], side="left")
+            if index < len(values):
+                candidates = numpy.flatnonzero(counts >= values[::-1][index])
+        order = candidates[numpy.argsort(-counts[candidates], kind="stable")]
+        coverage_percents = numpy.cumsum(counts[order]) / float(hits_count)
+        targets = numpy.array([0.01 * x for x in thresholds], dtype=numpy.float64)
+        indices = numpy.searchsorted(coverage_percents, targets, side="left")
+        cutoffs = dict([(x, min(int(y) + 1, len(order))) for x, y in zip(thresholds, indices)])
+        ranked_segments = [url_segments[x][0] for x in order[:max(cutoffs.values() or [0])].tolist()]
+        return ranked_segments, cutoffs
+
+    @staticmethod
+    def select_ranked_segments(url_segments=None, hits_count=None, thresholds=None):
+        """
+        Get the leading URL segments of the given segments, ranked by descending count, needed to reach the
+        largest of the given coverage thresholds. Rather than sorting every segment, the segments are
+        partitioned on a pivot count: a single pass builds a histogram of counts, walking the distinct counts
+        from the largest down finds the smallest count at which the largest threshold is reached, and only
+        the segments with at least that count are sorted. The result is identical to the same prefix of a
+        full stable sort by descending count.
+        :param url_segments: A list of (URL segment, count) tuples in file order.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :return: A list of (URL segment, count) tuples in ranked order. If the largest threshold can not be
+        reached, all of the segments are returned.
+        """
+        if not thresholds:
+            return []
+        target_percent = 0.01 * max(thresholds)
+        frequencies = Counter([x[1] for x in url_segments])
+        coverage_count = 0
+        for pivot_count in sorted(frequencies.keys(), reverse=True):
+            coverage_count += pivot_count * frequencies[pivot_count]
+            if float(coverage_count) / hits_count >= target_percent:
+                url_segments = [x for x in url_segments if x[1] >= pivot_count]
+                break
+        return sorted(url_segments, key=itemgetter(1), reverse=True)
+
     # Class Methods
 
     # Public Methods
@@ -34,21 +188,42 @@ class HitListParser(object):
     def generate_hit_lists_for_all_servers(
             self,
             thresholds=ConfigManager.DEFAULT_THRESHOLDS,
-            hit_list_preamble=ConfigManager.HIT_LIST_FILE_PREAMBLE
+            hit_list_preamble=ConfigManager.HIT_LIST_FILE_PREAMBLE,
+            workers=ConfigManager.WORKER_COUNT,
     ):
         """
-        Generate hit lists for all server types found in self.results_directory.
+        Generate hit lists for all server types found in self.results_directory (see get_server_types). Once
+        every server type has been handled, a summary of the run is logged.
         :param thresholds: A list of thresholds to generate hit lists for.
         :param hit_list_preamble: The file name preamble to use for the hit list file that this method
         generates.
-        :return: None
+        :param workers: The number of worker processes to spread server types across.
+        :return: A list containing the summary of the hit lists generated for every server type (see
+        generate_hit_lists_for_server).
         """
-        for server_type in os.listdir(self.results_directory):
-            self.generate_hit_lists_for_server(
-                server_type=server_type,
-                thresholds=thresholds,
-                hit_list_preamble=hit_list_preamble,
-            )
+        start_time = time.time()
+        run_metrics = get_run_metrics()
+        with run_metrics.stage("generate_hit_lists"):
+            server_types = self.get_server_types()
+            if workers > 1 and len(server_types) > 1:
+                summaries = self.__generate_hit_lists_in_parallel(
+                    server_types=server_types,
+                    thresholds=thresholds,
+                    hit_list_preamble=hit_list_preamble,
+                    workers=workers,
+                )
+            else:
+                summaries = [
+                    self.generate_hit_lists_for_server(
+                        server_type=server_type,
+                        thresholds=thresholds,
+                        hit_list_preamble=hit_list_preamble,
+                    )
+                    for server_type in server_types
+                ]
+        self.__log_summary(summaries=summaries, elapsed_seconds=time.time() - start_time, workers=workers)
+        run_metrics.record_hit_lists(summaries=summaries)
+        return summaries
 
     def generate_hit_lists_for_server(
             self,
@@ -57,19 +232,162 @@ class HitListParser(object):
             hit_list_preamble=ConfigManager.HIT_LIST_FILE_PREAMBLE
     ):
         """
-        Generate hit lists for the given server type using the given thresholds.
+        Generate hit lists for the given server type using the given thresholds. The server's URL segments
+        are loaded and ranked once, and the cut-off for every threshold is found in a single walk over
+        the cumulative coverage of the ranked segments. If the server's URL segments were written pre-ranked,
+        they are streamed from disk only until the largest threshold has been reached. If self.coerced_hit_lists
+        is set, hit lists made up of only the server's coerced URL segments are generated as well, with
+        coverage measured against the total count of the coerced URL segments.
         :param server_type: The server type string to generate the hit list for.
         :param thresholds: A list of thresholds to generate hit lists for.
         :param hit_list_preamble: The file name preamble to use for the hit list file that this method
         generates.
-        :return: None
+        :return: A dictionary summarizing the hit lists generated for the server type, containing the
+        server_type, its hits_count, the cutoffs for every threshold, and the elapsed_seconds taken. If
+        coerced hit lists were generated, the coerced_hits_count and coerced_cutoffs are included as well.
         """
-        for threshold in thresholds:
-            self.generate_hit_list_for_server(
+        start_time = time.time()
+        logger.debug(
+            "Now generating hit lists for server type %s. Thresholds are %s."
+            % (server_type, ", ".join([str(x) for x in thresholds]))
+        )
+        hits_count = self.__get_total_hits_for_server_type(server_type=server_type)
+        ranked_segments, cutoffs = self.__get_ranked_segments(
+            server_type=server_type,
+            hits_count=hits_count,
+            thresholds=thresholds,
+        )
+        self.__write_hit_lists(
+            server_type=server_type,
+            thresholds=thresholds,
+            ranked_segments=ranked_segments,
+            cutoffs=cutoffs,
+            hit_list_preamble=hit_list_preamble,
+        )
+        to_return = {
+            "server_type": server_type,
+            "hits_count": hits_count,
+            "cutoffs": cutoffs,
+        }
+        if self.coerced_hit_lists:
+            coerced_hits_count, ranked_segments, cutoffs = self.__get_ranked_coerced_segments(
                 server_type=server_type,
-                threshold=threshold,
+                thresholds=thresholds,
+            )
+            if ranked_segments:
+                self.__write_hit_lists(
+                    server_type=server_type,
+                    thresholds=thresholds,
+                    ranked_segments=ranked_segments,
+                    cutoffs=cutoffs,
+                    hit_list_preamble="%s%s" % (hit_list_preamble, ConfigManager.COERCED_HIT_LIST_INFIX),
+                )
+            else:
+                logger.debug("Server type %s has no coerced URL segments to generate hit lists for." % (server_type,))
+            to_return["coerced_hits_count"] = coerced_hits_count
+            to_return["coerced_cutoffs"] = cutoffs
+        to_return["elapsed_seconds"] = time.time() - start_time
+        return to_return
+
+    def generate_hit_lists_from_aggregated_servers(
+            self,
+            aggregated_servers=None,
+            thresholds=ConfigManager.DEFAULT_THRESHOLDS,
+            hit_list_preamble=ConfigManager.HIT_LIST_FILE_PREAMBLE,
+    ):
+        """
+        Generate hit lists for every server type in the given aggregated results, without reading processed
+        results back from self.results_directory. Hit lists for a server type are generated as soon as it is
+        taken from the given iterable. Server types without a total count are skipped, as they would be if
+        they were read back.
+        :param aggregated_servers: An iterable of tuples containing (1) the server type, (2) its total count or
+        None, and (3) a list of its (URL segment, count) tuples (see SegmentAggregator.iter_servers).
+        :param thresholds: A list of thresholds to generate hit lists for.
+        :param hit_list_preamble: The file name preamble to use for the hit list files that this method
+        generates.
+        :return: A list containing the summary of the hit lists generated for every server type (see
+        generate_hit_lists_for_server).
+        """
+        start_time = time.time()
+        summaries = []
+        for server_type, total_count, url_segments in aggregated_servers:
+            if total_count is None:
+                continue
+            summaries.append(self.generate_hit_lists_from_segments(
+                server_type=server_type,
+                hits_count=total_count,
+                url_segments=url_segments,
+                thresholds=thresholds,
                 hit_list_preamble=hit_list_preamble,
+            ))
+        self.__log_summary(summaries=summaries, elapsed_seconds=time.time() - start_time, workers=1)
+        get_run_metrics().record_hit_lists(summaries=summaries)
+        return summaries
+
+    def generate_hit_lists_from_segments(
+            self,
+            server_type=None,
+            hits_count=None,
+            url_segments=None,
+            thresholds=ConfigManager.DEFAULT_THRESHOLDS,
+            hit_list_preamble=ConfigManager.HIT_LIST_FILE_PREAMBLE,
+    ):
+        """
+        Generate hit lists for the given server type from the given URL segments instead of from the results
+        processed for it. URL segments are ranked in the same order that they would be if they were written
+        out and read back, so the hit lists are identical to those generated by generate_hit_lists_for_server.
+        :param server_type: The server type string to generate the hit lists for.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param url_segments: A list of (URL segment, count) tuples, including coerced URL segments, in the
+        order that they are written in.
+        :param thresholds: A list of thresholds to generate hit lists for.
+        :param hit_list_preamble: The file name preamble to use for the hit list files that this method
+        generates.
+        :return: A dictionary summarizing the hit lists generated for the server type (see
+        generate_hit_lists_for_server).
+        """
+        start_time = time.time()
+        url_segments, coerced_segments = split_coerced_segments(url_segments=url_segments)
+        ranked_segments, cutoffs = self.__rank_url_segments(
+            url_segments=url_segments + coerced_segments if self.include_coerced else url_segments,
+            server_type=server_type,
+            hits_count=hits_count,
+            thresholds=thresholds,
+        )
+        self.__write_hit_lists(
+            server_type=server_type,
+            thresholds=thresholds,
+            ranked_segments=ranked_segments,
+            cutoffs=cutoffs,
+            hit_list_preamble=hit_list_preamble,
+        )
+        to_return = {
+            "server_type": server_type,
+            "hits_count": hits_count,
+            "cutoffs": cutoffs,
+        }
+        if self.coerced_hit_lists:
+            coerced_hits_count = sum([x[1] for x in coerced_segments])
+            ranked_segments, cutoffs = self.__rank_url_segments(
+                url_segments=coerced_segments,
+                server_type=server_type,
+                hits_count=coerced_hits_count,
+                thresholds=thresholds,
             )
+            if ranked_segments:
+                self.__write_hit_lists(
+                    server_type=server_type,
+                    thresholds=thresholds,
+                    ranked_segments=ranked_segments,
+                    cutoffs=cutoffs,
+                    hit_list_preamble="%s%s" % (hit_list_preamble, ConfigManager.COERCED_HIT_LIST_INFIX),
+                )
+            else:
+                logger.debug("Server type %s has no coerced URL segments to generate hit lists for." % (server_type,))
+            to_return["coerced_hits_count"] = coerced_hits_count
+            to_return["coerced_cutoffs"] = cutoffs
+        to_return["elapsed_seconds"] = time.time() - start_time
+        return to_return
 
     def generate_hit_list_for_server(
             self,
@@ -85,41 +403,269 @@ class HitListParser(object):
         generates.
         :return: None
         """
-        logger.debug(
-            "Now generating hit list for server type %s. Threshold is %s."
-            % (server_type, threshold)
+        self.generate_hit_lists_for_server(
+            server_type=server_type,
+            thresholds=[threshold],
+            hit_list_preamble=hit_list_preamble,
         )
+
+    def get_ranked_segment_counts(self, server_type=None):
+        """
+        Get every URL segment for the given server type along with its count, ranked in the same order that
+        hit lists are written in. Whether coerced URL segments are left out or included is governed by
+        self.include_coerced.
+        :param server_type: A string depicting the server to rank the URL segments for.
+        :return: A tuple containing (1) the total number of hits that coverage is measured against and (2) a
+        list of (URL segment, count) tuples ranked by descending count.
+        """
         hits_count = self.__get_total_hits_for_server_type(server_type=server_type)
+        if self.store == SQLITE_STORE:
+            with self.__open_store() as result_store:
+                rows = result_store.iter_ranked_segments(
+                    server_type=server_type,
+                    coerced=None if self.include_coerced else False,
+                )
+                return hits_count, list(rows)
+        header = self.__get_segments_header(server_type=server_type)
+        excludes_coerced = header is not None and header["excludes_coerced"]
         url_segments = self.__get_url_segments_for_server_type(server_type=server_type)
+        if excludes_coerced and self.include_coerced:
+            url_segments.extend(self.__get_url_segments_for_server_type(
+                server_type=server_type,
+                file_names=(ConfigManager.COERCED_PATH_FILE_NAME, ConfigManager.BINARY_COERCED_PATH_FILE_NAME),
+            ))
+        elif not excludes_coerced and not self.include_coerced:
+            url_segments = [x for x in url_segments if not is_coerced_segment(x[0])]
+        return hits_count, sorted(url_segments, key=itemgetter(1), reverse=True)
+
+    def get_server_types(self):
+        """
+        Get all of the server types found in self.results_directory, largest first. Server types are found at
+        any depth (ex: Microsoft-IIS/7.5, or the server families in the ConfigManager.FAMILY_DIRECTORY_NAME
+        directory), and are sized by their URL segments files. Directories that do not contain a server count
+        file are skipped, and the processing manifest's state directory is not searched.
+        :return: A list of server types as paths relative to self.results_directory, ordered by the size of
+        their URL segments files from largest to smallest. If results are read from the sqlite store, server
+        types are ordered by their number of stored URL segments instead.
+        """
+        if self.store == SQLITE_STORE:
+            with self.__open_store() as result_store:
+                return result_store.get_server_types()
+        server_sizes = []
+        for directory, child_directories, file_names in os.walk(self.results_directory):
+            if ConfigManager.STATE_DIRECTORY_NAME in child_directories:
+                child_directories.remove(ConfigManager.STATE_DIRECTORY_NAME)
+            if directory == self.results_directory:
+                continue
+            server_type = os.path.relpath(directory, self.results_directory)
+            if ConfigManager.SERVER_COUNT_FILE_NAME not in file_names:
+                logger.debug(
+                    "Skipping %s as it does not contain processed results for a server type."
+                    % (server_type,)
+                )
+                continue
+            size = 0
+            for file_name in [ConfigManager.BINARY_URL_PATH_FILE_NAME, ConfigManager.URL_PATH_FILE_NAME]:
+                if file_name in file_names:
+                    size = os.path.getsize(os.path.join(directory, file_name))
+                    break
+            server_sizes.append((size, server_type))
+        return [x[1] for x in sorted(server_sizes, key=itemgetter(0), reverse=True)]
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __generate_hit_lists_in_parallel(
+            self,
+            server_types=None,
+            thresholds=None,
+            hit_list_preamble=None,
+            workers=None,
+    ):
+        """
+        Generate hit lists for the given server types using a pool of worker processes. Server types are
+        scheduled in the given order, and log records from the workers are written out by this process.
+        :param server_types: The server types to generate hit lists for, largest first.
+        :param thresholds: A list of thresholds to generate hit lists for.
+        :param hit_list_preamble: The file name preamble to use for hit list files.
+        :param workers: The number of worker processes to use.
+        :return: A list containing the summary of the hit lists generated for every server type, in order
+        of completion.
+        """
         logger.debug(
-            "There were a total of %s hits for server type %s. Now processing %s URL segments to find threshold of %s."
-            % (hits_count, server_type, len(url_segments), threshold)
+            "Now generating hit lists for %s server types using %s worker processes."
+            % (len(server_types), workers)
         )
-        coverage_count = 0
-        threshold_percentage = 0.01 * threshold
-        hit_list_segments = []
-        for url_segment, segment_count in url_segments:
-            hit_list_segments.append(url_segment)
-            coverage_count += segment_count
-            coverage_percent = float(coverage_count) / hits_count
-            if coverage_percent >= threshold_percentage:
-                break
-        logger.debug(
-            "To achieve coverage of %s for server %s, %s URL segments are required."
-            % (threshold, server_type, len(hit_list_segments))
+        log_queue = multiprocessing.Queue()
+        log_listener = QueueLogListener(log_queue)
+        log_listener.start()
+        pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=initialize_worker,
+            initargs=(log_queue, ConfigManager.LOGGING_LEVEL),
         )
-        file_name = "%s%s" % (hit_list_preamble, threshold)
+        try:
+            worker_args = [
+                (
+                    self.results_directory,
+                    self.engine,
+                    self.include_coerced,
+                    self.coerced_hit_lists,
+                    self.store,
+                    x,
+                    thresholds,
+                    hit_list_preamble,
+                )
+                for x in server_types
+            ]
+            summaries = list(pool.imap_unordered(_generate_hit_lists_in_worker, worker_args))
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            log_listener.stop()
+        return summaries
+
+    def __get_binary_segments_path(self, server_type=None, file_name=ConfigManager.BINARY_URL_PATH_FILE_NAME):
+        """
+        Get the path to the given binary URL segments file for the given server type, if one exists.
+        :param server_type: A string depicting the server to get the binary URL segments file for.
+        :param file_name: The name of the binary URL segments file.
+        :return: The path to the binary URL segments file, or None if the server type does not have one.
+        """
         file_path = os.path.join(self.results_directory, server_type, file_name)
-        logger.debug(
-            "Writing contents of hit list for server type %s and threshold %s to file %s."
-            % (server_type, threshold, file_path)
+        if os.path.isfile(file_path):
+            return file_path
+        return None
+
+    def __get_ranked_coerced_segments(self, server_type=None, thresholds=None):
+        """
+        Rank the coerced URL segments for the given server type, and find the cut-off for every one of the
+        given thresholds. If coerced URL segments were split out of the server's url_segments file when it was
+        processed, they are read from the coerced_segments file (and streamed from it if it was written
+        pre-ranked). Otherwise they are picked out of the url_segments file.
+        :param server_type: A string depicting the server to rank the coerced URL segments for.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :return: A tuple containing (1) the total count of the coerced URL segments, which coverage is
+        measured against, (2) a list of the leading ranked coerced URL segments needed by the largest cut-off,
+        and (3) a dictionary mapping every threshold to its cut-off (see get_threshold_cutoffs).
+        """
+        if self.store == SQLITE_STORE:
+            with self.__open_store() as result_store:
+                hits_count = result_store.get_segment_total(server_type=server_type, coerced=True)
+            ranked_segments, cutoffs = self.__stream_stored_segments(
+                server_type=server_type,
+                hits_count=hits_count,
+                thresholds=thresholds,
+                coerced=True,
+            )
+            return hits_count, ranked_segments, cutoffs
+        file_names = (ConfigManager.COERCED_PATH_FILE_NAME, ConfigManager.BINARY_COERCED_PATH_FILE_NAME)
+        header = self.__get_segments_header(server_type=server_type)
+        if header is not None and header["excludes_coerced"]:
+            coerced_header = self.__get_segments_header(server_type=server_type, file_names=file_names)
+            if coerced_header is not None and coerced_header["sorted"]:
+                hits_count = coerced_header["total_count"]
+                ranked_segments, cutoffs = self.__stream_ranked_segments(
+                    server_type=server_type,
+                    hits_count=hits_count,
+                    thresholds=thresholds,
+                    file_names=file_names,
+                    filter_coerced=False,
+                )
+                return hits_count, ranked_segments, cutoffs
+            url_segments = self.__get_url_segments_for_server_type(server_type=server_type, file_names=file_names)
+        else:
+            url_segments = self.__get_url_segments_for_server_type(server_type=server_type)
+            url_segments = [x for x in url_segments if is_coerced_segment(x[0])]
+        hits_count = sum([x[1] for x in url_segments])
+        ranked_segments, cutoffs = self.__rank_url_segments(
+            url_segments=url_segments,
+            server_type=server_type,
+            hits_count=hits_count,
+            thresholds=thresholds,
         )
-        with open(file_path, "w+") as f:
-            f.write("\n".join(hit_list_segments))
+        return hits_count, ranked_segments, cutoffs
 
-    # Protected Methods
+    def __get_ranked_segments(self, server_type=None, hits_count=None, thresholds=None):
+        """
+        Rank the URL segments for the given server type, and find the cut-off for every one of the given
+        thresholds. Whether coerced URL segments are left out or included is governed by self.include_coerced.
+        URL segments are checked for coerced values only if they were not split out of the server's
+        url_segments file when it was processed.
+        :param server_type: A string depicting the server to rank the URL segments for.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :return: A tuple containing (1) a list of the leading ranked URL segments needed by the largest
+        cut-off and (2) a dictionary mapping every threshold to its cut-off (see get_threshold_cutoffs).
+        """
+        if self.store == SQLITE_STORE:
+            return self.__stream_stored_segments(
+                server_type=server_type,
+                hits_count=hits_count,
+                thresholds=thresholds,
+                coerced=None if self.include_coerced else False,
+            )
+        header = self.__get_segments_header(server_type=server_type)
+        excludes_coerced = header is not None and header["excludes_coerced"]
+        if header is not None and header["sorted"] and not (excludes_coerced and self.include_coerced):
+            logger.debug(
+                "URL segments for server type %s are pre-ranked (%s segments, %s total count). There were a "
+                "total of %s hits. Now streaming URL segments to find thresholds."
+                % (server_type, header["segment_count"], header["total_count"], hits_count)
+            )
+            return self.__stream_ranked_segments(
+                server_type=server_type,
+                hits_count=hits_count,
+                thresholds=thresholds,
+                filter_coerced=not excludes_coerced and not self.include_coerced,
+            )
+        url_segments = self.__get_url_segments_for_server_type(server_type=server_type)
+        if excludes_coerced and self.include_coerced:
+            url_segments.extend(self.__get_url_segments_for_server_type(
+                server_type=server_type,
+                file_names=(ConfigManager.COERCED_PATH_FILE_NAME, ConfigManager.BINARY_COERCED_PATH_FILE_NAME),
+            ))
+        elif not excludes_coerced and not self.include_coerced:
+            url_segments = [x for x in url_segments if not is_coerced_segment(x[0])]
+        return self.__rank_url_segments(
+            url_segments=url_segments,
+            server_type=server_type,
+            hits_count=hits_count,
+            thresholds=thresholds,
+        )
 
-    # Private Methods
+    def __get_segments_header(
+            self,
+            server_type=None,
+            file_names=(ConfigManager.URL_PATH_FILE_NAME, ConfigManager.BINARY_URL_PATH_FILE_NAME),
+    ):
+        """
+        Get the header of the given URL segments file for the given server type. The binary file is read
+        instead of the text one if it exists.
+        :param server_type: A string depicting the server to get the header for.
+        :param file_names: A tuple containing the names of (1) the text and (2) the binary file.
+        :return: A dictionary containing the sorted and excludes_coerced flags and the segment_count and
+        total_count values (see parse_segments_header), or None if the file does not exist or does not have
+        a header.
+        """
+        binary_path = self.__get_binary_segments_path(server_type=server_type, file_name=file_names[1])
+        if binary_path is not None:
+            with BinarySegmentFile(binary_path) as segment_file:
+                return {
+                    "sorted": segment_file.is_sorted,
+                    "excludes_coerced": segment_file.excludes_coerced,
+                    "segment_count": segment_file.segment_count,
+                    "total_count": segment_file.total_count,
+                }
+        file_path = os.path.join(self.results_directory, server_type, file_names[0])
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, "r") as f:
+            return parse_segments_header(f.readline())
 
     def __get_total_hits_for_server_type(
             self,
@@ -132,6 +678,9 @@ class HitListParser(object):
         :param count_file_name: The name of the file to retrieve the count from.
         :return: An integer representing the number of URL segments found for the given server type.
         """
+        if self.store == SQLITE_STORE:
+            with self.__open_store() as result_store:
+                return result_store.get_total_count(server_type=server_type)
         file_path = os.path.join(self.results_directory, server_type, count_file_name)
         with open(file_path, "r") as f:
             content = f.read().strip()
@@ -140,43 +689,314 @@ class HitListParser(object):
     def __get_url_segments_for_server_type(
             self,
             server_type=None,
-            segments_file_name=ConfigManager.URL_PATH_FILE_NAME,
-            do_sort=True,
-            filter_coerced=True,
+            file_names=(ConfigManager.URL_PATH_FILE_NAME, ConfigManager.BINARY_URL_PATH_FILE_NAME),
     ):
         """
-        Get a list of tuples containing all of the URL segments found for the given server type.
-        :param server_type: A string depicting the server to retrieve the URL segments count for.
-        :param segments_file_name: The name of the file to retrieve the segments from.
-        :param do_sort: Whether or not to sort the results before returning them.
-        :param filter_coerced: Whether or not to filter out URL segments that contain coerced values (ex:
-        [[INTEGER]].
+        Get a list of tuples containing all of the URL segments found in the given URL segments file for the
+        given server type, in file order. The binary file is read instead of the text one if it exists.
+        :param server_type: A string depicting the server to retrieve the URL segments for.
+        :param file_names: A tuple containing the names of (1) the text and (2) the binary file.
         :return: A list of tuples containing (1) the URL segment and (2) the count for all URL segments
-        associated with the given server type.
+        found in the file, or an empty list if the file does not exist.
         """
         logger.debug(
-            "Now retrieving URL segments for server type %s."
-            % (server_type,)
+            "Now retrieving URL segments for server type %s from %s."
+            % (server_type, file_names[0])
         )
-        file_path = os.path.join(self.results_directory, server_type, segments_file_name)
+        binary_path = self.__get_binary_segments_path(server_type=server_type, file_name=file_names[1])
+        if binary_path is not None:
+            with BinarySegmentFile(binary_path) as segment_file:
+                return list(segment_file.iter_segments())
+        file_path = os.path.join(self.results_directory, server_type, file_names[0])
+        if not os.path.isfile(file_path):
+            return []
         with open(file_path, "r") as f:
             content_lines = [x.strip() for x in f.read().strip().split("\n")]
         to_return = []
         for line in content_lines:
+            if not line or parse_segments_header(line) is not None:
+                continue
             url_segment, segment_count = line.split("\t")
             to_return.append((url_segment, int(segment_count)))
-        if do_sort:
+        return to_return
+
+    def __iter_binary_ranked_segment_counts(self, segment_file=None, ranked_segments=None, filter_coerced=True):
+        """
+        Iterate over the counts of the URL segments found in the given pre-ranked binary URL segments file,
+        appending each segment to the given list as its count is yielded.
+        :param segment_file: The open BinarySegmentFile.
+        :param ranked_segments: The list to append URL segments to.
+        :param filter_coerced: Whether or not to skip URL segments that contain coerced values.
+        :return: A generator yielding URL segment counts in ranked order.
+        """
+        counts = segment_file.counts
+        get_segment = segment_file.get_segment
+        for index in range(segment_file.segment_count):
+            url_segment = get_segment(index)
+            if filter_coerced and is_coerced_segment(url_segment):
+                continue
+            ranked_segments.append(url_segment)
+            yield counts[index]
+
+    def __iter_ranked_segment_counts(self, f=None, ranked_segments=None, filter_coerced=True):
+        """
+        Iterate over the counts of the URL segments found in the given pre-ranked URL segments file,
+        appending each segment to the given list as its count is yielded.
+        :param f: The open URL segments file, positioned after its header.
+        :param ranked_segments: The list to append URL segments to.
+        :param filter_coerced: Whether or not to skip URL segments that contain coerced values.
+        :return: A generator yielding URL segment counts in ranked order.
+        """
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            url_segment, segment_count = line.split("\t")
+            if filter_coerced and is_coerced_segment(url_segment):
+                continue
+            ranked_segments.append(url_segment)
+            yield int(segment_count)
+
+    def __iter_stored_segment_counts(self, rows=None, ranked_segments=None):
+        """
+        Iterate over the counts of the given URL segment rows read from the sqlite store, appending each
+        segment to the given list as its count is yielded.
+        :param rows: An iterable of (URL segment, count) tuples in ranked order.
+        :param ranked_segments: The list to append URL segments to.
+        :return: A generator yielding URL segment counts in ranked order.
+        """
+        for url_segment, segment_count in rows:
+            ranked_segments.append(url_segment)
+            yield segment_count
+
+    def __log_summary(self, summaries=None, elapsed_seconds=None, workers=None):
+        """
+        Log a summary of the hit lists generated for all server types.
+        :param summaries: A list containing the summary of the hit lists generated for every server type.
+        :param elapsed_seconds: The number of seconds that generating all of the hit lists took.
+        :param workers: The number of worker processes that hit lists were generated with.
+        :return: None
+        """
+        if not summaries:
+            logger.debug("No server types were found in %s." % (self.results_directory,))
+            return
+        slowest = max(summaries, key=itemgetter("elapsed_seconds"))
+        largest = max(summaries, key=lambda x: max(x["cutoffs"].values() or [0]))
+        logger.debug(
+            "Generated hit lists for %s server types in %.2f seconds using %s worker processes (%.2f seconds "
+            "of server time). The slowest server type was %s (%.2f seconds), and the largest hit list was %s "
+            "URL segments long (%s)."
+            % (
+                len(summaries),
+                elapsed_seconds,
+                workers,
+                sum([x["elapsed_seconds"] for x in summaries]),
+                slowest["server_type"],
+                slowest["elapsed_seconds"],
+                max(largest["cutoffs"].values() or [0]),
+                largest["server_type"],
+            )
+        )
+
+    def __open_store(self):
+        """
+        Open the SQLiteResultStore in self.results_directory.
+        :return: The opened SQLiteResultStore.
+        """
+        return SQLiteResultStore(os.path.join(self.results_directory, ConfigManager.SQLITE_DATABASE_NAME))
+
+    def __rank_url_segments(self, url_segments=None, server_type=None, hits_count=None, thresholds=None):
+        """
+        Rank the given URL segments, and find the cut-off for every one of the given thresholds.
+        :param url_segments: A list of (URL segment, count) tuples in file order.
+        :param server_type: A string depicting the server that the URL segments were found for.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :return: A tuple containing (1) a list of the leading ranked URL segments needed by the largest
+        cut-off and (2) a dictionary mapping every threshold to its cut-off (see get_threshold_cutoffs).
+        """
+        logger.debug(
+            "There were a total of %s hits for server type %s. Now processing %s URL segments to find thresholds."
+            % (hits_count, server_type, len(url_segments))
+        )
+        if self.use_numpy:
+            return self.rank_segments_with_numpy(
+                url_segments=url_segments,
+                hits_count=hits_count,
+                thresholds=thresholds,
+            )
+        url_segments = self.select_ranked_segments(
+            url_segments=url_segments,
+            hits_count=hits_count,
+            thresholds=thresholds,
+        )
+        cutoffs = self.get_threshold_cutoffs(
+            segment_counts=[x[1] for x in url_segments],
+            hits_count=hits_count,
+            thresholds=thresholds,
+        )
+        return [x[0] for x in url_segments[:max(cutoffs.values() or [0])]], cutoffs
+
+    def __stream_ranked_segments(
+            self,
+            server_type=None,
+            hits_count=None,
+            thresholds=None,
+            file_names=(ConfigManager.URL_PATH_FILE_NAME, ConfigManager.BINARY_URL_PATH_FILE_NAME),
+            filter_coerced=True,
+    ):
+        """
+        Read the leading URL segments needed to reach every one of the given thresholds from the given
+        pre-ranked URL segments file for the given server type. The binary file is read instead of the text
+        one if it exists.
+        :param server_type: A string depicting the server to retrieve the URL segments for.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :param file_names: A tuple containing the names of (1) the text and (2) the binary file.
+        :param filter_coerced: Whether or not to skip URL segments that contain coerced values.
+        :return: A tuple containing (1) a list of the leading ranked URL segments needed by the largest
+        cut-off and (2) a dictionary mapping every threshold to its cut-off (see get_threshold_cutoffs).
+        """
+        ranked_segments = []
+        binary_path = self.__get_binary_segments_path(server_type=server_type, file_name=file_names[1])
+        if binary_path is not None:
+            with BinarySegmentFile(binary_path) as segment_file:
+                cutoffs = self.get_threshold_cutoffs(
+                    segment_counts=self.__iter_binary_ranked_segment_counts(
+                        segment_file=segment_file,
+                        ranked_segments=ranked_segments,
+                        filter_coerced=filter_coerced,
+                    ),
+                    hits_count=hits_count,
+                    thresholds=thresholds,
+                )
+            return ranked_segments, cutoffs
+        file_path = os.path.join(self.results_directory, server_type, file_names[0])
+        with open(file_path, "r") as f:
+            f.readline()
+            cutoffs = self.get_threshold_cutoffs(
+                segment_counts=self.__iter_ranked_segment_counts(
+                    f=f,
+                    ranked_segments=ranked_segments,
+                    filter_coerced=filter_coerced,
+                ),
+                hits_count=hits_count,
+                thresholds=thresholds,
+            )
+        return ranked_segments, cutoffs
+
+    def __stream_stored_segments(self, server_type=None, hits_count=None, thresholds=None, coerced=None):
+        """
+        Read the leading URL segments needed to reach every one of the given thresholds for the given server
+        type from the sqlite store. The URL segments are read with a single query ordered by the store's server
+        and count index, their cumulative count is summed as they are read, and reading stops as soon as the
+        largest threshold has been reached.
+        :param server_type: A string depicting the server to retrieve the URL segments for.
+        :param hits_count: The total number of hits that coverage is measured against.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :param coerced: True to only read URL segments that contain coerced values, False to only read those
+        that do not, or None to read all of them.
+        :return: A tuple containing (1) a list of the leading ranked URL segments needed by the largest
+        cut-off and (2) a dictionary mapping every threshold to its cut-off (see get_threshold_cutoffs).
+        """
+        logger.debug(
+            "There were a total of %s hits for server type %s. Now querying ranked URL segments to find thresholds."
+            % (hits_count, server_type)
+        )
+        ranked_segments = []
+        with self.__open_store() as result_store:
+            rows = result_store.iter_ranked_segments(server_type=server_type, coerced=coerced)
+            try:
+                cutoffs = self.get_threshold_cutoffs(
+                    segment_counts=self.__iter_stored_segment_counts(rows=rows, ranked_segments=ranked_segments),
+                    hits_count=hits_count,
+                    thresholds=thresholds,
+                )
+            finally:
+                rows.close()
+        return ranked_segments, cutoffs
+
+    def __write_hit_list(self, server_type=None, threshold=None, hit_list_segments=None, hit_list_preamble=None):
+        """
+        Write the given hit list for the given server type and threshold to disk.
+        :param server_type: The server type string that the hit list was generated for.
+        :param threshold: The coverage threshold that the hit list was generated for.
+        :param hit_list_segments: The URL segments in the hit list, in ranked order.
+        :param hit_list_preamble: The file name preamble to use for the hit list file.
+        :return: None
+        """
+        file_name = "%s%s" % (hit_list_preamble, threshold)
+        directory = os.path.join(self.results_directory, server_type)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        file_path = os.path.join(directory, file_name)
+        logger.debug(
+            "Writing contents of hit list for server type %s and threshold %s to file %s."
+            % (server_type, threshold, file_path)
+        )
+        with open(file_path, "w+") as f:
+            f.write("\n".join(hit_list_segments))
+
+    def __write_hit_lists(
+            self,
+            server_type=None,
+            thresholds=None,
+            ranked_segments=None,
+            cutoffs=None,
+            hit_list_preamble=None,
+    ):
+        """
+        Write the hit lists for every one of the given thresholds for the given server type to disk.
+        :param server_type: The server type string that the hit lists were generated for.
+        :param thresholds: A list of coverage thresholds (as percentages).
+        :param ranked_segments: The leading ranked URL segments needed by the largest cut-off.
+        :param cutoffs: A dictionary mapping every threshold to its cut-off (see get_threshold_cutoffs).
+        :param hit_list_preamble: The file name preamble to use for the hit list files.
+        :return: None
+        """
+        for threshold in thresholds:
+            cutoff = cutoffs[threshold]
             logger.debug(
-                "Now sorting URL segments for server type %s. Total segments count is %s."
-                % (server_type, len(to_return))
+                "To achieve coverage of %s for server %s, %s URL segments are required."
+                % (threshold, server_type, cutoff)
+            )
+            self.__write_hit_list(
+                server_type=server_type,
+                threshold=threshold,
+                hit_list_segments=ranked_segments[:cutoff],
+                hit_list_preamble=hit_list_preamble,
             )
-            to_return = sorted(to_return, key=lambda x: x[1], reverse=True)
-        if filter_coerced:
-            to_return = filter(lambda x: not self.COERCED_REGEX.findall(x[0]), to_return)
-        return to_return
 
     # Properties
 
+    @property
+    def coerced_hit_lists(self):
+        """
+        Get whether or not this parser also generates hit lists made up of only coerced URL segments.
+        :return: whether or not this parser also generates hit lists made up of only coerced URL segments.
+        """
+        return self._coerced_hit_lists
+
+    @property
+    def engine(self):
+        """
+        Get the engine that this parser was configured to rank URL segments with.
+        :return: the engine that this parser was configured to rank URL segments with.
+        """
+        return self._engine
+
+    @property
+    def include_coerced(self):
+        """
+        Get whether or not URL segments that contain coerced values are included in hit lists.
+        :return: whether or not URL segments that contain coerced values are included in hit lists.
+        """
+        return self._include_coerced
+
     @property
     def results_directory(self):
         """
@@ -185,6 +1005,22 @@ class HitListParser(object):
         """
         return self._results_directory
 
+    @property
+    def store(self):
+        """
+        Get the results store that this parser reads processed results from.
+        :return: the results store that this parser reads processed results from.
+        """
+        return self._store
+
+    @property
+    def use_numpy(self):
+        """
+        Get whether or not this parser ranks URL segments and finds threshold cut-offs using NumPy.
+        :return: whether or not this parser ranks URL segments and finds threshold cut-offs using NumPy.
+        """
+        return self._use_numpy
+
     # Representation and Comparison
 
     def __repr__(self):
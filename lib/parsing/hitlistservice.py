@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from collections import OrderedDict
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+try:
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from urlparse import parse_qs, urlparse
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+
+logger = get_logger_for_name(__name__)
+
+HIT_LIST_PATH = "/hit-list"
+SERVER_TYPES_PATH = "/server-types"
+
+
+class _HitListRequestHandler(BaseHTTPRequestHandler):
+    """
+    This is a request handler that answers HTTP GET requests through the HitListService of the server that
+    received them.
+    """
+
+    def do_GET(self):
+        status, body = self.server.service.handle_request(self.path)
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+
+class HitListService(object):
+    """
+    This class answers requests for the hit list of a server type at an arbitrary coverage threshold, or for
+    its top N URL segments, from a CoverageIndex. Rendered responses are kept in an LRU cache. Requests are
+    served either over a local HTTP endpoint or line by line from a stream for scripting.
+
+    Requests take the form of a path and query string (ex: /hit-list?server_type=nginx&threshold=97.5 or
+    /hit-list?server_type=nginx&top=500). A bare query string is treated as a hit list request, and
+    /server-types lists the server types held by the index. Every response starts with a header line
+    containing its status and the number of lines that follow it.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, coverage_index=None, cache_size=ConfigManager.SERVICE_CACHE_SIZE):
+        self._coverage_index = coverage_index
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    # Static Methods
+
+    @staticmethod
+    def format_response(status=None, lines=None, **fields):
+        """
+        Render a response made up of a header line followed by the given lines.
+        :param status: The HTTP status code of the response.
+        :param lines: A list of the lines that follow the header line.
+        :param fields: Additional key-value pairs to include in the header line.
+        :return: A tuple containing (1) the status code and (2) the rendered response.
+        """
+        lines = lines or []
+        header_fields = ["status=%s" % (status,), "line_count=%s" % (len(lines),)]
+        header_fields.extend(["%s=%s" % (key, fields[key]) for key in sorted(fields.keys())])
+        header = "\t".join([ConfigManager.SERVICE_RESPONSE_PREAMBLE] + header_fields)
+        return status, "\n".join([header] + lines) + "\n"
+
+    # Class Methods
+
+    # Public Methods
+
+    def handle_request(self, request):
+        """
+        Answer the given request, using a cached response if one exists.
+        :param request: The path and query string of the request.
+        :return: A tuple containing (1) the HTTP status code and (2) the rendered response.
+        """
+        request = request.strip()
+        if not request.startswith("/"):
+            request = "%s?%s" % (HIT_LIST_PATH, request)
+        parsed = urlparse(request)
+        if parsed.path not in [HIT_LIST_PATH, SERVER_TYPES_PATH]:
+            return self.format_response(status=404, error="%s is not a valid path." % (parsed.path,))
+        try:
+            key = self.__get_cache_key(path=parsed.path, query=parse_qs(parsed.query))
+        except ValueError as e:
+            return self.format_response(status=400, error=e)
+        response = self._cache.pop(key, None)
+        if response is not None:
+            self._cache_hits += 1
+        else:
+            self._cache_misses += 1
+            response = self.__render_response(key)
+            if response[0] != 200:
+                return response
+            while len(self._cache) >= self._cache_size > 0:
+                self._cache.popitem(last=False)
+        if self._cache_size > 0:
+            self._cache[key] = response
+        return response
+
+    def serve_http(self, host=ConfigManager.SERVICE_HOST, port=ConfigManager.SERVICE_PORT):
+        """
+        Serve requests over HTTP on the given host and port until interrupted.
+        :param host: The host to listen on.
+        :param port: The port to listen on.
+        :return: None
+        """
+        http_server = HTTPServer((host, port), _HitListRequestHandler)
+        http_server.service = self
+        logger.info(
+            "Now serving hit lists for %s server types at http://%s:%s%s."
+            % (len(self.coverage_index.server_types), host, http_server.server_port, HIT_LIST_PATH)
+        )
+        try:
+            http_server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Interrupted. Shutting down hit list service.")
+        finally:
+            http_server.server_close()
+            self.__log_summary()
+
+    def serve_stream(self, input_stream=None, output_stream=None):
+        """
+        Answer every non-empty line read from the given input stream as a request, writing each response to
+        the given output stream as soon as it is rendered.
+        :param input_stream: The stream to read requests from.
+        :param output_stream: The stream to write responses to.
+        :return: None
+        """
+        for line in iter(input_stream.readline, ""):
+            if not line.strip():
+                continue
+            _, response = self.handle_request(line)
+            output_stream.write(response)
+            output_stream.flush()
+        self.__log_summary()
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __get_cache_key(self, path=None, query=None):
+        """
+        Validate the given request and normalize it into a key for the response cache.
+        :param path: The path of the request.
+        :param query: A dictionary mapping query string parameters to lists of their values.
+        :return: A tuple identifying the response to the request.
+        """
+        if path == SERVER_TYPES_PATH:
+            return (path,)
+        server_type = query.get("server_type", [None])[0]
+        if not server_type:
+            raise ValueError("A server_type must be given.")
+        if ("threshold" in query) == ("top" in query):
+            raise ValueError("Exactly one of threshold or top must be given.")
+        if "threshold" in query:
+            threshold = float(query["threshold"][0])
+            if not 0 <= threshold <= 100:
+                raise ValueError("The threshold must be between 0 and 100.")
+            return path, server_type, "threshold", threshold
+        top = int(query["top"][0])
+        if top < 0:
+            raise ValueError("The number of top URL segments must not be negative.")
+        return path, server_type, "top", top
+
+    def __log_summary(self):
+        """
+        Log a summary of the requests answered by this service.
+        :return: None
+        """
+        logger.debug(
+            "Answered %s requests (%s from the response cache)."
+            % (self._cache_hits + self._cache_misses, self._cache_hits)
+        )
+
+    def __render_response(self, key):
+        """
+        Render the response to the request identified by the given cache key.
+        :param key: The tuple identifying the request (see __get_cache_key).
+        :return: A tuple containing (1) the HTTP status code and (2) the rendered response.
+        """
+        index = self.coverage_index
+        if key[0] == SERVER_TYPES_PATH:
+            lines = [
+                "%s\t%s\t%s" % (x, index.get_hits_count(server_type=x), index.get_segment_count(server_type=x))
+                for x in index.server_types
+            ]
+            return self.format_response(status=200, lines=lines)
+        _, server_type, mode, value = key
+        if not index.has_server_type(server_type=server_type):
+            return self.format_response(status=404, error="%s is not a known server type." % (server_type,))
+        if mode == "threshold":
+            segment_count = index.get_cutoff(server_type=server_type, threshold=value)
+        else:
+            segment_count = value
+        lines = index.get_top_segments(server_type=server_type, segment_count=segment_count)
+        return self.format_response(
+            status=200,
+            lines=lines,
+            server_type=server_type,
+            hits_count=index.get_hits_count(server_type=server_type),
+            coverage="%.4f" % (index.get_coverage(server_type=server_type, segment_count=len(lines)),),
+        )
+
+    # Properties
+
+    @property
+    def cache_size(self):
+        """
+        Get the maximum number of rendered responses kept in the response cache.
+        :return: the maximum number of rendered responses kept in the response cache.
+        """
+        return self._cache_size
+
+    @property
+    def coverage_index(self):
+        """
+        Get the CoverageIndex that this service answers requests from.
+        :return: the CoverageIndex that this service answers requests from.
+        """
+        return self._coverage_index
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s (%s cached)>" % (self.__class__.__name__, self.coverage_index, len(self._cache))
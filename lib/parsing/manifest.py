@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import shutil
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+from .aggregator import SegmentAggregator
+from .binarysegments import pack_binary_segments, unpack_binary_segments
+from .compression import detect_compression, open_decompressed_stream
+from .objectstore import get_object_store, is_object_url
+
+logger = get_logger_for_name(__name__)
+
+MANIFEST_VERSION = 2
+COUNTS_EXTENSION = ".counts"
+CHECKPOINT_PREAMBLE = "checkpoint-"
+
+
+class ProcessingManifest(object):
+    """
+    This class records which results files have been folded into the processed results stored in an output
+    directory so that later runs only need to process new or changed results files. Every results file is
+    recorded with its size, modification time, and checksum, along with the counts that it contributed. The
+    merged counts of all recorded files are rebuilt from these contributions when the manifest is loaded.
+
+    The manifest is saved as JSON after every processed file. Files processed since the processed results were
+    last written are recorded as pending so that the server types they touched are rewritten by the next run,
+    and an interrupted run only loses the file that it was processing. Within a results file, checkpoints
+    record the offset of a record boundary together with the counts found before it, so that processing of
+    the file can be resumed. Counts are stored as concatenated binary url_segments blobs (see
+    pack_binary_segments): the server counts, the server types that have URL segments along with their
+    number of URL segments, and then the URL segments of each of those server types in turn.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            output_directory=ConfigManager.OUTPUT_DIRECTORY,
+            state_directory_name=ConfigManager.STATE_DIRECTORY_NAME,
+    ):
+        self._output_directory = output_directory
+        self._state_directory = os.path.join(output_directory, state_directory_name)
+        self._saved_files = {}
+        self._files = {}
+        self._pending_files = {}
+        self._fingerprints = {}
+        self._pending_server_types = set()
+        self._settings = None
+        self._results_directory = None
+
+    # Static Methods
+
+    @staticmethod
+    def get_file_checksum(file_path, block_size=ConfigManager.READ_BLOCK_SIZE):
+        """
+        Get the checksum of the (decompressed) contents of the file at the given path, as computed by
+        CCResultFileParser.checksum while the file is parsed. The ETag of an object in S3 is used as its checksum
+        instead of reading it back.
+        :param file_path: The path to the file, or its s3:// URL.
+        :param block_size: The number of bytes to read from the file at once.
+        :return: The hex SHA-1 digest of the file's contents, or the ETag of the object.
+        """
+        if is_object_url(file_path):
+            return get_object_store().stat(file_path)["etag"]
+        digest = hashlib.sha1()
+        compression = detect_compression(file_path)
+        with open(file_path, "rb") as f:
+            source = f if compression is None else open_decompressed_stream(f, compression=compression)
+            try:
+                while True:
+                    block = source.read(block_size)
+                    if not block:
+                        break
+                    digest.update(block)
+            finally:
+                if source is not f:
+                    source.close()
+        return digest.hexdigest()
+
+    @staticmethod
+    def get_file_fingerprint(file_path):
+        """
+        Get the size and modification time of the file at the given path.
+        :param file_path: The path to the file, or its s3:// URL.
+        :return: A tuple containing (1) the size of the file in bytes and (2) its modification time.
+        """
+        if is_object_url(file_path):
+            stat = get_object_store().stat(file_path)
+            return stat["size"], stat["mtime"]
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime
+
+    # Class Methods
+
+    # Public Methods
+
+    def clear(self):
+        """
+        Remove the manifest, the counts recorded with it, and any saved checkpoints from the output directory.
+        :return: None
+        """
+        if os.path.isdir(self.state_directory):
+            shutil.rmtree(self.state_directory)
+        self._saved_files = {}
+        self._files = {}
+        self._pending_files = {}
+        self._pending_server_types = set()
+        self._settings = None
+        self._results_directory = None
+        logger.debug("Cleared manifest state from %s." % (self.state_directory,))
+
+    def find_changes(self, file_paths=None, aggregator=None):
+        """
+        Compare the given results files against the recorded results files. The counts of every recorded file
+        that has changed or no longer exists are removed from the given aggregator.
+        :param file_paths: The paths to all of the current results files.
+        :param aggregator: The SegmentAggregator holding the merged counts of all recorded files (see load).
+        :return: A tuple containing (1) a list of the paths to the results files that need to be processed and
+        (2) the set of server types whose counts were removed from the aggregator or were updated by pending
+        files when the manifest was loaded.
+        """
+        to_process = []
+        touched_server_types = set(self._pending_server_types)
+        current_file_names = set()
+        unchanged_count = changed_count = new_count = 0
+        for file_path in file_paths:
+            file_name = os.path.basename(file_path)
+            current_file_names.add(file_name)
+            size, mtime = self._fingerprints[file_path] = self.get_file_fingerprint(file_path)
+            entry = self._files.get(file_name)
+            if entry is None:
+                new_count += 1
+                to_process.append(file_path)
+                continue
+            if entry["size"] == size and entry["mtime"] == mtime:
+                unchanged_count += 1
+                continue
+            if entry["size"] == size and entry["checksum"] == self.get_file_checksum(file_path):
+                entry["mtime"] = mtime
+                unchanged_count += 1
+                continue
+            changed_count += 1
+            touched_server_types.update(self.__remove_file(file_name=file_name, aggregator=aggregator))
+            to_process.append(file_path)
+        removed_file_names = [x for x in self._files.keys() if x not in current_file_names]
+        for file_name in removed_file_names:
+            touched_server_types.update(self.__remove_file(file_name=file_name, aggregator=aggregator))
+        logger.debug(
+            "Compared %s result files against the manifest in %s. %s are unchanged, %s are new, %s have "
+            "changed, and %s have been removed."
+            % (
+                len(file_paths),
+                self.state_directory,
+                unchanged_count,
+                new_count,
+                changed_count,
+                len(removed_file_names),
+            )
+        )
+        return to_process, touched_server_types
+
+    def load(self):
+        """
+        Load the manifest from the output directory, if one exists.
+        :return: A SegmentAggregator holding the merged counts of all recorded results files. If no manifest
+        exists, the aggregator is empty.
+        """
+        if not self.exists:
+            return SegmentAggregator()
+        with open(self.manifest_path, "r") as f:
+            contents = json.load(f)
+        if contents.get("version") != MANIFEST_VERSION:
+            raise ValueError(
+                "The manifest at %s has an unsupported version (%s). The processed results must be rebuilt."
+                % (self.manifest_path, contents.get("version"))
+            )
+        self._saved_files = contents.get("files", {})
+        self._files = dict(self._saved_files)
+        self._settings = contents.get("settings")
+        self._results_directory = contents.get("results_directory")
+        pending_files = contents.get("pending", {})
+        for file_name, entry in pending_files.items():
+            if file_name in self._files:
+                replaced = self.__load_counts(self._files[file_name]["contribution"])
+                self._pending_server_types.update(replaced.server_types)
+            self._files[file_name] = entry
+        aggregator = SegmentAggregator()
+        for file_name, entry in self._files.items():
+            contribution = self.__load_counts(entry["contribution"])
+            aggregator.merge(contribution)
+            if file_name in pending_files:
+                self._pending_server_types.update(contribution.server_types)
+        self._pending_files = dict(pending_files)
+        logger.debug(
+            "Loaded manifest from %s. %s result files are recorded (%s of them pending). Merged counts are %s."
+            % (self.manifest_path, len(self._files), len(pending_files), aggregator)
+        )
+        return aggregator
+
+    def load_checkpoint(self, file_path=None):
+        """
+        Load the most recent checkpoint saved for the given results file.
+        :param file_path: The path to the results file.
+        :return: A tuple containing (1) the offset of the record boundary that processing stopped at and (2)
+        a SegmentAggregator holding the counts found before that offset, or None if no checkpoint exists for
+        the file or the file has changed since the checkpoint was saved.
+        """
+        checkpoint = self.__read_checkpoint(file_path)
+        if checkpoint is None:
+            return None
+        if tuple(checkpoint["fingerprint"]) != self.get_file_fingerprint(file_path):
+            logger.debug(
+                "Result file %s has changed since it was checkpointed. Ignoring its checkpoint."
+                % (file_path,)
+            )
+            return None
+        return checkpoint["offset"], self.__load_counts(checkpoint["counts"])
+
+    def record_file(self, file_path=None, checksum=None, contribution=None):
+        """
+        Record that the given results file has been processed and that it contributed the counts held by the
+        given aggregator. The contribution is written to disk and the manifest is saved with the file pending.
+        :param file_path: The path to the results file.
+        :param checksum: The checksum of the results file (see get_file_checksum).
+        :param contribution: A SegmentAggregator holding the counts found in the results file.
+        :return: None
+        """
+        file_name = os.path.basename(file_path)
+        if file_path in self._fingerprints:
+            size, mtime = self._fingerprints[file_path]
+        else:
+            size, mtime = self.get_file_fingerprint(file_path)
+        contribution_name = "%s-%s%s" % (file_name, checksum[:16], COUNTS_EXTENSION)
+        self.__dump_counts(contribution_name, contribution)
+        entry = {
+            "size": size,
+            "mtime": mtime,
+            "checksum": checksum,
+            "contribution": contribution_name,
+        }
+        self._files[file_name] = entry
+        self._pending_files[file_name] = entry
+        self.__write_manifest(files=self._saved_files, pending_files=self._pending_files, settings=self._settings)
+        checkpoint = self.__read_checkpoint(file_path)
+        if checkpoint is not None:
+            os.remove(os.path.join(self.state_directory, checkpoint["counts"]))
+            os.remove(os.path.join(self.state_directory, self.__get_checkpoint_name(file_path)))
+
+    def save(self, settings=None, results_directory=None):
+        """
+        Save the record of every results file included in the processed results once they have been written,
+        and remove any state that is no longer referenced.
+        :param settings: A dictionary of the settings that the processed results were written with.
+        :param results_directory: The directory that the results files were read from.
+        :return: None
+        """
+        self._results_directory = results_directory
+        self.__write_manifest(files=self._files, pending_files={}, settings=settings)
+        self._saved_files = dict(self._files)
+        self._pending_files = {}
+        self._pending_server_types = set()
+        self._settings = settings
+        referenced_names = set([x["contribution"] for x in self._files.values()])
+        referenced_names.add(os.path.basename(self.manifest_path))
+        for file_name in os.listdir(self.state_directory):
+            if file_name not in referenced_names:
+                os.remove(os.path.join(self.state_directory, file_name))
+        logger.debug(
+            "Saved manifest to %s. %s result files are recorded."
+            % (self.manifest_path, len(self._files))
+        )
+
+    def save_checkpoint(self, file_path=None, offset=None, aggregator=None):
+        """
+        Save a checkpoint for the given results file.
+        :param file_path: The path to the results file.
+        :param offset: The offset of the record boundary that processing has reached.
+        :param aggregator: A SegmentAggregator holding all of the counts found in the file before the offset.
+        :return: None
+        """
+        previous_checkpoint = self.__read_checkpoint(file_path)
+        counts_name = "%s%s-%s%s" % (CHECKPOINT_PREAMBLE, os.path.basename(file_path), offset, COUNTS_EXTENSION)
+        self.__dump_counts(counts_name, aggregator)
+        checkpoint = {
+            "fingerprint": self.get_file_fingerprint(file_path),
+            "offset": offset,
+            "counts": counts_name,
+        }
+        self.__dump_json(self.__get_checkpoint_name(file_path), checkpoint)
+        if previous_checkpoint is not None and previous_checkpoint["counts"] != counts_name:
+            os.remove(os.path.join(self.state_directory, previous_checkpoint["counts"]))
+        logger.debug(
+            "Checkpointed result file %s at offset %s (%s)."
+            % (file_path, offset, aggregator)
+        )
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __dump_counts(self, file_name, aggregator):
+        """
+        Write the counts held by the given aggregator to the given file in the state directory.
+        :param file_name: The name of the file to write.
+        :param aggregator: The SegmentAggregator holding the counts to write.
+        :return: None
+        """
+        server_counts = []
+        segment_server_types = []
+        packed_segments = []
+        for server_type, total_count, url_segments in aggregator.iter_servers():
+            if total_count is not None:
+                server_counts.append((server_type, total_count))
+            if url_segments:
+                segment_server_types.append((server_type, len(url_segments)))
+                packed_segments.append(pack_binary_segments(url_segments=url_segments))
+        if not os.path.isdir(self.state_directory):
+            os.makedirs(self.state_directory)
+        temp_path = os.path.join(self.state_directory, "%s.tmp" % (file_name,))
+        with open(temp_path, "wb+") as f:
+            f.write(pack_binary_segments(url_segments=server_counts))
+            f.write(pack_binary_segments(url_segments=segment_server_types))
+            for packed in packed_segments:
+                f.write(packed)
+        self.__replace(temp_path, os.path.join(self.state_directory, file_name))
+
+    def __dump_json(self, file_name, contents):
+        """
+        Write the given contents as JSON to the given file in the state directory.
+        :param file_name: The name of the file to write.
+        :param contents: The JSON-serializable contents to write.
+        :return: None
+        """
+        if not os.path.isdir(self.state_directory):
+            os.makedirs(self.state_directory)
+        temp_path = os.path.join(self.state_directory, "%s.tmp" % (file_name,))
+        with open(temp_path, "w+") as f:
+            json.dump(contents, f, indent=2, sort_keys=True)
+        self.__replace(temp_path, os.path.join(self.state_directory, file_name))
+
+    def __get_checkpoint_name(self, file_path):
+        """
+        Get the name of the file in the state directory that checkpoints for the given results file are
+        saved to.
+        :param file_path: The path to the results file.
+        :return: The name of the checkpoint file.
+        """
+        return "%s%s.json" % (CHECKPOINT_PREAMBLE, os.path.basename(file_path))
+
+    def __load_counts(self, file_name):
+        """
+        Load the counts stored in the given file in the state directory (see __dump_counts).
+        :param file_name: The name of the file to read.
+        :return: A SegmentAggregator holding the stored counts.
+        """
+        with open(os.path.join(self.state_directory, file_name), "rb") as f:
+            contents = f.read()
+        aggregator = SegmentAggregator()
+        server_counts, position = unpack_binary_segments(contents)
+        for server_type, count in server_counts:
+            aggregator.add_server_count(server_type=server_type, count=count)
+        segment_server_types, position = unpack_binary_segments(contents, position=position)
+        add_segment_count = aggregator.add_segment_count
+        for server_type, _ in segment_server_types:
+            url_segments, position = unpack_binary_segments(contents, position=position)
+            for url_segment, count in url_segments:
+                add_segment_count(server_type, url_segment, count)
+        return aggregator
+
+    def __read_checkpoint(self, file_path):
+        """
+        Read the checkpoint saved for the given results file, if there is one.
+        :param file_path: The path to the results file.
+        :return: A dictionary containing the fingerprint of the file, the offset of the record boundary that
+        processing had reached, and the name of the file holding the counts found before it, or None.
+        """
+        checkpoint_path = os.path.join(self.state_directory, self.__get_checkpoint_name(file_path))
+        if not os.path.isfile(checkpoint_path):
+            return None
+        with open(checkpoint_path, "r") as f:
+            return json.load(f)
+
+    def __remove_file(self, file_name=None, aggregator=None):
+        """
+        Remove the given recorded results file from the manifest and its counts from the given aggregator.
+        :param file_name: The name of the recorded results file.
+        :param aggregator: The SegmentAggregator to remove the file's counts from.
+        :return: The set of server types that the file contributed counts to.
+        """
+        entry = self._files.pop(file_name)
+        self._pending_files.pop(file_name, None)
+        contribution = self.__load_counts(entry["contribution"])
+        aggregator.subtract(contribution)
+        return contribution.server_types
+
+    def __replace(self, source_path, destination_path):
+        """
+        Move the file at the given source path over the given destination path.
+        :param source_path: The path to the file to move.
+        :param destination_path: The path to move the file to.
+        :return: None
+        """
+        if hasattr(os, "replace"):
+            os.replace(source_path, destination_path)
+        else:
+            if os.path.exists(destination_path):
+                os.remove(destination_path)
+            os.rename(source_path, destination_path)
+
+    def __write_manifest(self, files=None, pending_files=None, settings=None):
+        """
+        Write the manifest file to the state directory.
+        :param files: A dictionary mapping the names of the results files included in the processed results to
+        their records.
+        :param pending_files: A dictionary mapping the names of the results files processed since the processed
+        results were written to their records.
+        :param settings: A dictionary of the settings that the processed results were written with.
+        :return: None
+        """
+        contents = {
+            "version": MANIFEST_VERSION,
+            "results_directory": self._results_directory,
+            "settings": settings,
+            "files": files,
+            "pending": pending_files,
+        }
+        self.__dump_json(os.path.basename(self.manifest_path), contents)
+
+    # Properties
+
+    @property
+    def exists(self):
+        """
+        Get whether or not a manifest exists in the output directory.
+        :return: whether or not a manifest exists in the output directory.
+        """
+        return os.path.isfile(self.manifest_path)
+
+    @property
+    def file_count(self):
+        """
+        Get the number of results files recorded in this manifest.
+        :return: the number of results files recorded in this manifest.
+        """
+        return len(self._files)
+
+    @property
+    def manifest_path(self):
+        """
+        Get the path to the manifest file.
+        :return: the path to the manifest file.
+        """
+        return os.path.join(self.state_directory, ConfigManager.MANIFEST_FILE_NAME)
+
+    @property
+    def output_directory(self):
+        """
+        Get the output directory that this manifest describes.
+        :return: the output directory that this manifest describes.
+        """
+        return self._output_directory
+
+    @property
+    def results_directory(self):
+        """
+        Get the directory that the recorded results files were read from.
+        :return: the directory that the recorded results files were read from.
+        """
+        return self._results_directory
+
+    @property
+    def settings(self):
+        """
+        Get the settings that the processed results were last written with.
+        :return: the settings that the processed results were last written with.
+        """
+        return self._settings
+
+    @property
+    def state_directory(self):
+        """
+        Get the directory where the manifest and recorded counts are stored.
+        :return: the directory where the manifest and recorded counts are stored.
+        """
+        return self._state_directory
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s (%s files)>" % (self.__class__.__name__, self.state_directory, self.file_count)
@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import calendar
+from collections import deque
+from multiprocessing.pool import ThreadPool
+import os
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import BotoCoreError
+except ImportError:
+    boto3 = None
+    BotoConfig = None
+    BotoCoreError = None
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+
+logger = get_logger_for_name(__name__)
+
+OBJECT_URL_PREFIX = "s3://"
+
+
+def get_location_size(location):
+    """
+    Get the size of the results file at the given location.
+    :param location: The local file path or s3:// URL of the results file.
+    :return: The size of the results file in bytes.
+    """
+    if is_object_url(location):
+        return get_object_store().stat(location)["size"]
+    return os.path.getsize(location)
+
+
+def get_object_store():
+    """
+    Get the S3ObjectStore that the current process reads results objects through, creating it if need be. Every
+    process gets its own store, as connections can not be shared with forked worker processes.
+    :return: The S3ObjectStore for the current process.
+    """
+    global _object_store
+    if _object_store is None or _object_store.process_id != os.getpid():
+        _object_store = S3ObjectStore()
+    return _object_store
+
+
+def is_object_url(location):
+    """
+    Check whether or not the given location refers to objects in S3-compatible storage.
+    :param location: The location to check.
+    :return: Whether or not the location is an s3:// URL.
+    """
+    return location is not None and location.startswith(OBJECT_URL_PREFIX)
+
+
+def parse_object_url(url):
+    """
+    Split the given s3:// URL into its bucket and key.
+    :param url: The s3:// URL to split.
+    :return: A tuple containing (1) the bucket and (2) the key, which is empty if the URL only names a bucket.
+    """
+    if not is_object_url(url):
+        raise ValueError("%s is not an %s URL." % (url, OBJECT_URL_PREFIX))
+    bucket, _, key = url[len(OBJECT_URL_PREFIX):].partition("/")
+    if not bucket:
+        raise ValueError("%s does not name a bucket." % (url,))
+    return bucket, key
+
+
+class S3ObjectStore(object):
+    """
+    This class reads lavalamp Common Crawl results files straight out of S3 or any S3-compatible object storage
+    (ex: MinIO) so that they do not have to be copied to local disk first. Objects are read with concurrent
+    ranged GET requests that share a single pool of connections. Credentials are found in the same way as for
+    the AWS command line tools. Requires the boto3 package.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            endpoint_url=None,
+            max_connections=ConfigManager.S3_MAX_CONNECTIONS,
+            part_size=ConfigManager.S3_PART_SIZE,
+            read_ahead=ConfigManager.S3_READ_AHEAD,
+            max_attempts=ConfigManager.S3_MAX_ATTEMPTS,
+    ):
+        if boto3 is None:
+            raise ImportError(
+                "The boto3 package is required to read results files from %s URLs." % (OBJECT_URL_PREFIX,)
+            )
+        self._endpoint_url = endpoint_url if endpoint_url is not None else ConfigManager.S3_ENDPOINT_URL
+        self._max_connections = max_connections
+        self._part_size = part_size
+        self._read_ahead = read_ahead
+        self._max_attempts = max_attempts
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=self._endpoint_url,
+            config=BotoConfig(max_pool_connections=max_connections, retries={"max_attempts": max_attempts}),
+        )
+        self._thread_pool = None
+        self._stats = {}
+        self._process_id = os.getpid()
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Stop the threads that ranged requests are sent from.
+        :return: None
+        """
+        if self._thread_pool is not None:
+            self._thread_pool.terminate()
+            self._thread_pool.join()
+            self._thread_pool = None
+
+    def fetch_range(self, url=None, start=None, end=None):
+        """
+        Read the given range of bytes from the object at the given URL. Reads that fail part way through the
+        response are retried up to self.max_attempts times.
+        :param url: The s3:// URL of the object.
+        :param start: The offset of the first byte to read.
+        :param end: The offset immediately after the last byte to read.
+        :return: The bytes read.
+        """
+        bucket, key = parse_object_url(url)
+        attempt = 1
+        while True:
+            try:
+                response = self._client.get_object(Bucket=bucket, Key=key, Range="bytes=%s-%s" % (start, end - 1))
+                return response["Body"].read()
+            except (BotoCoreError, IOError) as e:
+                if attempt >= self.max_attempts:
+                    raise
+                logger.warning(
+                    "Reading bytes %s to %s of %s failed on attempt %s of %s (%s). Retrying."
+                    % (start, end, url, attempt, self.max_attempts, e)
+                )
+                attempt += 1
+
+    def list_objects(self, url=None, preamble=ConfigManager.RESULT_FILE_PREAMBLE):
+        """
+        List the objects directly within the given s3:// URL whose names start with the given preamble. The size,
+        modification time, and ETag of every object listed are remembered so that they do not have to be
+        requested again (see stat).
+        :param url: The s3:// URL of the bucket or prefix to list.
+        :param preamble: The preamble that the names of the objects must start with.
+        :return: A list of the s3:// URLs of the matching objects, sorted by name.
+        """
+        bucket, prefix = parse_object_url(url)
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        to_return = []
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix + preamble, Delimiter="/"):
+            for entry in page.get("Contents", []):
+                object_url = "%s%s/%s" % (OBJECT_URL_PREFIX, bucket, entry["Key"])
+                self._stats[object_url] = self.__get_stat(entry, size_key="Size")
+                to_return.append(object_url)
+        return sorted(to_return)
+
+    def open_object(self, url=None):
+        """
+        Open the object at the given URL for reading.
+        :param url: The s3:// URL of the object.
+        :return: An S3ObjectReader for the object.
+        """
+        return S3ObjectReader(
+            object_store=self,
+            url=url,
+            size=self.stat(url)["size"],
+            part_size=self.part_size,
+            read_ahead=self.read_ahead,
+        )
+
+    def stat(self, url=None):
+        """
+        Get the size, modification time, and ETag of the object at the given URL.
+        :param url: The s3:// URL of the object.
+        :return: A dictionary containing the size in bytes, the mtime as seconds since the epoch, and the etag.
+        """
+        if url not in self._stats:
+            bucket, key = parse_object_url(url)
+            response = self._client.head_object(Bucket=bucket, Key=key)
+            self._stats[url] = self.__get_stat(response, size_key="ContentLength")
+        return self._stats[url]
+
+    def submit_fetch(self, url=None, start=None, end=None):
+        """
+        Start reading the given range of bytes from the object at the given URL in the background.
+        :param url: The s3:// URL of the object.
+        :param start: The offset of the first byte to read.
+        :param end: The offset immediately after the last byte to read.
+        :return: An AsyncResult whose get method returns the bytes read (see fetch_range).
+        """
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPool(processes=self.max_connections)
+        return self._thread_pool.apply_async(self.fetch_range, (url, start, end))
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __get_stat(self, response, size_key=None):
+        """
+        Get the size, modification time, and ETag of an object from the given listing entry or response.
+        :param response: A dictionary describing the object, as returned by S3.
+        :param size_key: The key that the size of the object is stored under.
+        :return: A dictionary containing the size, mtime, and etag of the object.
+        """
+        return {
+            "size": response[size_key],
+            "mtime": calendar.timegm(response["LastModified"].utctimetuple()),
+            "etag": response["ETag"].strip("\""),
+        }
+
+    # Properties
+
+    @property
+    def endpoint_url(self):
+        """
+        Get the URL of the S3-compatible endpoint that requests are sent to, or None for AWS.
+        :return: the URL of the S3-compatible endpoint that requests are sent to, or None for AWS.
+        """
+        return self._endpoint_url
+
+    @property
+    def max_attempts(self):
+        """
+        Get the number of times that a ranged read is attempted before giving up.
+        :return: the number of times that a ranged read is attempted before giving up.
+        """
+        return self._max_attempts
+
+    @property
+    def max_connections(self):
+        """
+        Get the maximum number of connections (and concurrent ranged requests) to S3.
+        :return: the maximum number of connections (and concurrent ranged requests) to S3.
+        """
+        return self._max_connections
+
+    @property
+    def part_size(self):
+        """
+        Get the number of bytes requested by every ranged GET request.
+        :return: the number of bytes requested by every ranged GET request.
+        """
+        return self._part_size
+
+    @property
+    def process_id(self):
+        """
+        Get the ID of the process that this store was created in.
+        :return: the ID of the process that this store was created in.
+        """
+        return self._process_id
+
+    @property
+    def read_ahead(self):
+        """
+        Get the number of parts of an object that are requested ahead of the part being read.
+        :return: the number of parts of an object that are requested ahead of the part being read.
+        """
+        return self._read_ahead
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s>" % (self.__class__.__name__, self.endpoint_url or "AWS")
+
+
+class S3ObjectReader(object):
+    """
+    This class is a read-only binary file object over an object in S3-compatible storage. The object is
+    requested in parts with ranged GET requests, and a number of parts ahead of the one being read are always
+    in flight so that parsing does not wait on the network.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            object_store=None,
+            url=None,
+            size=None,
+            part_size=ConfigManager.S3_PART_SIZE,
+            read_ahead=ConfigManager.S3_READ_AHEAD,
+    ):
+        self._object_store = object_store
+        self._url = url
+        self._size = size
+        self._part_size = part_size
+        self._read_ahead = max(read_ahead, 1)
+        self._position = 0
+        self._buffer = b""
+        self._buffer_position = 0
+        self._next_start = 0
+        self._pending = deque()
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Discard any parts that have been requested but not read.
+        :return: None
+        """
+        self._pending.clear()
+        self._buffer = b""
+        self._buffer_position = 0
+
+    def peek(self, size=None):
+        """
+        Get up to the given number of bytes at the current position without consuming them.
+        :param size: The maximum number of bytes to return.
+        :return: The bytes found at the current position.
+        """
+        if self._buffer_position >= len(self._buffer) and self._position < self._size:
+            self.__load_next_part()
+        return self._buffer[self._buffer_position:self._buffer_position + size]
+
+    def read(self, size=-1):
+        """
+        Read up to the given number of bytes from the current position.
+        :param size: The maximum number of bytes to read, or a negative number to read the rest of the object.
+        :return: The bytes read, or an empty byte string once the whole object has been read.
+        """
+        if size is None or size < 0:
+            size = self._size - self._position
+        chunks = []
+        while size > 0 and self._position < self._size:
+            if self._buffer_position >= len(self._buffer):
+                self.__load_next_part()
+            chunk = self._buffer[self._buffer_position:self._buffer_position + size]
+            self._buffer_position += len(chunk)
+            self._position += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        if len(chunks) == 1:
+            return chunks[0]
+        return b"".join(chunks)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Move the current position to the given offset. Parts that were requested ahead of the old position are
+        discarded.
+        :param offset: The offset to move to.
+        :param whence: What the offset is relative to (os.SEEK_SET, os.SEEK_CUR, or os.SEEK_END).
+        :return: The new position.
+        """
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        offset = min(max(offset, 0), self._size)
+        if offset != self._position:
+            self.close()
+            self._position = self._next_start = offset
+        return self._position
+
+    def tell(self):
+        """
+        Get the current position in the object.
+        :return: The number of bytes from the start of the object to the current position.
+        """
+        return self._position
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __load_next_part(self):
+        """
+        Wait for the next part of the object and make it the current buffer, requesting further parts so that
+        self.read_ahead of them are in flight.
+        :return: None
+        """
+        self.__request_parts()
+        self._buffer = self._pending.popleft().get()
+        self._buffer_position = 0
+        if not self._buffer:
+            raise IOError("No bytes were returned for %s at offset %s." % (self.url, self._position))
+        self.__request_parts()
+
+    def __request_parts(self):
+        """
+        Request parts of the object following the last part requested until self.read_ahead of them are in
+        flight or the end of the object has been reached.
+        :return: None
+        """
+        while len(self._pending) < self._read_ahead and self._next_start < self._size:
+            end = min(self._next_start + self._part_size, self._size)
+            self._pending.append(self._object_store.submit_fetch(url=self.url, start=self._next_start, end=end))
+            self._next_start = end
+
+    # Properties
+
+    @property
+    def size(self):
+        """
+        Get the size of the object in bytes.
+        :return: the size of the object in bytes.
+        """
+        return self._size
+
+    @property
+    def url(self):
+        """
+        Get the s3:// URL of the object.
+        :return: the s3:// URL of the object.
+        """
+        return self._url
+
+    # Representation and Comparison
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<%s - %s (%s of %s bytes read)>" % (self.__class__.__name__, self.url, self._position, self._size)
+
+
+_object_store = None
@@ -1,15 +1,84 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import multiprocessing
+from operator import itemgetter
 import os
+import shutil
+import tempfile
+import threading
 
+from .aggregator import SegmentAggregator
+from .binarysegments import BINARY_FORMAT, pack_binary_segments
+from .compression import detect_compression
+from .externalaggregator import ExternalSegmentAggregator
+from .manifest import ProcessingManifest
+from .objectstore import get_location_size, get_object_store, is_object_url
+from .progress import ProgressReporter
+from .resultentry import SERVER_NAME_ENTRY, SERVER_PATH_ENTRY
 from .resultfile import CCResultFileParser
+from .segmentfile import format_segments_header, split_coerced_segments
+from .servertype import EXACT_GRANULARITY, FAMILY_GRANULARITY, ServerTypeCanonicalizer
+from .sqlitestore import SQLITE_STORE, SQLiteResultStore
+from .workers import get_worker_progress_counter, initialize_worker
+from .writer import ServerFileWriterPool
 from ..config import ConfigManager
-from ..cclogging import get_logger_for_name
+from ..cclogging import get_logger_for_name, QueueLogListener
+from ..metrics import get_run_metrics
 
 logger = get_logger_for_name(__name__)
 
 
+def _aggregate_file_in_worker(worker_args):
+    """
+    Aggregate the contents of a single results file within a worker process.
+    Progress is added to the ProgressCounter that the worker was initialized with.
+    :param worker_args: A tuple containing (1) the results directory path, (2) the file path to
+    aggregate, (3) whether or not to memory map the file, (4) the output directory whose
+    ProcessingManifest checkpoints are saved to, (5) whether or not to resume from a saved checkpoint,
+    (6) the checkpoint interval, (7) the server type granularity, (8) the number of megabytes of counts
+    to buffer before spilling them to disk, or 0 to keep every count in memory, and (9) the directory to
+    spill counts to.
+    :return: A tuple containing (1) the file path, (2) the checksum of the file (see
+    CCResultFileParser.checksum), (3) a SegmentAggregator (or an ExternalSegmentAggregator whose counts have all been spilled)
+    containing the partial counts for the file, and (4) the metrics recorded for the file (see
+    RunMetrics.record_file).
+    """
+    (
+        directory_path,
+        file_path,
+        use_mmap,
+        output_directory,
+        resume,
+        checkpoint_interval,
+        granularity,
+        memory_limit,
+        spill_directory,
+    ) = worker_args
+    results_parser = CCResultParser(directory_path)
+    if memory_limit:
+        partial, checksum = results_parser.aggregate_file(
+            file_path=file_path,
+            aggregator=ExternalSegmentAggregator(memory_limit=memory_limit, spill_directory=spill_directory),
+            use_mmap=use_mmap,
+            granularity=granularity,
+            progress=get_worker_progress_counter(),
+        )
+        partial.spill()
+    else:
+        partial, checksum = results_parser.aggregate_file(
+            file_path=file_path,
+            use_mmap=use_mmap,
+            manifest=ProcessingManifest(output_directory=output_directory),
+            resume=resume,
+            checkpoint_interval=checkpoint_interval,
+            granularity=granularity,
+            progress=get_worker_progress_counter(),
+        )
+    file_metrics = get_run_metrics().files.pop()
+    return file_path, checksum, partial, file_metrics
+
+
 class CCResultParser(object):
     """
     This is a class for parsing the contents of all lavalamp Common Crawl results file in a given
@@ -29,104 +98,1196 @@ class CCResultParser(object):
 
     # Public Methods
 
+    def aggregate_file(
+            self,
+            file_path=None,
+            aggregator=None,
+            use_mmap=ConfigManager.USE_MMAP,
+            manifest=None,
+            resume=False,
+            checkpoint_interval=ConfigManager.CHECKPOINT_INTERVAL,
+            granularity=ConfigManager.SERVER_TYPE_GRANULARITY,
+            progress=None,
+    ):
+        """
+        Add the counts found in the file at the given file path to the given aggregator. Server types are
+        canonicalized to the given granularity before their counts are added.
+        :param file_path: The file path to the results file to parse.
+        :param aggregator: The SegmentAggregator (or ExternalSegmentAggregator) to add counts to. If None, a
+        new SegmentAggregator is created. When checkpointing, the aggregator must only hold counts for this file.
+        :param use_mmap: Whether or not to scan the results file through a memory map.
+        :param manifest: The ProcessingManifest to save checkpoints for the file to. If None, no checkpoints
+        are saved.
+        :param resume: Whether or not to resume from the checkpoint saved for the file, if there is one.
+        :param checkpoint_interval: The minimum number of bytes to read between checkpoints, or 0 to disable
+        checkpointing.
+        :param granularity: The granularity to canonicalize server types to (one of GRANULARITIES).
+        :param progress: The ProgressCounter to add the bytes and entries read from the file to, or None.
+        :return: A tuple containing (1) the SegmentAggregator that counts were added to and (2) the checksum of
+        the file's contents as they were read (see CCResultFileParser.checksum).
+        """
+        logger.debug(
+            "Now aggregating the contents of file at path %s."
+            % (file_path,)
+        )
+        if aggregator is None:
+            aggregator = SegmentAggregator()
+        start_offset = 0
+        if manifest is not None and resume:
+            checkpoint = manifest.load_checkpoint(file_path=file_path)
+            if checkpoint is not None:
+                start_offset, checkpointed = checkpoint
+                aggregator.merge(checkpointed)
+                logger.debug(
+                    "Resuming file %s from checkpoint at offset %s."
+                    % (file_path, start_offset)
+                )
+        checkpoint_callback = None
+        if manifest is not None and checkpoint_interval:
+            def checkpoint_callback(offset):
+                manifest.save_checkpoint(file_path=file_path, offset=offset, aggregator=aggregator)
+        file_parser = CCResultFileParser(
+            file_path,
+            use_mmap=use_mmap,
+            start_offset=start_offset,
+            checkpoint_callback=checkpoint_callback,
+            checkpoint_interval=checkpoint_interval,
+            progress_callback=progress.add if progress is not None else None,
+        )
+        add_server_count = aggregator.add_server_count
+        add_segment_count = aggregator.add_segment_count
+        canonical_server_types = None
+        if granularity != EXACT_GRANULARITY:
+            canonical_server_types = ServerTypeCanonicalizer(granularity=granularity).lookup
+        processed_count = 0
+        for entry_type, server_type, url_path, count in file_parser.iter_decoded_entries():
+            if canonical_server_types is not None and server_type is not None:
+                server_type = canonical_server_types[server_type]
+            if entry_type == SERVER_PATH_ENTRY:
+                url_segment = url_path.strip()
+                if not url_segment:
+                    continue
+                add_segment_count(server_type, url_segment, count)
+            elif entry_type == SERVER_NAME_ENTRY:
+                add_server_count(server_type, count)
+            else:
+                continue
+            processed_count += 1
+        self.__log_file_summary(file_parser=file_parser, stage="aggregate", processed_count=processed_count)
+        if progress is not None:
+            progress.add(file_count=1)
+        return aggregator, file_parser.checksum
+
+    def aggregate_files_in_directory(
+            self,
+            ignore_threshold=ConfigManager.IGNORE_THRESHOLD,
+            report_interval=ConfigManager.REPORT_INTERVAL,
+            output_directory=ConfigManager.OUTPUT_DIRECTORY,
+            max_open_files=ConfigManager.MAX_OPEN_FILES,
+            workers=ConfigManager.WORKER_COUNT,
+            use_mmap=ConfigManager.USE_MMAP,
+            ranked_output=ConfigManager.RANKED_OUTPUT,
+            output_format=ConfigManager.OUTPUT_FORMAT,
+            resume=False,
+            checkpoint_interval=ConfigManager.CHECKPOINT_INTERVAL,
+            granularity=ConfigManager.SERVER_TYPE_GRANULARITY,
+            family_rollup=ConfigManager.FAMILY_ROLLUP,
+            store=ConfigManager.RESULT_STORE,
+            server_consumer=None,
+            persist_results=True,
+            memory_limit=ConfigManager.MEMORY_LIMIT,
+    ):
+        """
+        Merge the counts found in all of the result files in self.directory_path before applying the ignore
+        threshold and writing results. A ProcessingManifest is kept in the output directory so that later runs
+        only process new or changed result files and update the merged counts in place, unless a memory limit
+        is given.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param report_interval: The number of seconds between progress reports, or 0 to disable them.
+        :param output_directory: The directory where results should be stored.
+        :param max_open_files: The maximum number of result files to keep open at once while writing.
+        :param workers: The number of worker processes to aggregate results files with.
+        :param use_mmap: Whether or not to scan results files through a memory map.
+        :param ranked_output: Whether or not to write every server's URL segments sorted by descending count,
+        preceded by a header, so that hit lists can be generated by streaming the file.
+        :param output_format: The format to write every server's URL segments in (one of OUTPUT_FORMATS).
+        :param resume: Whether or not to resume partially processed result files from their checkpoints.
+        :param checkpoint_interval: The minimum number of bytes to read from a result file between
+        checkpoints, or 0 to disable checkpointing.
+        :param granularity: The granularity to aggregate server types at (one of GRANULARITIES).
+        :param family_rollup: Whether or not to also write results merged by server family to the
+        ConfigManager.FAMILY_DIRECTORY_NAME directory of the output directory.
+        :param store: Where to write results to (one of STORES). The sqlite store writes results to a
+        SQLiteResultStore in the output directory instead of to a directory for every server type.
+        :param server_consumer: A function to hand the aggregated results of every server type to once all
+        result files have been aggregated, or None. It is called with an iterable of (server type, total
+        count, URL segments) tuples (see SegmentAggregator.iter_servers) while results are written in a
+        background thread, so that processed results do not have to be read back.
+        :param persist_results: Whether or not to write processed results. If False, only the counts kept in
+        the processing manifest are saved, and the results previously written for server types whose counts
+        changed are removed.
+        :param memory_limit: The number of megabytes of counts to hold in memory while aggregating, or 0 for
+        no limit. Counts past the limit are spilled to sorted run files in the output directory and merged
+        once every result file has been read. With a limit, every result file is processed and the results
+        of every server type are written, as the processing manifest would need every count in memory.
+        :return: None
+        """
+        if memory_limit and resume:
+            logger.warning(
+                "Resuming is not supported with a memory limit. All result files will be processed."
+            )
+        writer_pool = ServerFileWriterPool(
+            output_directory=output_directory,
+            max_open_files=max_open_files,
+        )
+        try:
+            if memory_limit:
+                self.__aggregate_files_externally(
+                    writer_pool=writer_pool,
+                    ignore_threshold=ignore_threshold,
+                    report_interval=report_interval,
+                    workers=workers,
+                    use_mmap=use_mmap,
+                    ranked_output=ranked_output,
+                    output_format=output_format,
+                    granularity=granularity,
+                    family_rollup=family_rollup,
+                    store=store,
+                    server_consumer=server_consumer,
+                    persist_results=persist_results,
+                    memory_limit=memory_limit,
+                )
+            else:
+                self.__aggregate_files_incrementally(
+                    writer_pool=writer_pool,
+                    ignore_threshold=ignore_threshold,
+                    report_interval=report_interval,
+                    workers=workers,
+                    use_mmap=use_mmap,
+                    ranked_output=ranked_output,
+                    output_format=output_format,
+                    resume=resume,
+                    checkpoint_interval=checkpoint_interval,
+                    granularity=granularity,
+                    family_rollup=family_rollup,
+                    store=store,
+                    server_consumer=server_consumer,
+                    persist_results=persist_results,
+                )
+        finally:
+            with get_run_metrics().stage("write_results"):
+                writer_pool.close()
+
     def process_files_in_directory(
             self,
             ignore_threshold=ConfigManager.IGNORE_THRESHOLD,
             report_interval=ConfigManager.REPORT_INTERVAL,
             output_directory=ConfigManager.OUTPUT_DIRECTORY,
+            max_open_files=ConfigManager.MAX_OPEN_FILES,
+            use_mmap=ConfigManager.USE_MMAP,
     ):
         """
-        Process all of the result files in self.directory_path.
+        Process and write every result file in self.directory_path on its own. See
+        aggregate_files_in_directory to merge counts across all result files before applying the ignore
+        threshold.
         :param ignore_threshold: The minimum count that should be admonished when processing
         contents of the results file.
-        :param report_interval: The interval upon which to report to the user that processing is continuing.
+        :param report_interval: The number of seconds between progress reports, or 0 to disable them.
         :param output_directory: The directory where results should be stored.
+        :param max_open_files: The maximum number of result files to keep open at once while writing.
+        :param use_mmap: Whether or not to scan results files through a memory map.
         :return: None
         """
-        for file_name in os.listdir(self.directory_path):
-            if file_name.startswith(ConfigManager.RESULT_FILE_PREAMBLE):
-                file_path = os.path.join(self.directory_path, file_name)
-                self.process_file(
-                    file_path=file_path,
-                    ignore_threshold=ignore_threshold,
-                    report_interval=report_interval,
-                    output_directory=output_directory,
+        writer_pool = ServerFileWriterPool(
+            output_directory=output_directory,
+            max_open_files=max_open_files,
+        )
+        run_metrics = get_run_metrics()
+        try:
+            file_paths = self.get_result_file_paths()
+            progress = ProgressReporter.from_file_paths(
+                file_paths=file_paths,
+                report_interval=report_interval,
+                description="Processing",
+            )
+            with run_metrics.stage("process"), progress:
+                for file_path in file_paths:
+                    self.process_file(
+                        file_path=file_path,
+                        ignore_threshold=ignore_threshold,
+                        output_directory=output_directory,
+                        writer_pool=writer_pool,
+                        use_mmap=use_mmap,
+                        progress=progress.counter,
+                    )
+        finally:
+            with run_metrics.stage("write_results"):
+                writer_pool.close()
+
+    def get_result_file_paths(self):
+        """
+        Get the file paths for all of the result files in self.directory_path. Result files may be
+        compressed (see detect_compression). If self.directory_path is an s3:// URL, the result objects
+        directly within it are listed instead.
+        :return: A list of file paths (or s3:// URLs) for all of the result files in self.directory_path,
+        sorted by name.
+        """
+        if is_object_url(self.directory_path):
+            object_store = get_object_store()
+            to_return = object_store.list_objects(url=self.directory_path)
+            logger.debug(
+                "Found %s result objects (%.2f MB) in %s."
+                % (
+                    len(to_return),
+                    sum([object_store.stat(x)["size"] for x in to_return]) / 1048576.0,
+                    self.directory_path,
                 )
+            )
+            return to_return
+        to_return = []
+        compression_counts = {}
+        for file_name in sorted(os.listdir(self.directory_path)):
+            if not file_name.startswith(ConfigManager.RESULT_FILE_PREAMBLE):
+                continue
+            file_path = os.path.join(self.directory_path, file_name)
+            if not os.path.isfile(file_path):
+                continue
+            compression = detect_compression(file_path)
+            compression_counts[compression] = compression_counts.get(compression, 0) + 1
+            to_return.append(file_path)
+        logger.debug(
+            "Found %s result files in %s (%s)."
+            % (
+                len(to_return),
+                self.directory_path,
+                ", ".join(["%s %s" % (y, x or "uncompressed") for x, y in compression_counts.items()]),
+            )
+        )
+        return to_return
 
     def process_file(
             self,
             file_path=None,
             ignore_threshold=ConfigManager.IGNORE_THRESHOLD,
-            report_interval=ConfigManager.REPORT_INTERVAL,
             output_directory=ConfigManager.OUTPUT_DIRECTORY,
+            writer_pool=None,
+            use_mmap=ConfigManager.USE_MMAP,
+            progress=None,
     ):
         """
         Process the contents of the file at the given file path.
         :param file_path: The file path to the results file to parse.
         :param ignore_threshold: The minimum count that should be admonished when processing
         contents of the results file.
-        :param report_interval: The interval upon which to report to the user that processing is continuing.
         :param output_directory: The directory where results should be stored.
+        :param writer_pool: The ServerFileWriterPool to write results through. If None, a pool is
+        created for this file and closed once the file has been processed.
+        :param use_mmap: Whether or not to scan the results file through a memory map.
+        :param progress: The ProgressCounter to add the bytes and entries read from the file to, or None.
         :return: None
         """
         logger.debug(
             "Now processing the contents of file at path %s."
             % (file_path,)
         )
-        if not os.path.isdir(ConfigManager.OUTPUT_DIRECTORY):
-            os.makedirs(ConfigManager.OUTPUT_DIRECTORY)
-        file_parser = CCResultFileParser(file_path)
+        if not os.path.isdir(output_directory):
+            os.makedirs(output_directory)
+        owns_pool = writer_pool is None
+        if owns_pool:
+            writer_pool = ServerFileWriterPool(output_directory=output_directory)
+        file_parser = CCResultFileParser(
+            file_path,
+            use_mmap=use_mmap,
+            progress_callback=progress.add if progress is not None else None,
+        )
         processed_count = ignored_count = 0
-        for index, entry in enumerate(file_parser.iter_entries()):
-            if not index % report_interval:
-                logger.debug(
-                    "On entry %s in file %s. %s processed, %s ignored."
-                    % (index, file_path, processed_count, ignored_count)
-                )
-            if entry.count < ignore_threshold:
-                ignored_count += 1
-            else:
-                self.__parse_entry(entry=entry, output_directory=output_directory)
-                processed_count += 1
+        try:
+            for entry in file_parser.iter_decoded_entries():
+                if entry[3] < ignore_threshold:
+                    ignored_count += 1
+                else:
+                    self.__parse_entry(entry=entry, writer_pool=writer_pool)
+                    processed_count += 1
+            self.__log_file_summary(
+                file_parser=file_parser,
+                stage="process",
+                processed_count=processed_count,
+                ignored_count=ignored_count,
+            )
+            if progress is not None:
+                progress.add(file_count=1)
+        finally:
+            if owns_pool:
+                writer_pool.close()
 
     # Protected Methods
 
     # Private Methods
 
-    def __parse_entry(self, entry=None, output_directory=ConfigManager.OUTPUT_DIRECTORY):
+    def __aggregate_files_externally(
+            self,
+            writer_pool=None,
+            ignore_threshold=None,
+            report_interval=None,
+            workers=None,
+            use_mmap=None,
+            ranked_output=None,
+            output_format=None,
+            granularity=None,
+            family_rollup=None,
+            store=None,
+            server_consumer=None,
+            persist_results=None,
+            memory_limit=None,
+    ):
+        """
+        Aggregate every result file in self.directory_path within the given memory limit and write the results
+        of every server type. Counts that do not fit within the limit are spilled to sorted run files in a
+        temporary directory within the output directory, which is removed once results have been written. When
+        aggregating with multiple worker processes, the limit is split evenly between them. A processing
+        manifest found in the output directory is cleared, as it would no longer match the written results.
+        :param writer_pool: The ServerFileWriterPool to write results through.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param report_interval: The number of seconds between progress reports, or 0 to disable them.
+        :param workers: The number of worker processes to aggregate results files with.
+        :param use_mmap: Whether or not to scan results files through a memory map.
+        :param ranked_output: Whether or not to write URL segments sorted by descending count, preceded by
+        a header.
+        :param output_format: The format to write URL segments in (one of OUTPUT_FORMATS).
+        :param granularity: The granularity to aggregate server types at (one of GRANULARITIES).
+        :param family_rollup: Whether or not to also write results merged by server family.
+        :param store: Where to write results to (one of STORES).
+        :param server_consumer: A function to hand the aggregated results of every server type to, or None.
+        :param persist_results: Whether or not to write processed results.
+        :param memory_limit: The number of megabytes of counts to hold in memory while aggregating.
+        :return: None
+        """
+        output_directory = writer_pool.output_directory
+        run_metrics = get_run_metrics()
+        manifest = ProcessingManifest(output_directory=output_directory)
+        if manifest.exists:
+            logger.warning(
+                "The processing manifest at %s can not be kept with a memory limit and will be removed. All result "
+                "files will be processed."
+                % (manifest.manifest_path,)
+            )
+            manifest.clear()
+        if not os.path.isdir(output_directory):
+            os.makedirs(output_directory)
+        spill_directory = tempfile.mkdtemp(prefix=ConfigManager.SPILL_DIRECTORY_PREAMBLE, dir=output_directory)
+        aggregator = ExternalSegmentAggregator(memory_limit=memory_limit, spill_directory=spill_directory)
+        try:
+            file_paths = self.get_result_file_paths()
+            progress = ProgressReporter.from_file_paths(
+                file_paths=file_paths,
+                report_interval=report_interval,
+                description="Aggregating",
+            )
+            with run_metrics.stage("aggregate"), progress:
+                if workers > 1 and len(file_paths) > 1:
+                    partials = self.__iter_partials_in_parallel(
+                        file_paths=file_paths,
+                        workers=workers,
+                        use_mmap=use_mmap,
+                        output_directory=output_directory,
+                        resume=False,
+                        checkpoint_interval=0,
+                        granularity=granularity,
+                        progress=progress.counter,
+                        memory_limit=float(memory_limit) / workers,
+                        spill_directory=spill_directory,
+                    )
+                    for _, _, partial, file_metrics in partials:
+                        aggregator.merge(partial)
+                        run_metrics.add_file(file_metrics)
+                else:
+                    for file_path in file_paths:
+                        self.aggregate_file(
+                            file_path=file_path,
+                            aggregator=aggregator,
+                            use_mmap=use_mmap,
+                            granularity=granularity,
+                            progress=progress.counter,
+                        )
+            logger.debug(
+                "All result files aggregated (%s). Now merging spilled counts and writing results for all server "
+                "types to %s."
+                % (aggregator, output_directory)
+            )
+            self.__write_aggregator(
+                aggregator=aggregator,
+                writer_pool=writer_pool,
+                ignore_threshold=ignore_threshold,
+                ranked_output=ranked_output,
+                output_format=output_format,
+                granularity=granularity,
+                family_rollup=family_rollup,
+                store=store,
+                server_consumer=server_consumer,
+                persist_results=persist_results,
+            )
+            run_metrics.increment("runs_spilled", aggregator.spill_count)
+        finally:
+            shutil.rmtree(spill_directory, ignore_errors=True)
+
+    def __aggregate_files_incrementally(
+            self,
+            writer_pool=None,
+            ignore_threshold=None,
+            report_interval=None,
+            workers=None,
+            use_mmap=None,
+            ranked_output=None,
+            output_format=None,
+            resume=None,
+            checkpoint_interval=None,
+            granularity=None,
+            family_rollup=None,
+            store=None,
+            server_consumer=None,
+            persist_results=None,
+    ):
+        """
+        Aggregate the result files in self.directory_path that are new or have changed since they were recorded
+        in the output directory's ProcessingManifest, fold their counts into the recorded merged counts, and
+        rewrite the results of every server type whose counts changed. Recorded counts can only be reused if
+        they were aggregated at the same server type granularity. If a server consumer is given, the merged
+        counts of every server type are handed to it while results are written in a background thread.
+        :param writer_pool: The ServerFileWriterPool to write results through.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param report_interval: The number of seconds between progress reports, or 0 to disable them.
+        :param workers: The number of worker processes to aggregate results files with.
+        :param use_mmap: Whether or not to scan results files through a memory map.
+        :param ranked_output: Whether or not to write URL segments sorted by descending count, preceded by
+        a header.
+        :param output_format: The format to write URL segments in (one of OUTPUT_FORMATS).
+        :param resume: Whether or not to resume partially processed result files from their checkpoints.
+        :param checkpoint_interval: The minimum number of bytes to read from a result file between
+        checkpoints, or 0 to disable checkpointing.
+        :param granularity: The granularity to aggregate server types at (one of GRANULARITIES).
+        :param family_rollup: Whether or not to also write results merged by server family.
+        :param store: Where to write results to (one of STORES).
+        :param server_consumer: A function to hand the aggregated results of every server type to, or None.
+        :param persist_results: Whether or not to write processed results.
+        :return: None
+        """
+        output_directory = writer_pool.output_directory
+        results_directory = self.directory_path
+        if not is_object_url(results_directory):
+            results_directory = os.path.abspath(results_directory)
+        run_metrics = get_run_metrics()
+        manifest = ProcessingManifest(output_directory=output_directory)
+        with run_metrics.stage("load_manifest"):
+            aggregator = manifest.load()
+        if manifest.settings is not None:
+            manifest_granularity = manifest.settings.get("granularity", EXACT_GRANULARITY)
+            if manifest_granularity != granularity:
+                raise ValueError(
+                    "Results in %s were aggregated at the %s server type granularity and must be rebuilt to "
+                    "aggregate them at the %s server type granularity."
+                    % (output_directory, manifest_granularity, granularity)
+                )
+        if manifest.results_directory is not None and manifest.results_directory != results_directory:
+            logger.warning(
+                "Results in %s were previously processed from %s. Result files will be matched by name and "
+                "checksum."
+                % (output_directory, manifest.results_directory)
+            )
+        with run_metrics.stage("find_changes"):
+            result_file_paths = self.get_result_file_paths()
+            file_paths, touched_server_types = manifest.find_changes(
+                file_paths=result_file_paths,
+                aggregator=aggregator,
+            )
+        run_metrics.increment("files_unchanged", len(result_file_paths) - len(file_paths))
+        progress = ProgressReporter.from_file_paths(
+            file_paths=file_paths,
+            report_interval=report_interval,
+            description="Aggregating",
+        )
+        if workers > 1 and len(file_paths) > 1:
+            partials = self.__iter_partials_in_parallel(
+                file_paths=file_paths,
+                workers=workers,
+                use_mmap=use_mmap,
+                output_directory=output_directory,
+                resume=resume,
+                checkpoint_interval=checkpoint_interval,
+                granularity=granularity,
+                progress=progress.counter,
+            )
+        else:
+            partials = self.__iter_partials(
+                file_paths=file_paths,
+                use_mmap=use_mmap,
+                manifest=manifest,
+                resume=resume,
+                checkpoint_interval=checkpoint_interval,
+                granularity=granularity,
+                progress=progress.counter,
+            )
+        with run_metrics.stage("aggregate"), progress:
+            for index, (file_path, checksum, partial, file_metrics) in enumerate(partials):
+                aggregator.merge(partial)
+                touched_server_types.update(partial.server_types)
+                manifest.record_file(file_path=file_path, checksum=checksum, contribution=partial)
+                if file_metrics is not None:
+                    run_metrics.add_file(file_metrics)
+                logger.debug(
+                    "Merged partial results for %s of %s result files."
+                    % (index + 1, len(file_paths))
+                )
+        settings = {
+            "ignore_threshold": ignore_threshold,
+            "ranked_output": ranked_output,
+            "output_format": output_format,
+            "granularity": granularity,
+            "family_rollup": family_rollup,
+            "store": store,
+        }
+        if not persist_results:
+            settings["persist_results"] = False
+        if settings != manifest.settings:
+            server_types = None
+            logger.debug(
+                "All result files aggregated (%s). Output settings differ from the last run. Now writing results "
+                "for all server types to %s."
+                % (aggregator, output_directory)
+            )
+        else:
+            server_types = touched_server_types
+            logger.debug(
+                "All result files aggregated (%s). Now writing results for %s changed server types to %s."
+                % (aggregator, len(server_types), output_directory)
+            )
+        self.__write_aggregator(
+            aggregator=aggregator,
+            writer_pool=writer_pool,
+            ignore_threshold=ignore_threshold,
+            ranked_output=ranked_output,
+            output_format=output_format,
+            granularity=granularity,
+            family_rollup=family_rollup,
+            store=store,
+            server_consumer=server_consumer,
+            persist_results=persist_results,
+            server_types=server_types,
+        )
+        with run_metrics.stage("save_manifest"):
+            manifest.save(settings=settings, results_directory=results_directory)
+
+    def __consume_while_writing(
+            self,
+            server_consumer=None,
+            aggregators=None,
+            ignore_threshold=None,
+            write_kwargs=None,
+    ):
+        """
+        Hand the merged counts of every server type held by the given aggregators to the given consumer while
+        results are written in a background thread (see __write_results).
+        :param server_consumer: The function to hand the aggregated results of every server type to.
+        :param aggregators: A list of the SegmentAggregators to hand the merged counts of.
+        :param ignore_threshold: The minimum merged count that should be admonished.
+        :param write_kwargs: A dictionary containing the keyword arguments to write results with.
+        :return: The set of server types that results were written for or handed to the consumer for.
+        """
+        errors = []
+        kept_server_types = set()
+
+        def write_in_background():
+            try:
+                kept_server_types.update(self.__write_results(**write_kwargs))
+            except BaseException as e:
+                errors.append(e)
+
+        def iter_aggregated_servers():
+            for aggregator in aggregators:
+                for aggregated_server in aggregator.iter_servers(ignore_threshold=ignore_threshold):
+                    kept_server_types.add(aggregated_server[0])
+                    yield aggregated_server
+
+        writer_thread = threading.Thread(target=write_in_background)
+        writer_thread.daemon = True
+        writer_thread.start()
+        try:
+            with get_run_metrics().stage("consume_results"):
+                server_consumer(iter_aggregated_servers())
+        finally:
+            writer_thread.join()
+        if errors:
+            raise errors[0]
+        logger.debug("Results were consumed and written for all server types.")
+        return kept_server_types
+
+    def __group_by_family(self, aggregator=None, server_types=None):
+        """
+        Merge the contents of the given aggregator by server family. Every server family is keyed by its
+        directory within the ConfigManager.FAMILY_DIRECTORY_NAME directory of the output directory.
+        :param aggregator: The SegmentAggregator to merge the contents of.
+        :param server_types: The server types whose counts changed, or None to merge every server family.
+        :return: A tuple containing (1) a SegmentAggregator holding the merged counts of the server families
+        and (2) the set of server families that were merged, or None if every server family was merged.
+        """
+        canonicalizer = ServerTypeCanonicalizer(granularity=FAMILY_GRANULARITY)
+
+        def get_family_directory(server_type):
+            return os.path.join(ConfigManager.FAMILY_DIRECTORY_NAME, canonicalizer.canonicalize(server_type))
+
+        family_server_types = None
+        if server_types is not None:
+            family_server_types = set([get_family_directory(x) for x in server_types])
+        families = aggregator.group_by(key_function=get_family_directory, keys=family_server_types)
+        logger.debug("Merged results by server family (%s)." % (families,))
+        return families, family_server_types
+
+    def __iter_partials(
+            self,
+            file_paths=None,
+            use_mmap=None,
+            manifest=None,
+            resume=None,
+            checkpoint_interval=None,
+            granularity=None,
+            progress=None,
+    ):
+        """
+        Aggregate each of the given result files on its own.
+        :param file_paths: The paths to the result files to aggregate.
+        :param use_mmap: Whether or not to scan results files through a memory map.
+        :param manifest: The ProcessingManifest to save checkpoints to.
+        :param resume: Whether or not to resume partially processed result files from their checkpoints.
+        :param checkpoint_interval: The minimum number of bytes to read between checkpoints.
+        :param granularity: The granularity to aggregate server types at.
+        :param progress: The ProgressCounter to add the progress made through the result files to.
+        :return: A generator yielding tuples containing (1) the file path, (2) the checksum of the file, (3) a
+        SegmentAggregator containing the partial counts for the file, and (4) None, as the metrics for the file
+        are recorded in this process.
+        """
+        for file_path in file_paths:
+            partial, checksum = self.aggregate_file(
+                file_path=file_path,
+                use_mmap=use_mmap,
+                manifest=manifest,
+                resume=resume,
+                checkpoint_interval=checkpoint_interval,
+                granularity=granularity,
+                progress=progress,
+            )
+            yield file_path, checksum, partial, None
+
+    def __iter_partials_in_parallel(
+            self,
+            file_paths=None,
+            workers=None,
+            use_mmap=None,
+            output_directory=None,
+            resume=None,
+            checkpoint_interval=None,
+            granularity=None,
+            progress=None,
+            memory_limit=0,
+            spill_directory=None,
+    ):
+        """
+        Aggregate each of the given result files on its own using a pool of worker processes. The largest
+        files are scheduled first.
+        :param file_paths: The paths to the result files to aggregate.
+        :param workers: The number of worker processes to use.
+        :param use_mmap: Whether or not to scan results files through a memory map.
+        :param output_directory: The output directory whose ProcessingManifest checkpoints are saved to.
+        :param resume: Whether or not to resume partially processed result files from their checkpoints.
+        :param checkpoint_interval: The minimum number of bytes to read between checkpoints.
+        :param granularity: The granularity to aggregate server types at.
+        :param progress: The ProgressCounter that worker processes add the progress made through the result
+        files to.
+        :param memory_limit: The number of megabytes of counts that every worker process may hold in memory
+        before spilling them to disk, or 0 to keep every count in memory.
+        :param spill_directory: The directory that worker processes spill counts to.
+        :return: A generator yielding tuples containing (1) the file path, (2) the checksum of the file, (3) a
+        SegmentAggregator containing the partial counts for the file, and (4) the metrics recorded for the file
+        by its worker, in order of completion.
+        """
+        file_paths = sorted(file_paths, key=get_location_size, reverse=True)
+        logger.debug(
+            "Now aggregating %s result files using %s worker processes."
+            % (len(file_paths), workers)
+        )
+        log_queue = multiprocessing.Queue()
+        log_listener = QueueLogListener(log_queue)
+        log_listener.start()
+        pool = multiprocessing.Pool(
+            processes=workers,
+            initializer=initialize_worker,
+            initargs=(log_queue, ConfigManager.LOGGING_LEVEL, progress, ConfigManager.S3_ENDPOINT_URL),
+        )
+        try:
+            worker_args = [
+                (
+                    self.directory_path,
+                    x,
+                    use_mmap,
+                    output_directory,
+                    resume,
+                    checkpoint_interval,
+                    granularity,
+                    memory_limit,
+                    spill_directory,
+                )
+                for x in file_paths
+            ]
+            for result in pool.imap_unordered(_aggregate_file_in_worker, worker_args):
+                yield result
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            log_listener.stop()
+
+    def __log_file_summary(self, file_parser=None, stage=None, processed_count=None, ignored_count=0):
+        """
+        Log a summary of how processing the results file wrapped by the given parser went and record it to
+        the RunMetrics of the current process.
+        :param file_parser: The CCResultFileParser that the results file was read with.
+        :param stage: The name of the stage that the results file was read in.
+        :param processed_count: The number of entries that were processed.
+        :param ignored_count: The number of entries that were ignored for falling below the ignore threshold.
+        :return: None
         """
-        Parse the contents of the given CCResultEntry and add the relevant contents to the expected
+        logger.debug(
+            "Finished file %s at %.2f MB/s. %s entries processed, %s ignored, %s invalid entries, %s bad records."
+            % (
+                file_parser.file_path,
+                file_parser.throughput,
+                processed_count,
+                ignored_count,
+                file_parser.invalid_entry_count,
+                file_parser.bad_record_count,
+            )
+        )
+        get_run_metrics().record_file(
+            file_parser=file_parser,
+            stage=stage,
+            processed_count=processed_count,
+            ignored_count=ignored_count,
+        )
+
+    def __parse_entry(self, entry=None, writer_pool=None):
+        """
+        Parse the contents of the given decoded entry and add the relevant contents to the expected
         directory.
-        :param entry: The entry to process.
-        :param output_directory: The directory where results should be stored.
+        :param entry: The decoded entry tuple to process (see decode_raw_entry).
+        :param writer_pool: The ServerFileWriterPool to write results through.
         :return: None
         """
-        if entry.is_record_processed_type:
-            logger.debug("Entry is record processed type. Ignoring.")
-            return
-        results_path = os.path.join(output_directory, entry.server_type)
-        if not os.path.isdir(results_path):
-            os.makedirs(results_path)
-        if entry.is_server_name:
-            results_file_path = os.path.join(results_path, ConfigManager.SERVER_COUNT_FILE_NAME)
-            with open(results_file_path, "w+") as f:
-                f.write(str(entry.count))
-        elif entry.is_server_path:
-            url_segment = entry.url_path.replace("\t", "").strip()
+        entry_type, server_type, url_path, count = entry
+        if entry_type == SERVER_NAME_ENTRY:
+            writer_pool.set_contents(
+                server_type=server_type,
+                file_name=ConfigManager.SERVER_COUNT_FILE_NAME,
+                contents=str(count),
+            )
+        elif entry_type == SERVER_PATH_ENTRY:
+            url_segment = url_path.strip()
             if not url_segment:
                 return
-            file_entry = "%s\t%s" % (url_segment, entry.count)
-            results_file_path = os.path.join(results_path, ConfigManager.URL_PATH_FILE_NAME)
-            with open(results_file_path, "a+") as f:
-                f.write("%s\n" % file_entry)
+            writer_pool.append_line(
+                server_type=server_type,
+                file_name=ConfigManager.URL_PATH_FILE_NAME,
+                line="%s\t%s" % (url_segment, count),
+            )
+        else:
+            logger.debug("Entry is record processed type. Ignoring.")
+
+    def __remove_dropped_servers(self, output_directory=None, server_types=None, kept_server_types=None):
+        """
+        Remove the results and hit lists of the given server types that no longer have any results, along with
+        their directories once these are empty, so that no hit lists are left for server types that are no
+        longer found.
+        :param output_directory: The directory where results are stored.
+        :param server_types: The server types whose results were replaced, or None if the results of every
+        server type found in the output directory were replaced.
+        :param kept_server_types: The set of server types that results were written or consumed for.
+        :return: None
+        """
+        if server_types is None:
+            server_types = []
+            for directory, child_directories, _ in os.walk(output_directory):
+                if directory == output_directory:
+                    child_directories[:] = [
+                        x for x in child_directories
+                        if x != ConfigManager.STATE_DIRECTORY_NAME
+                        and not x.startswith(ConfigManager.SPILL_DIRECTORY_PREAMBLE)
+                    ]
+                else:
+                    server_types.append(os.path.relpath(directory, output_directory))
+        file_names = set([
+            ConfigManager.SERVER_COUNT_FILE_NAME,
+            ConfigManager.URL_PATH_FILE_NAME,
+            ConfigManager.BINARY_URL_PATH_FILE_NAME,
+            ConfigManager.COERCED_PATH_FILE_NAME,
+            ConfigManager.BINARY_COERCED_PATH_FILE_NAME,
+        ])
+        dropped_count = 0
+        root_directory = os.path.abspath(output_directory)
+        for server_type in sorted(server_types, key=lambda x: x.count(os.sep), reverse=True):
+            if server_type in kept_server_types:
+                continue
+            directory = os.path.abspath(os.path.join(output_directory, server_type))
+            if not os.path.isdir(directory):
+                continue
+            is_dropped = False
+            for file_name in os.listdir(directory):
+                if file_name in file_names or file_name.startswith(ConfigManager.HIT_LIST_FILE_PREAMBLE):
+                    file_path = os.path.join(directory, file_name)
+                    if os.path.isfile(file_path):
+                        os.remove(file_path)
+                        is_dropped = True
+            while directory != root_directory and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+                is_dropped = True
+            if is_dropped:
+                dropped_count += 1
+        logger.debug("Removed the results and hit lists of %s dropped server types." % (dropped_count,))
+
+    def __remove_server_results(self, output_directory=None, server_types=None):
+        """
+        Remove the processed results previously written for the given server types so that server types which
+        no longer have any results are not left with stale ones (see __remove_dropped_servers).
+        :param output_directory: The directory where results are stored.
+        :param server_types: The server types to remove results for, or None to remove the results of every
+        server type found in the output directory.
+        :return: None
+        """
+        file_names = [
+            ConfigManager.SERVER_COUNT_FILE_NAME,
+            ConfigManager.URL_PATH_FILE_NAME,
+            ConfigManager.BINARY_URL_PATH_FILE_NAME,
+            ConfigManager.COERCED_PATH_FILE_NAME,
+            ConfigManager.BINARY_COERCED_PATH_FILE_NAME,
+        ]
+        if server_types is None:
+            directories = []
+            for directory, child_directories, _ in os.walk(output_directory):
+                if ConfigManager.STATE_DIRECTORY_NAME in child_directories:
+                    child_directories.remove(ConfigManager.STATE_DIRECTORY_NAME)
+                directories.append(directory)
+        else:
+            directories = [os.path.join(output_directory, x) for x in server_types]
+        for directory in directories:
+            for file_name in file_names:
+                file_path = os.path.join(directory, file_name)
+                if os.path.isfile(file_path):
+                    os.remove(file_path)
+
+    def __write_aggregated_results(
+            self,
+            aggregator=None,
+            writer_pool=None,
+            ignore_threshold=None,
+            ranked_output=False,
+            output_format=None,
+            server_types=None,
+    ):
+        """
+        Write the merged contents of the given aggregator to the relevant server type directories.
+        :param aggregator: The SegmentAggregator to write the contents of.
+        :param writer_pool: The ServerFileWriterPool to write results through.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param ranked_output: Whether or not to write URL segments sorted by descending count, preceded by
+        a header.
+        :param output_format: The format to write URL segments in (one of OUTPUT_FORMATS).
+        :param server_types: The server types to write results for, or None to write results for every
+        server type.
+        :return: The set of server types that results were written for.
+        """
+        record_segments_written = get_run_metrics().record_segments_written
+        written_server_types = set()
+        for server_type, total_count, url_segments in aggregator.iter_servers(ignore_threshold=ignore_threshold):
+            if server_types is not None and server_type not in server_types:
+                continue
+            written_server_types.add(server_type)
+            if total_count is not None:
+                writer_pool.set_contents(
+                    server_type=server_type,
+                    file_name=ConfigManager.SERVER_COUNT_FILE_NAME,
+                    contents=str(total_count),
+                )
+            if not url_segments:
+                continue
+            record_segments_written(server_type, len(url_segments))
+            url_segments, coerced_segments = split_coerced_segments(url_segments=url_segments)
+            self.__write_segments(
+                writer_pool=writer_pool,
+                server_type=server_type,
+                url_segments=url_segments,
+                file_names=(ConfigManager.URL_PATH_FILE_NAME, ConfigManager.BINARY_URL_PATH_FILE_NAME),
+                ranked_output=ranked_output,
+                output_format=output_format,
+                excludes_coerced=True,
+            )
+            if coerced_segments:
+                self.__write_segments(
+                    writer_pool=writer_pool,
+                    server_type=server_type,
+                    url_segments=coerced_segments,
+                    file_names=(ConfigManager.COERCED_PATH_FILE_NAME, ConfigManager.BINARY_COERCED_PATH_FILE_NAME),
+                    ranked_output=ranked_output,
+                    output_format=output_format,
+                )
+        return written_server_types
+
+    def __write_aggregator(
+            self,
+            aggregator=None,
+            writer_pool=None,
+            ignore_threshold=None,
+            ranked_output=None,
+            output_format=None,
+            granularity=None,
+            family_rollup=None,
+            store=None,
+            server_consumer=None,
+            persist_results=None,
+            server_types=None,
+    ):
+        """
+        Roll the merged contents of the given aggregator up by server family if requested, and write them out.
+        If a server consumer is given, the merged counts of every server type are handed to it while results
+        are written in a background thread. Once results are written, the directories of server types that no
+        longer have any results are removed along with the hit lists generated for them.
+        :param aggregator: The SegmentAggregator (or ExternalSegmentAggregator) to write the contents of.
+        :param writer_pool: The ServerFileWriterPool to write results through.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param ranked_output: Whether or not to write URL segments sorted by descending count, preceded by
+        a header.
+        :param output_format: The format to write URL segments in (one of OUTPUT_FORMATS).
+        :param granularity: The granularity that server types were aggregated at (one of GRANULARITIES).
+        :param family_rollup: Whether or not to also write results merged by server family.
+        :param store: Where to write results to (one of STORES).
+        :param server_consumer: A function to hand the aggregated results of every server type to, or None.
+        :param persist_results: Whether or not to write processed results.
+        :param server_types: The server types to write results for, or None to write results for every
+        server type.
+        :return: None
+        """
+        run_metrics = get_run_metrics()
+        families = family_server_types = None
+        if family_rollup and granularity != FAMILY_GRANULARITY:
+            with run_metrics.stage("family_rollup"):
+                families, family_server_types = self.__group_by_family(
+                    aggregator=aggregator,
+                    server_types=server_types,
+                )
+        write_kwargs = {
+            "aggregator": aggregator,
+            "families": families,
+            "writer_pool": writer_pool,
+            "ignore_threshold": ignore_threshold,
+            "ranked_output": ranked_output,
+            "output_format": output_format,
+            "server_types": server_types,
+            "family_server_types": family_server_types,
+            "store": store,
+            "persist_results": persist_results,
+        }
+        if server_consumer is None:
+            kept_server_types = self.__write_results(**write_kwargs)
+        else:
+            if families is not None and family_server_types is not None:
+                families, _ = self.__group_by_family(aggregator=aggregator)
+            kept_server_types = self.__consume_while_writing(
+                server_consumer=server_consumer,
+                aggregators=[aggregator] if families is None else [aggregator, families],
+                ignore_threshold=ignore_threshold,
+                write_kwargs=write_kwargs,
+            )
+        if server_types is not None:
+            server_types = set(server_types) | (family_server_types or set())
+        self.__remove_dropped_servers(
+            output_directory=writer_pool.output_directory,
+            server_types=server_types,
+            kept_server_types=kept_server_types,
+        )
+
+    def __write_results(
+            self,
+            aggregator=None,
+            families=None,
+            writer_pool=None,
+            ignore_threshold=None,
+            ranked_output=None,
+            output_format=None,
+            server_types=None,
+            family_server_types=None,
+            store=None,
+            persist_results=True,
+    ):
+        """
+        Write the merged contents of the given aggregators to the given store, replacing the results of the
+        given server types and server families. If results are not persisted, the results previously written
+        for those server types and server families are removed instead.
+        :param aggregator: The SegmentAggregator to write the contents of.
+        :param families: The SegmentAggregator holding the counts merged by server family, or None if results
+        are not rolled up by server family.
+        :param writer_pool: The ServerFileWriterPool to write results through.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param ranked_output: Whether or not to write URL segments sorted by descending count, preceded by
+        a header.
+        :param output_format: The format to write URL segments in (one of OUTPUT_FORMATS).
+        :param server_types: The server types to write results for, or None to write results for every
+        server type.
+        :param family_server_types: The server families to write results for, or None to write results for
+        every server family.
+        :param store: Where to write results to (one of STORES).
+        :param persist_results: Whether or not to write results.
+        :return: The set of server types and server families that results were written for.
+        """
+        output_directory = writer_pool.output_directory
+        if not persist_results:
+            empty = SegmentAggregator()
+            aggregator = empty
+            if families is not None:
+                families = empty
+        with get_run_metrics().stage("write_results"):
+            if store == SQLITE_STORE:
+                written_server_types = self.__write_results_to_store(
+                    aggregator=aggregator,
+                    families=families,
+                    output_directory=output_directory,
+                    ignore_threshold=ignore_threshold,
+                    server_types=server_types,
+                    family_server_types=family_server_types,
+                )
+            else:
+                self.__remove_server_results(output_directory=output_directory, server_types=server_types)
+                written_server_types = self.__write_aggregated_results(
+                    aggregator=aggregator,
+                    writer_pool=writer_pool,
+                    ignore_threshold=ignore_threshold,
+                    ranked_output=ranked_output,
+                    output_format=output_format,
+                    server_types=server_types,
+                )
+                if families is not None:
+                    if family_server_types is not None:
+                        self.__remove_server_results(
+                            output_directory=output_directory,
+                            server_types=family_server_types,
+                        )
+                    written_server_types |= self.__write_aggregated_results(
+                        aggregator=families,
+                        writer_pool=writer_pool,
+                        ignore_threshold=ignore_threshold,
+                        ranked_output=ranked_output,
+                        output_format=output_format,
+                    )
+            writer_pool.flush()
+        return written_server_types
+
+    def __write_results_to_store(
+            self,
+            aggregator=None,
+            families=None,
+            output_directory=None,
+            ignore_threshold=None,
+            server_types=None,
+            family_server_types=None,
+    ):
+        """
+        Write the merged contents of the given aggregators to the SQLiteResultStore in the output directory.
+        :param aggregator: The SegmentAggregator to write the contents of.
+        :param families: The SegmentAggregator holding the counts merged by server family, or None if results
+        are not rolled up by server family.
+        :param output_directory: The directory where results are stored.
+        :param ignore_threshold: The minimum merged count that should be admonished when writing results.
+        :param server_types: The server types to write results for, or None to replace all stored results.
+        :param family_server_types: The server families to write results for, or None to write results for
+        every server family.
+        :return: The set of server types and server families that results were stored for.
+        """
+        if not os.path.isdir(output_directory):
+            os.makedirs(output_directory)
+        database_path = os.path.join(output_directory, ConfigManager.SQLITE_DATABASE_NAME)
+        with SQLiteResultStore(database_path) as result_store:
+            stored_server_types = result_store.write_aggregator(
+                aggregator=aggregator,
+                ignore_threshold=ignore_threshold,
+                server_types=server_types,
+            )
+            if families is not None:
+                if family_server_types is None:
+                    family_server_types = families.server_types
+                stored_server_types |= result_store.write_aggregator(
+                    aggregator=families,
+                    ignore_threshold=ignore_threshold,
+                    server_types=family_server_types,
+                )
+        return stored_server_types
+
+    def __write_segments(
+            self,
+            writer_pool=None,
+            server_type=None,
+            url_segments=None,
+            file_names=None,
+            ranked_output=False,
+            output_format=None,
+            excludes_coerced=False,
+    ):
+        """
+        Write the given URL segments for the given server type in the given format. A header is written
+        at the top of text files that are pre-ranked or that coerced URL segments were split out of.
+        :param writer_pool: The ServerFileWriterPool to write results through.
+        :param server_type: The server type that the URL segments were found for.
+        :param url_segments: A list of (URL segment, count) tuples to write.
+        :param file_names: A tuple containing the names of (1) the text and (2) the binary file to write to.
+        :param ranked_output: Whether or not to write URL segments sorted by descending count.
+        :param output_format: The format to write URL segments in (one of OUTPUT_FORMATS).
+        :param excludes_coerced: Whether or not URL segments that contain coerced values were split out of
+        the given URL segments.
+        :return: None
+        """
+        text_file_name, binary_file_name = file_names
+        if ranked_output:
+            url_segments = sorted(url_segments, key=itemgetter(1), reverse=True)
+        if output_format == BINARY_FORMAT:
+            writer_pool.set_binary_contents(
+                server_type=server_type,
+                file_name=binary_file_name,
+                contents=pack_binary_segments(
+                    url_segments=url_segments,
+                    is_sorted=ranked_output,
+                    excludes_coerced=excludes_coerced,
+                ),
+            )
+            return
+        contents = []
+        if ranked_output or excludes_coerced:
+            header = format_segments_header(
+                segment_count=len(url_segments),
+                total_count=sum([x[1] for x in url_segments]),
+                is_sorted=ranked_output,
+                excludes_coerced=excludes_coerced,
+            )
+            contents.append("%s\n" % (header,))
+        contents.extend(["%s\t%s\n" % (x, y) for x, y in url_segments])
+        writer_pool.set_contents(
+            server_type=server_type,
+            file_name=text_file_name,
+            contents="".join(contents),
+        )
 
     # Properties
 
     @property
     def directory_path(self):
         """
-        Get the local file path to where the Common Crawl results files reside.
-        :return: the local file path to where the Common Crawl results files reside.
+        Get the local file path (or s3:// URL) to where the Common Crawl results files reside.
+        :return: the local file path (or s3:// URL) to where the Common Crawl results files reside.
         """
         return self._directory_path
 
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import multiprocessing
+import threading
+import time
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+from .objectstore import get_location_size
+
+logger = get_logger_for_name(__name__)
+
+
+def format_duration(seconds):
+    """
+    Format the given number of seconds as hours, minutes, and seconds.
+    :param seconds: The number of seconds to format.
+    :return: A string containing the duration (ex: 01:02:03).
+    """
+    seconds = int(round(seconds))
+    return "%02d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+class ProgressCounter(object):
+    """
+    This class holds the number of bytes, entries, and files consumed by a processing job in shared memory so
+    that every worker process of the job can add to them. Counters are updated once per block read rather
+    than once per entry.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self):
+        self._lock = multiprocessing.Lock()
+        self._byte_count = multiprocessing.RawValue("d", 0)
+        self._entry_count = multiprocessing.RawValue("d", 0)
+        self._file_count = multiprocessing.RawValue("i", 0)
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def add(self, byte_count=0, entry_count=0, file_count=0):
+        """
+        Add the given amounts to this counter.
+        :param byte_count: The number of bytes consumed.
+        :param entry_count: The number of entries consumed.
+        :param file_count: The number of files finished.
+        :return: None
+        """
+        with self._lock:
+            self._byte_count.value += byte_count
+            self._entry_count.value += entry_count
+            self._file_count.value += file_count
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    @property
+    def byte_count(self):
+        """
+        Get the number of bytes consumed.
+        :return: the number of bytes consumed.
+        """
+        return int(self._byte_count.value)
+
+    @property
+    def entry_count(self):
+        """
+        Get the number of entries consumed.
+        :return: the number of entries consumed.
+        """
+        return int(self._entry_count.value)
+
+    @property
+    def file_count(self):
+        """
+        Get the number of files finished.
+        :return: the number of files finished.
+        """
+        return self._file_count.value
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s bytes, %s entries, %s files>" % (
+            self.__class__.__name__,
+            self.byte_count,
+            self.entry_count,
+            self.file_count,
+        )
+
+
+class ProgressReporter(object):
+    """
+    This class reports the progress of a processing job on a background thread at a fixed time interval. The
+    job's progress is measured in bytes consumed from every results file in the job (compressed bytes for
+    compressed results files), and every report includes the percentage done, the throughput in MB/s and
+    entries/s, and the estimated time remaining.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            total_bytes=None,
+            total_files=None,
+            report_interval=ConfigManager.REPORT_INTERVAL,
+            description="Processing",
+    ):
+        self._total_bytes = total_bytes
+        self._total_files = total_files
+        self._report_interval = report_interval
+        self._description = description
+        self._counter = ProgressCounter()
+        self._start_time = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    # Static Methods
+
+    # Class Methods
+
+    @classmethod
+    def from_file_paths(
+            cls,
+            file_paths=None,
+            report_interval=ConfigManager.REPORT_INTERVAL,
+            description="Processing",
+    ):
+        """
+        Create a reporter for a job that consumes the files at the given paths.
+        :param file_paths: The paths (or s3:// URLs) to the files that the job consumes.
+        :param report_interval: The number of seconds between progress reports, or 0 to disable them.
+        :param description: The description of the job to include in every report.
+        :return: A ProgressReporter whose totals are the number and the combined size of the files.
+        """
+        return cls(
+            total_bytes=sum([get_location_size(x) for x in file_paths]),
+            total_files=len(file_paths),
+            report_interval=report_interval,
+            description=description,
+        )
+
+    # Public Methods
+
+    def report(self):
+        """
+        Log the progress made so far.
+        :return: None
+        """
+        elapsed_seconds = max(time.time() - self._start_time, 1e-6)
+        byte_count = self.counter.byte_count
+        byte_rate = byte_count / elapsed_seconds
+        if self.total_bytes:
+            percent_done = min(100.0 * byte_count / self.total_bytes, 100.0)
+        else:
+            percent_done = 100.0
+        if byte_rate > 0:
+            eta = format_duration(max(self.total_bytes - byte_count, 0) / byte_rate)
+        else:
+            eta = "unknown"
+        logger.info(
+            "%s: %.1f%% done (%.1f of %.1f MB, %s of %s files) at %.2f MB/s and %d entries/s. ETA %s."
+            % (
+                self.description,
+                percent_done,
+                byte_count / 1048576.0,
+                self.total_bytes / 1048576.0,
+                self.counter.file_count,
+                self.total_files,
+                byte_rate / 1048576.0,
+                self.counter.entry_count / elapsed_seconds,
+                eta,
+            )
+        )
+
+    def start(self):
+        """
+        Start reporting progress in a background thread.
+        :return: None
+        """
+        self._start_time = time.time()
+        if self.report_interval <= 0:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.__report_periodically)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread and log a final summary of the job.
+        :return: None
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        if self._start_time is None:
+            return
+        elapsed_seconds = max(time.time() - self._start_time, 1e-6)
+        logger.info(
+            "%s: consumed %.1f MB from %s files in %s (%.2f MB/s and %d entries/s)."
+            % (
+                self.description,
+                self.counter.byte_count / 1048576.0,
+                self.counter.file_count,
+                format_duration(elapsed_seconds),
+                self.counter.byte_count / 1048576.0 / elapsed_seconds,
+                self.counter.entry_count / elapsed_seconds,
+            )
+        )
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __report_periodically(self):
+        """
+        Report progress every self.report_interval seconds until stopped.
+        :return: None
+        """
+        while not self._stop_event.wait(self.report_interval):
+            self.report()
+
+    # Properties
+
+    @property
+    def counter(self):
+        """
+        Get the ProgressCounter that the job's progress is added to.
+        :return: the ProgressCounter that the job's progress is added to.
+        """
+        return self._counter
+
+    @property
+    def description(self):
+        """
+        Get the description of the job that is included in every report.
+        :return: the description of the job that is included in every report.
+        """
+        return self._description
+
+    @property
+    def report_interval(self):
+        """
+        Get the number of seconds between progress reports.
+        :return: the number of seconds between progress reports.
+        """
+        return self._report_interval
+
+    @property
+    def total_bytes(self):
+        """
+        Get the total number of bytes that the job will consume.
+        :return: the total number of bytes that the job will consume.
+        """
+        return self._total_bytes
+
+    @property
+    def total_files(self):
+        """
+        Get the total number of files in the job.
+        :return: the total number of files in the job.
+        """
+        return self._total_files
+
+    # Representation and Comparison
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __repr__(self):
+        return "<%s - %s (%s)>" % (self.__class__.__name__, self.description, self.counter)
@@ -8,6 +8,35 @@ class InvalidEntryError(Exception):
     """
 
 
+RECORD_ENTRY = "00"
+SERVER_NAME_ENTRY = "01"
+SERVER_PATH_ENTRY = "02"
+RECORD_SEPARATOR = "_';)_"
+RECORD_CONTENT_OFFSET = 4 + len(RECORD_SEPARATOR)
+
+
+def decode_raw_entry(raw_entry):
+    """
+    Decode the contents of a single raw entry found within a lavalamp Common Crawl analysis file without
+    wrapping it in an object.
+    :param raw_entry: The raw entry string to decode.
+    :return: A tuple containing (1) the entry type, (2) the server type, (3) the URL path, and (4) the
+    count for the entry, or None if the entry is not valid. The server type is None for record entries and
+    the URL path is None for all but server path entries. A ValueError is raised if the count can not be parsed.
+    """
+    if not raw_entry.startswith("< "):
+        return None
+    count = int(raw_entry[raw_entry.rfind("\t") + 1:])
+    tab_index = raw_entry.find("\t")
+    entry_type = raw_entry[2:4]
+    if entry_type == SERVER_PATH_ENTRY:
+        server_type, _, url_path = raw_entry[RECORD_CONTENT_OFFSET:tab_index].partition(RECORD_SEPARATOR)
+        return entry_type, server_type, url_path[:-2], count
+    elif entry_type == SERVER_NAME_ENTRY:
+        return entry_type, raw_entry[RECORD_CONTENT_OFFSET:tab_index - 2], None, count
+    return entry_type, None, None, count
+
+
 class CCResultEntry(object):
     """
     This class wraps the contents of a single entry found within a lavalamp Common Crawl analysis file.
@@ -15,10 +44,10 @@ class CCResultEntry(object):
 
     # Class Members
 
-    RECORD_ENTRY = "00"
-    SERVER_NAME_ENTRY = "01"
-    SERVER_PATH_ENTRY = "02"
-    RECORD_SEPARATOR = "_';)_"
+    RECORD_ENTRY = RECORD_ENTRY
+    SERVER_NAME_ENTRY = SERVER_NAME_ENTRY
+    SERVER_PATH_ENTRY = SERVER_PATH_ENTRY
+    RECORD_SEPARATOR = RECORD_SEPARATOR
 
     # Instantiation
 
@@ -28,7 +57,6 @@ class CCResultEntry(object):
         self._server_type = None
         self._url_path = None
         self._count = None
-        self.__validate_entry_contents()
         self.__parse_entry_contents()
 
     # Static Methods
@@ -46,27 +74,10 @@ class CCResultEntry(object):
         Parse the contents of self.entry_contents to populate fields within this object.
         :return: None
         """
-        contents_split = self.entry_contents.split("\t")
-        record_content = contents_split[0]
-        count = contents_split[-1]
-        self._count = int(count)
-        record_content = record_content[2:]
-        self._entry_type = record_content[:2]
-        record_content = record_content[2 + len(self.RECORD_SEPARATOR):]
-        if self.is_server_name:
-            self._server_type = record_content[:-2]
-        elif self.is_server_path:
-            self._server_type = record_content[:record_content.find(self.RECORD_SEPARATOR)]
-            record_content = record_content[record_content.find(self.RECORD_SEPARATOR) + len(self.RECORD_SEPARATOR): -2]
-            self._url_path = record_content
-
-    def __validate_entry_contents(self):
-        """
-        Validate that the contents of self.entry_contents represent a valid entry.
-        :return: None
-        """
-        if not self.entry_contents.startswith("< "):
-            raise InvalidEntryError("Entry did not start with '< ': %s" % self.entry_contents)
+        decoded = decode_raw_entry(self.entry_contents)
+        if decoded is None:
+            raise InvalidEntryError("Entry was not a valid entry: %s" % self.entry_contents)
+        self._entry_type, self._server_type, self._url_path, self._count = decoded
 
     # Properties
 
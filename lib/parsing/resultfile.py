@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import hashlib
+import mmap
+import os
+import time
+
 from ..cclogging import get_logger_for_name
-from .resultentry import InvalidEntryError, CCResultEntry
+from ..config import ConfigManager
+from .compression import detect_compression, open_decompressed_stream, ThreadedBlockReader
+from .objectstore import get_object_store, is_object_url
+from .resultentry import InvalidEntryError, CCResultEntry, decode_raw_entry
 
 logger = get_logger_for_name(__name__)
 
+DECODE_RECORDS = str is not bytes
+
 
 class CCResultFileParser(object):
     """
@@ -16,8 +26,35 @@ class CCResultFileParser(object):
 
     # Instantiation
 
-    def __init__(self, file_path):
+    def __init__(
+            self,
+            file_path,
+            use_mmap=ConfigManager.USE_MMAP,
+            block_size=ConfigManager.READ_BLOCK_SIZE,
+            max_record_length=ConfigManager.MAX_RECORD_LENGTH,
+            threaded_decompression=ConfigManager.THREADED_DECOMPRESSION,
+            start_offset=0,
+            checkpoint_callback=None,
+            checkpoint_interval=ConfigManager.CHECKPOINT_INTERVAL,
+            progress_callback=None,
+    ):
         self._file_path = file_path
+        self._start_offset = start_offset
+        self._checkpoint_callback = checkpoint_callback
+        self._checkpoint_interval = checkpoint_interval
+        self._progress_callback = progress_callback
+        self._threaded_decompression = threaded_decompression
+        self._compression = None
+        self._use_mmap = use_mmap
+        self._block_size = block_size
+        self._max_record_length = max_record_length
+        self._bytes_read = 0
+        self._checksum = None
+        self._digest = None
+        self._record_count = 0
+        self._bad_record_count = 0
+        self._invalid_entry_count = 0
+        self._elapsed_seconds = 0.0
 
     # Static Methods
 
@@ -25,6 +62,28 @@ class CCResultFileParser(object):
 
     # Public Methods
 
+    def iter_decoded_entries(self):
+        """
+        Iterate over the decoded contents of the valid entries found within the results file.
+        :return: A generator that can be iterated over to retrieve tuples containing (1) the entry type,
+        (2) the server type, (3) the URL path, and (4) the count for all valid entries found in the results
+        file. See decode_raw_entry for details.
+        """
+        for raw_entry in self.iter_raw_results():
+            try:
+                decoded = decode_raw_entry(raw_entry)
+            except ValueError as e:
+                self._invalid_entry_count += 1
+                logger.error(
+                    "Value error thrown when parsing %s: %s"
+                    % (raw_entry, e)
+                )
+                continue
+            if decoded is None:
+                self._invalid_entry_count += 1
+            else:
+                yield decoded
+
     def iter_entries(self):
         """
         Iterate over the contents of the entries found within the results file.
@@ -35,43 +94,269 @@ class CCResultFileParser(object):
             try:
                 yield CCResultEntry(raw_entry)
             except InvalidEntryError:
-                pass
+                self._invalid_entry_count += 1
             except ValueError as e:
+                self._invalid_entry_count += 1
                 logger.error(
                     "Value error thrown when parsing %s: %s"
-                    % (raw_entry, e.message)
+                    % (raw_entry, e)
                 )
 
     def iter_raw_results(self):
         """
         Iterate over the contents of the results file and return strings containing one result entry
-        each.
+        each. Entries that were wrapped across multiple lines are reassembled, and any entry that is never
+        terminated or that grows beyond self.max_record_length is counted in self.bad_record_count.
+        Compressed results files are decompressed as they are read.
+
+        Reading starts at self.start_offset, which must be a record boundary. For compressed results files
+        the offset refers to the decompressed contents. The contents of local results files before the offset
+        are read (and decompressed) but not parsed, so that self.checksum covers the whole file. If a
+        checkpoint callback was given, it is called with the offset of a record boundary at least every
+        self.checkpoint_interval bytes. When it is called, every record before the offset has been consumed
+        by the caller and no record after it has been yielded. If a progress callback was given, it is called
+        once per block read with the number of bytes of the file (as stored on disk) and the number of records
+        consumed since it was last called.
+
+        Results files whose path is an s3:// URL are streamed from S3-compatible storage (see S3ObjectStore).
         :return: A generator for iterating over the contents of the results file and returning strings containing
         one result entry each
         """
-        with open(self.file_path, "r") as f:
-            current_entry = ""
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                current_entry = current_entry + line
-                try:
-                    int(current_entry[-1])
-                    yield current_entry
-                    current_entry = ""
-                except ValueError:
-                    pass
-                except Exception:
-                    import code
-                    code.interact(local=locals())
+        start_time = time.time()
+        self._checksum = None
+        is_object = is_object_url(self.file_path)
+        if is_object:
+            object_store = get_object_store()
+            f = object_store.open_object(self.file_path)
+            self._compression = detect_compression(self.file_path, leading_bytes=f.peek(4))
+            self._digest = None
+        else:
+            f = open(self.file_path, "rb")
+            self._compression = detect_compression(self.file_path)
+            self._digest = hashlib.sha1()
+        with f:
+            source = None
+            get_disk_position = None
+            if self.compression is not None:
+                get_disk_position = f.tell
+                source = open_decompressed_stream(f, compression=self.compression)
+                if self.threaded_decompression:
+                    source = ThreadedBlockReader(source, block_size=self.block_size)
+                line_blocks = self.__iter_read_line_blocks(source, skip_bytes=self.start_offset)
+            elif self.use_mmap and not is_object and os.fstat(f.fileno()).st_size > self.start_offset:
+                line_blocks = self.__iter_mapped_line_blocks(f)
+            elif is_object:
+                f.seek(self.start_offset)
+                line_blocks = self.__iter_read_line_blocks(f, position=self.start_offset)
+            else:
+                line_blocks = self.__iter_read_line_blocks(f, skip_bytes=self.start_offset)
+            try:
+                for record in self.__iter_records(line_blocks, get_disk_position=get_disk_position):
+                    yield record
+            finally:
+                if source is not None:
+                    source.close()
+        if is_object:
+            self._checksum = object_store.stat(self.file_path)["etag"]
+        else:
+            self._checksum = self._digest.hexdigest()
+        self._elapsed_seconds = time.time() - start_time
+        logger.debug(
+            "Read %.2f MB from %s in %.2f seconds (%.2f MB/s). %s records found, %s bad records."
+            % (
+                self.bytes_read / 1048576.0,
+                self.file_path,
+                self.elapsed_seconds,
+                self.throughput,
+                self.record_count,
+                self.bad_record_count,
+            )
+        )
 
     # Protected Methods
 
     # Private Methods
 
+    def __iter_mapped_line_blocks(self, f):
+        """
+        Iterate over lists of complete lines found in the given file by scanning a read-only memory map of it.
+        Every byte of the file is added to self._digest as it is scanned.
+        :param f: The file object to scan.
+        :return: A generator yielding tuples containing (1) a list of lines (as bytes, without newlines) and
+        (2) the offset in the file immediately after those lines.
+        """
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        digest = self._digest
+        try:
+            size = len(mapped)
+            for offset in range(0, self.start_offset, self.block_size):
+                digest.update(mapped[offset:min(offset + self.block_size, self.start_offset)])
+            position = self.start_offset
+            while position < size:
+                end = position + self.block_size
+                if end < size:
+                    newline = mapped.rfind(b"\n", position, end)
+                    end = newline if newline != -1 else mapped.find(b"\n", end)
+                    if end == -1:
+                        end = size
+                else:
+                    end = size
+                block = mapped[position:end]
+                digest.update(block)
+                if end < size:
+                    digest.update(b"\n")
+                self._bytes_read += min(end + 1, size) - position
+                position = end + 1
+                yield block.split(b"\n"), min(position, size)
+        finally:
+            mapped.close()
+
+    def __iter_read_line_blocks(self, f, position=0, skip_bytes=0):
+        """
+        Iterate over lists of complete lines found in the given file by reading it in large blocks. Every block
+        read is added to self._digest, if there is one.
+        :param f: The file object (or decompressing stream) to read.
+        :param position: The offset in the file that reading starts at.
+        :param skip_bytes: The number of bytes to read and discard before lines are split.
+        :return: A generator yielding tuples containing (1) a list of lines (as bytes, without newlines) and
+        (2) the offset in the file immediately after those lines.
+        """
+        digest = self._digest
+        carry = b""
+        while True:
+            block = f.read(self.block_size)
+            if not block:
+                break
+            if digest is not None:
+                digest.update(block)
+            self._bytes_read += len(block)
+            if skip_bytes:
+                if len(block) <= skip_bytes:
+                    skip_bytes -= len(block)
+                    position += len(block)
+                    continue
+                position += skip_bytes
+                block = block[skip_bytes:]
+                skip_bytes = 0
+            position += len(block)
+            lines = block.split(b"\n")
+            lines[0] = carry + lines[0]
+            carry = lines.pop()
+            yield lines, position - len(carry)
+        if carry:
+            yield [carry], position
+
+    def __iter_records(self, line_blocks, get_disk_position=None):
+        """
+        Reassemble complete records from the lines contained in the given blocks. A record is complete once
+        the stripped content read so far ends in a digit (the record's count).
+        :param line_blocks: An iterable of tuples containing (1) a list of lines (as bytes) and (2) the offset in
+        the file immediately after those lines.
+        :param get_disk_position: A function returning the position reached in the file as stored on disk, or
+        None if the offsets of the given blocks are positions in the file on disk.
+        :return: A generator yielding the contents of every complete record as a native string (decoded from
+        UTF-8 on Python 3, left as bytes on Python 2).
+        """
+        decode_records = DECODE_RECORDS
+        max_record_length = self.max_record_length
+        checkpoint_callback = self._checkpoint_callback
+        next_checkpoint = self.start_offset + self.checkpoint_interval
+        progress_callback = self._progress_callback
+        reported_position = reported_count = 0
+        pending = []
+        pending_length = 0
+        record_count = 0
+        for lines, position in line_blocks:
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                if line[-1:].isdigit():
+                    if pending:
+                        pending.append(line)
+                        line = b"".join(pending)
+                        pending = []
+                        pending_length = 0
+                    record_count += 1
+                    yield line.decode("utf-8", "replace") if decode_records else line
+                else:
+                    pending.append(line)
+                    pending_length += len(line)
+                    if pending_length > max_record_length:
+                        self._bad_record_count += 1
+                        pending = []
+                        pending_length = 0
+            self._record_count = record_count
+            if checkpoint_callback is not None and not pending and position >= next_checkpoint:
+                checkpoint_callback(position)
+                next_checkpoint = position + self.checkpoint_interval
+            if progress_callback is not None:
+                disk_position = position if get_disk_position is None else get_disk_position()
+                progress_callback(disk_position - reported_position, record_count - reported_count)
+                reported_position = disk_position
+                reported_count = record_count
+        if pending:
+            self._bad_record_count += 1
+
     # Properties
 
+    @property
+    def bad_record_count(self):
+        """
+        Get the number of records that could not be reassembled from the results file.
+        :return: the number of records that could not be reassembled from the results file.
+        """
+        return self._bad_record_count
+
+    @property
+    def block_size(self):
+        """
+        Get the number of bytes to read or scan from the results file at once.
+        :return: the number of bytes to read or scan from the results file at once.
+        """
+        return self._block_size
+
+    @property
+    def bytes_read(self):
+        """
+        Get the number of (decompressed) bytes read from the results file so far.
+        :return: the number of (decompressed) bytes read from the results file so far.
+        """
+        return self._bytes_read
+
+    @property
+    def checkpoint_interval(self):
+        """
+        Get the minimum number of bytes read between calls to the checkpoint callback.
+        :return: the minimum number of bytes read between calls to the checkpoint callback.
+        """
+        return self._checkpoint_interval
+
+    @property
+    def checksum(self):
+        """
+        Get the hex SHA-1 digest of the (decompressed) contents of the results file, or the ETag of the object
+        for results files stored in S3. This is only available once the results file has been read in full.
+        :return: the checksum of the results file, or None if it has not been read in full.
+        """
+        return self._checksum
+
+    @property
+    def compression(self):
+        """
+        Get the compression format that the results file was found to use, if any.
+        :return: the compression format that the results file was found to use, if any.
+        """
+        return self._compression
+
+    @property
+    def elapsed_seconds(self):
+        """
+        Get the number of seconds that it took to read the results file.
+        :return: the number of seconds that it took to read the results file.
+        """
+        return self._elapsed_seconds
+
     @property
     def file_path(self):
         """
@@ -80,8 +365,66 @@ class CCResultFileParser(object):
         """
         return self._file_path
 
+    @property
+    def invalid_entry_count(self):
+        """
+        Get the number of records found in the results file that were not valid entries.
+        :return: the number of records found in the results file that were not valid entries.
+        """
+        return self._invalid_entry_count
+
+    @property
+    def max_record_length(self):
+        """
+        Get the maximum length of a record before it is discarded as bad.
+        :return: the maximum length of a record before it is discarded as bad.
+        """
+        return self._max_record_length
+
+    @property
+    def record_count(self):
+        """
+        Get the number of records found in the results file so far.
+        :return: the number of records found in the results file so far.
+        """
+        return self._record_count
+
+    @property
+    def throughput(self):
+        """
+        Get the rate at which the results file was read in megabytes per second.
+        :return: the rate at which the results file was read in megabytes per second.
+        """
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.bytes_read / 1048576.0 / self.elapsed_seconds
+
+    @property
+    def start_offset(self):
+        """
+        Get the offset in the (decompressed) results file that reading starts at.
+        :return: the offset in the (decompressed) results file that reading starts at.
+        """
+        return self._start_offset
+
+    @property
+    def threaded_decompression(self):
+        """
+        Get whether or not compressed results files are decompressed on a background thread.
+        :return: whether or not compressed results files are decompressed on a background thread.
+        """
+        return self._threaded_decompression
+
+    @property
+    def use_mmap(self):
+        """
+        Get whether or not the results file is scanned through a memory map instead of read in blocks. Memory
+        mapping is not used for compressed results files or for results files stored in S3.
+        :return: whether or not the results file is scanned through a memory map instead of read in blocks.
+        """
+        return self._use_mmap
+
     # Representation and Comparison
 
     def __repr__(self):
         return "<%s - %s>" % (self.__class__.__name__, self.file_path)
-
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import re
+
+from ..config import ConfigManager
+
+COERCED_REGEX = re.compile("\[\[.*?\]\]")
+
+
+def format_segments_header(segment_count=None, total_count=None, is_sorted=False, excludes_coerced=False):
+    """
+    Create the header line written at the top of a url_segments file.
+    :param segment_count: The number of URL segments in the file.
+    :param total_count: The sum of the counts of all URL segments in the file.
+    :param is_sorted: Whether or not the URL segments in the file are sorted by descending count.
+    :param excludes_coerced: Whether or not URL segments that contain coerced values were split out of the
+    file (see split_coerced_segments).
+    :return: The header line (without a trailing newline).
+    """
+    return "%s\tsorted=%s\tsegment_count=%s\ttotal_count=%s\texcludes_coerced=%s" % (
+        ConfigManager.URL_SEGMENTS_HEADER_PREAMBLE,
+        int(bool(is_sorted)),
+        segment_count,
+        total_count,
+        int(bool(excludes_coerced)),
+    )
+
+
+def is_coerced_segment(url_segment):
+    """
+    Check whether or not the given URL segment contains coerced values (ex: [[INTEGER]]).
+    :param url_segment: The URL segment to check.
+    :return: Whether or not the given URL segment contains coerced values.
+    """
+    return "[[" in url_segment and COERCED_REGEX.search(url_segment) is not None
+
+
+def parse_segments_header(line):
+    """
+    Parse the given line as the header of a url_segments file.
+    :param line: The first line of a url_segments file.
+    :return: A dictionary containing the sorted and excludes_coerced flags (as bools) and the segment_count
+    and total_count values (as integers), or None if the line is not a header.
+    """
+    if not line.startswith(ConfigManager.URL_SEGMENTS_HEADER_PREAMBLE + "\t"):
+        return None
+    to_return = {}
+    for field in line.strip().split("\t")[1:]:
+        key, _, value = field.partition("=")
+        to_return[key] = int(value)
+    to_return["sorted"] = bool(to_return.get("sorted"))
+    to_return["excludes_coerced"] = bool(to_return.get("excludes_coerced"))
+    return to_return
+
+
+def split_coerced_segments(url_segments=None):
+    """
+    Split the given URL segments into those that contain coerced values and those that do not. This is done
+    once when processed results are written so that hit list generation never has to check URL segments for
+    coerced values itself.
+    :param url_segments: A list of (URL segment, count) tuples.
+    :return: A tuple containing (1) a list of the (URL segment, count) tuples that do not contain coerced
+    values and (2) a list of those that do, both in the given order.
+    """
+    plain_segments = []
+    coerced_segments = []
+    for url_segment in url_segments:
+        if is_coerced_segment(url_segment[0]):
+            coerced_segments.append(url_segment)
+        else:
+            plain_segments.append(url_segment)
+    return plain_segments, coerced_segments
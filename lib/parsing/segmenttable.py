@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from array import array
+
+from ..cclogging import get_logger_for_name
+
+logger = get_logger_for_name(__name__)
+
+SEGMENT_ID_TYPECODE = "i"
+
+
+class SegmentTable(object):
+    """
+    This class maps every distinct URL segment to an integer ID once, so that structures holding the URL
+    segments of many server types can store arrays of IDs instead of a separate copy of every string for every
+    server type. Strings are only looked up again when they are needed (ex: when a hit list is rendered).
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self):
+        self._ids = {}
+        self._segments = []
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def add_segments(self, url_segments=None):
+        """
+        Add every one of the given URL segments to this table if they are not already held.
+        :param url_segments: An iterable of URL segments to add.
+        :return: An array containing the ID of every URL segment, in the given order.
+        """
+        ids = self._ids
+        segments = self._segments
+        to_return = array(SEGMENT_ID_TYPECODE)
+        for url_segment in url_segments:
+            segment_id = ids.get(url_segment)
+            if segment_id is None:
+                segment_id = ids[url_segment] = len(segments)
+                segments.append(url_segment)
+            to_return.append(segment_id)
+        return to_return
+
+    def get_segments(self, segment_ids=None):
+        """
+        Get the URL segments with the given IDs.
+        :param segment_ids: An iterable of URL segment IDs.
+        :return: A list containing the URL segment for every ID, in the given order.
+        """
+        segments = self._segments
+        return [segments[x] for x in segment_ids]
+
+    # Protected Methods
+
+    # Private Methods
+
+    # Properties
+
+    @property
+    def segment_count(self):
+        """
+        Get the number of distinct URL segments held by this table.
+        :return: the number of distinct URL segments held by this table.
+        """
+        return len(self._segments)
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s segments>" % (self.__class__.__name__, self.segment_count)
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import re
+
+from ..config import ConfigManager
+
+EXACT_GRANULARITY = "exact"
+VERSION_GRANULARITY = "version"
+FAMILY_GRANULARITY = "family"
+GRANULARITIES = [EXACT_GRANULARITY, VERSION_GRANULARITY, FAMILY_GRANULARITY]
+
+BANNER_REGEX = re.compile("^([^/\s(;,]+)(?:/([^/\s(;,]+))?")
+
+
+class _MemoizedLookup(dict):
+    """
+    This is a dictionary that computes and stores the value for a missing key the first time that the key
+    is looked up.
+    """
+
+    def __init__(self, function):
+        super(_MemoizedLookup, self).__init__()
+        self._function = function
+
+    def __missing__(self, key):
+        value = self[key] = self._function(key)
+        return value
+
+
+class ServerTypeCanonicalizer(object):
+    """
+    This class maps raw server banners (ex: Apache/2.4.7 (Ubuntu)) to a server family (ex: Apache) and a
+    version (ex: 2.4.7) using a list of configurable rules, and canonicalizes them to the chosen granularity.
+    Every banner is only parsed the first time that it is looked up.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            granularity=ConfigManager.SERVER_TYPE_GRANULARITY,
+            rules=ConfigManager.SERVER_FAMILY_RULES,
+    ):
+        if granularity not in GRANULARITIES:
+            raise ValueError("%s is not a valid server type granularity." % (granularity,))
+        self._granularity = granularity
+        self._rules = [(re.compile(pattern, re.IGNORECASE), family) for pattern, family in rules]
+        self._parsed = _MemoizedLookup(self.__parse_server_type)
+        if granularity == FAMILY_GRANULARITY:
+            self._lookup = _MemoizedLookup(self.get_family)
+        elif granularity == VERSION_GRANULARITY:
+            self._lookup = _MemoizedLookup(self.__get_family_and_version)
+        else:
+            self._lookup = _MemoizedLookup(lambda x: x)
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def canonicalize(self, server_type):
+        """
+        Get the canonical form of the given server type at the granularity of this canonicalizer.
+        :param server_type: The raw server type.
+        :return: The raw server type at the exact granularity, the server family and version separated by a
+        slash (or the server family alone if no version is found) at the version granularity, and the server
+        family at the family granularity.
+        """
+        return self._lookup[server_type]
+
+    def get_family(self, server_type):
+        """
+        Get the server family of the given server type. The family is given by the first of the configured
+        rules whose pattern matches the server type, or by the product name at the start of the server type
+        if none of them do.
+        :param server_type: The raw server type.
+        :return: The server family of the given server type.
+        """
+        return self._parsed[server_type][0]
+
+    def get_version(self, server_type):
+        """
+        Get the version of the given server type.
+        :param server_type: The raw server type.
+        :return: The version found after the product name of the given server type, or None if there is not
+        one.
+        """
+        return self._parsed[server_type][1]
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __get_family_and_version(self, server_type):
+        """
+        Get the server family and version of the given server type separated by a slash.
+        :param server_type: The raw server type.
+        :return: The server family and version separated by a slash, or the server family alone if the
+        server type does not have a version.
+        """
+        family, version = self._parsed[server_type]
+        if version is None:
+            return family
+        return "%s/%s" % (family, version)
+
+    def __parse_server_type(self, server_type):
+        """
+        Parse the given server type into its server family and version.
+        :param server_type: The raw server type.
+        :return: A tuple containing (1) the server family and (2) the version, or None if the server type does
+        not have a version.
+        """
+        server_type = server_type.strip()
+        match = BANNER_REGEX.match(server_type)
+        if match is not None:
+            family, version = match.groups()
+        else:
+            family, version = None, None
+        for regex, rule_family in self._rules:
+            if regex.search(server_type):
+                family = rule_family
+                break
+        if family in [None, ".", ".."]:
+            family = ConfigManager.UNKNOWN_SERVER_FAMILY
+        if version in [".", ".."]:
+            version = None
+        return family, version
+
+    # Properties
+
+    @property
+    def granularity(self):
+        """
+        Get the granularity that this canonicalizer canonicalizes server types to.
+        :return: the granularity that this canonicalizer canonicalizes server types to.
+        """
+        return self._granularity
+
+    @property
+    def lookup(self):
+        """
+        Get the memoized mapping of raw server types to their canonical forms. Looking a server type up in
+        this mapping directly is the fastest way to canonicalize it.
+        :return: the memoized mapping of raw server types to their canonical forms.
+        """
+        return self._lookup
+
+    # Representation and Comparison
+
+    def __repr__(self):
+        return "<%s - %s (%s server types seen)>" % (self.__class__.__name__, self.granularity, len(self._lookup))
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import sqlite3
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+from ..metrics import get_run_metrics
+from .segmentfile import is_coerced_segment
+
+logger = get_logger_for_name(__name__)
+
+FILES_STORE = "files"
+SQLITE_STORE = "sqlite"
+STORES = [FILES_STORE, SQLITE_STORE]
+
+SEGMENTS_INDEX_NAME = "segments_by_server_count"
+
+SCHEMA_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS servers ("
+    "server_id INTEGER PRIMARY KEY, "
+    "server_type TEXT NOT NULL UNIQUE, "
+    "total_count INTEGER, "
+    "segment_count INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS segments ("
+    "server_id INTEGER NOT NULL, "
+    "url_segment TEXT NOT NULL, "
+    "count INTEGER NOT NULL, "
+    "coerced INTEGER NOT NULL)",
+]
+CREATE_INDEX_STATEMENT = "CREATE INDEX IF NOT EXISTS %s ON segments (server_id, count DESC)" % (SEGMENTS_INDEX_NAME,)
+
+
+class SQLiteResultStore(object):
+    """
+    This class stores the aggregated results of a lavalamp Common Crawl analysis in a SQLite database. Every
+    URL segment is stored as a (server, URL segment, count, coerced) row, and rows are indexed by server and
+    descending count so that the URL segments of a server can be read in ranked order without sorting them.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(self, database_path, batch_size=ConfigManager.SQLITE_BATCH_SIZE):
+        self._database_path = database_path
+        self._batch_size = batch_size
+        self._connection = sqlite3.connect(database_path, isolation_level=None)
+        self._connection.text_factory = str
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA_STATEMENTS:
+            self._connection.execute(statement)
+        self._connection.execute(CREATE_INDEX_STATEMENT)
+
+    # Static Methods
+
+    # Class Methods
+
+    # Public Methods
+
+    def close(self):
+        """
+        Close the connection to the database.
+        :return: None
+        """
+        if self._connection is None:
+            return
+        self._connection.close()
+        self._connection = None
+
+    def get_segment_total(self, server_type=None, coerced=None):
+        """
+        Get the sum of the counts of the URL segments stored for the given server type.
+        :param server_type: The server type to get the sum for.
+        :param coerced: True to only sum URL segments that contain coerced values, False to only sum those
+        that do not, or None to sum all of them.
+        :return: The sum of the counts of the matching URL segments.
+        """
+        query = "SELECT SUM(count) FROM segments WHERE server_id = ?"
+        parameters = [self.__get_server_id(server_type)]
+        if coerced is not None:
+            query += " AND coerced = ?"
+            parameters.append(int(coerced))
+        return self._connection.execute(query, parameters).fetchone()[0] or 0
+
+    def get_server_types(self):
+        """
+        Get all of the server types that have a stored total count.
+        :return: A list of server types, ordered by their number of stored URL segments from most to fewest.
+        """
+        rows = self._connection.execute(
+            "SELECT server_type FROM servers WHERE total_count IS NOT NULL ORDER BY segment_count DESC"
+        )
+        return [x[0] for x in rows]
+
+    def get_total_count(self, server_type=None):
+        """
+        Get the total count stored for the given server type.
+        :param server_type: The server type to get the total count for.
+        :return: The total count of the server type, or None if it does not have one.
+        """
+        row = self._connection.execute(
+            "SELECT total_count FROM servers WHERE server_type = ?",
+            (server_type,),
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def iter_ranked_segments(self, server_type=None, coerced=None):
+        """
+        Iterate over the URL segments stored for the given server type in ranked order using a single ordered
+        query over the server and count index. Rows are only read from the database as they are consumed, so
+        iteration can stop early without reading every URL segment.
+        :param server_type: The server type to iterate over the URL segments of.
+        :param coerced: True to only include URL segments that contain coerced values, False to only include
+        those that do not, or None to include all of them.
+        :return: A generator yielding (URL segment, count) tuples by descending count. Ties are yielded in
+        the order that the URL segments were stored in.
+        """
+        query = "SELECT url_segment, count FROM segments WHERE server_id = ?"
+        parameters = [self.__get_server_id(server_type)]
+        if coerced is not None:
+            query += " AND coerced = ?"
+            parameters.append(int(coerced))
+        cursor = self._connection.execute(query + " ORDER BY count DESC, rowid", parameters)
+        try:
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+    def write_aggregator(self, aggregator=None, ignore_threshold=0, server_types=None):
+        """
+        Replace the stored results of the given server types with the merged contents of the given
+        aggregator. Rows are inserted in batched transactions. When every server type is replaced, the server
+        and count index is dropped while rows are inserted and built once they all are.
+        :param aggregator: The SegmentAggregator to store the contents of.
+        :param ignore_threshold: The minimum merged count that a server type or URL segment must have to be
+        stored.
+        :param server_types: The server types to replace the results of, or None to replace all stored
+        results.
+        :return: The set of server types that results were stored for.
+        """
+        connection = self._connection
+        connection.execute("BEGIN")
+        if server_types is None:
+            connection.execute("DROP INDEX IF EXISTS %s" % (SEGMENTS_INDEX_NAME,))
+            connection.execute("DELETE FROM segments")
+            connection.execute("DELETE FROM servers")
+        else:
+            for server_type in server_types:
+                connection.execute(
+                    "DELETE FROM segments WHERE server_id IN (SELECT server_id FROM servers WHERE server_type = ?)",
+                    (server_type,),
+                )
+                connection.execute("DELETE FROM servers WHERE server_type = ?", (server_type,))
+        pending_rows = []
+        row_count = 0
+        stored_server_types = set()
+        record_segments_written = get_run_metrics().record_segments_written
+        for server_type, total_count, url_segments in aggregator.iter_servers(ignore_threshold=ignore_threshold):
+            if server_types is not None and server_type not in server_types:
+                continue
+            stored_server_types.add(server_type)
+            cursor = connection.execute(
+                "INSERT INTO servers (server_type, total_count, segment_count) VALUES (?, ?, ?)",
+                (server_type, total_count, len(url_segments)),
+            )
+            server_id = cursor.lastrowid
+            record_segments_written(server_type, len(url_segments))
+            pending_rows.extend([(server_id, x, y, int(is_coerced_segment(x))) for x, y in url_segments])
+            if len(pending_rows) >= self.batch_size:
+                row_count += self.__insert_segment_rows(pending_rows)
+                pending_rows = []
+        row_count += self.__insert_segment_rows(pending_rows)
+        connection.execute("COMMIT")
+        if server_types is None:
+            connection.execute(CREATE_INDEX_STATEMENT)
+        logger.debug(
+            "Stored %s URL segments for %s server types in %s."
+            % (row_count, "all" if server_types is None else len(server_types), self.database_path)
+        )
+        return stored_server_types
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __get_server_id(self, server_type):
+        """
+        Get the ID of the given server type.
+        :param server_type: The server type to get the ID of.
+        :return: The ID of the server type, or None if it is not stored.
+        """
+        row = self._connection.execute(
+            "SELECT server_id FROM servers WHERE server_type = ?",
+            (server_type,),
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def __insert_segment_rows(self, rows):
+        """
+        Insert the given URL segment rows and commit the current transaction, starting a new one.
+        :param rows: A list of (server ID, URL segment, count, coerced) tuples.
+        :return: The number of rows inserted.
+        """
+        if not rows:
+            return 0
+        self._connection.executemany(
+            "INSERT INTO segments (server_id, url_segment, count, coerced) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+        self._connection.execute("COMMIT")
+        self._connection.execute("BEGIN")
+        return len(rows)
+
+    # Properties
+
+    @property
+    def batch_size(self):
+        """
+        Get the number of URL segment rows to insert per transaction.
+        :return: the number of URL segment rows to insert per transaction.
+        """
+        return self._batch_size
+
+    @property
+    def database_path(self):
+        """
+        Get the path to the SQLite database.
+        :return: the path to the SQLite database.
+        """
+        return self._database_path
+
+    # Representation and Comparison
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<%s - %s>" % (self.__class__.__name__, self.database_path)
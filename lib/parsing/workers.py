@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import signal
+
+from ..cclogging import get_logger_for_name, configure_worker_logging
+from ..config import ConfigManager
+
+logger = get_logger_for_name(__name__)
+
+_worker_progress_counter = None
+
+
+def get_worker_progress_counter():
+    """
+    Get the ProgressCounter that the current worker process was initialized with.
+    :return: The ProgressCounter that the current worker process should add its progress to, or None.
+    """
+    return _worker_progress_counter
+
+
+def initialize_worker(log_queue, log_level, progress_counter=None, s3_endpoint_url=None):
+    """
+    Prepare a process pool worker for processing results files or generating hit lists. The worker ignores
+    interrupts (the parent process handles them), sends its log records to the parent process, and takes on
+    the parent process's configuration.
+    :param log_queue: The queue to send the worker's log records through.
+    :param log_level: The logging level to apply to the worker's loggers.
+    :param progress_counter: The ProgressCounter that the worker should add its progress to, or None.
+    :param s3_endpoint_url: The S3-compatible endpoint that results objects are read from, or None for AWS.
+    :return: None
+    """
+    global _worker_progress_counter
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_worker_logging(log_queue, log_level=log_level)
+    _worker_progress_counter = progress_counter
+    ConfigManager.S3_ENDPOINT_URL = s3_endpoint_url
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import os
+
+from ..cclogging import get_logger_for_name
+from ..config import ConfigManager
+from ..metrics import get_run_metrics
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = get_logger_for_name(__name__)
+
+
+class ServerFileWriterPool(object):
+    """
+    This class manages writing the per-server-type result files generated while processing lavalamp
+    Common Crawl results. Lines are buffered in memory and flushed in bulk through an LRU-bounded pool
+    of open file handles so that processing does not pay for an open and a close per entry.
+    """
+
+    # Class Members
+
+    # Instantiation
+
+    def __init__(
+            self,
+            output_directory=ConfigManager.OUTPUT_DIRECTORY,
+            max_open_files=ConfigManager.MAX_OPEN_FILES,
+            flush_size=ConfigManager.WRITE_FLUSH_SIZE,
+    ):
+        self._output_directory = output_directory
+        self._max_open_files = self.get_open_file_limit(max_open_files)
+        self._flush_size = flush_size
+        self._handles = OrderedDict()
+        self._pending_lines = {}
+        self._pending_contents = {}
+        self._pending_size = 0
+        self._known_directories = set()
+        self._files_opened = 0
+        self._closed = False
+
+    # Static Methods
+
+    @staticmethod
+    def get_open_file_limit(max_open_files=ConfigManager.MAX_OPEN_FILES):
+        """
+        Get the number of file handles that a pool may keep open at once, taking the process's
+        soft limit on open files into account.
+        :param max_open_files: The requested maximum number of open files.
+        :return: The number of file handles that may be kept open at once.
+        """
+        limit = max(max_open_files, 1)
+        if resource is not None:
+            soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft_limit != resource.RLIM_INFINITY:
+                limit = min(limit, soft_limit - ConfigManager.RESERVED_FILE_HANDLES)
+        return max(limit, 1)
+
+    # Class Methods
+
+    # Public Methods
+
+    def append_line(self, server_type=None, file_name=None, line=None):
+        """
+        Queue the given line to be appended to the given file for the given server type.
+        :param server_type: The server type whose directory the file resides in.
+        :param file_name: The name of the file to append to.
+        :param line: The line to append (without a trailing newline).
+        :return: None
+        """
+        key = (server_type, file_name)
+        pending = self._pending_lines.get(key)
+        if pending is None:
+            pending = self._pending_lines[key] = []
+        pending.append(line)
+        self._pending_size += len(line) + 1
+        if self._pending_size >= self._flush_size:
+            self.flush()
+
+    def close(self):
+        """
+        Flush all pending writes and close all file handles held by this pool.
+        :return: None
+        """
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            while self._handles:
+                _, handle = self._handles.popitem(last=False)
+                handle.close()
+            self._closed = True
+            get_run_metrics().increment("files_opened", self.files_opened)
+            logger.debug(
+                "Writer pool for %s closed. %s files were opened in total."
+                % (self.output_directory, self.files_opened)
+            )
+
+    def flush(self):
+        """
+        Write all pending lines and file contents to disk. Appended URL segments are recorded to the
+        RunMetrics of the current process as they are written.
+        :return: None
+        """
+        record_segments_written = get_run_metrics().record_segments_written
+        for key in sorted(self._pending_lines.keys()):
+            handle = self.__get_handle(key)
+            lines = self._pending_lines[key]
+            handle.write("\n".join(lines))
+            handle.write("\n")
+            if key[1] == ConfigManager.URL_PATH_FILE_NAME:
+                record_segments_written(key[0], len(lines))
+        for (server_type, file_name), (contents, mode) in self._pending_contents.items():
+            key = (server_type, file_name)
+            handle = self._handles.pop(key, None)
+            if handle is not None:
+                handle.close()
+            file_path = os.path.join(self.__get_directory(server_type), file_name)
+            with open(file_path, mode) as f:
+                f.write(contents)
+            self._files_opened += 1
+        for handle in self._handles.values():
+            handle.flush()
+        self._pending_lines = {}
+        self._pending_contents = {}
+        self._pending_size = 0
+
+    def set_contents(self, server_type=None, file_name=None, contents=None):
+        """
+        Set the full contents of the given file for the given server type. Contents are written the
+        next time this pool is flushed, and only the most recently set contents are written.
+        :param server_type: The server type whose directory the file resides in.
+        :param file_name: The name of the file to write.
+        :param contents: The contents to write to the file.
+        :return: None
+        """
+        self.__set_pending_contents(key=(server_type, file_name), contents=contents, mode="w+")
+
+    def set_binary_contents(self, server_type=None, file_name=None, contents=None):
+        """
+        Set the full binary contents of the given file for the given server type. Contents are written
+        the next time this pool is flushed, and only the most recently set contents are written.
+        :param server_type: The server type whose directory the file resides in.
+        :param file_name: The name of the file to write.
+        :param contents: The bytes to write to the file.
+        :return: None
+        """
+        self.__set_pending_contents(key=(server_type, file_name), contents=contents, mode="wb+")
+
+    # Protected Methods
+
+    # Private Methods
+
+    def __get_directory(self, server_type):
+        """
+        Get the directory where files for the given server type reside, creating it if it does not
+        already exist.
+        :param server_type: The server type to get the directory for.
+        :return: The path to the directory for the given server type.
+        """
+        directory = os.path.join(self.output_directory, server_type)
+        if directory not in self._known_directories:
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    if not os.path.isdir(directory):
+                        raise
+            self._known_directories.add(directory)
+        return directory
+
+    def __get_handle(self, key):
+        """
+        Get an open append-mode file handle for the given (server type, file name) key, evicting the
+        least recently used handle if the pool is full.
+        :param key: A tuple containing (1) the server type and (2) the file name.
+        :return: An open file handle.
+        """
+        handle = self._handles.pop(key, None)
+        if handle is None:
+            server_type, file_name = key
+            file_path = os.path.join(self.__get_directory(server_type), file_name)
+            handle = open(file_path, "a+")
+            self._files_opened += 1
+            while len(self._handles) >= self._max_open_files:
+                _, evicted = self._handles.popitem(last=False)
+                evicted.close()
+        self._handles[key] = handle
+        return handle
+
+    def __set_pending_contents(self, key=None, contents=None, mode=None):
+        """
+        Queue the given contents to replace the contents of the file referenced by the given key.
+        :param key: A tuple containing (1) the server type and (2) the file name.
+        :param contents: The contents to write to the file.
+        :param mode: The mode to open the file in when writing the contents.
+        :return: None
+        """
+        previous = self._pending_contents.get(key)
+        if previous is not None:
+            self._pending_size -= len(previous[0])
+        self._pending_contents[key] = (contents, mode)
+        self._pending_size += len(contents)
+        if self._pending_size >= self._flush_size:
+            self.flush()
+
+    # Properties
+
+    @property
+    def files_opened(self):
+        """
+        Get the number of times that this pool has opened a file.
+        :return: the number of times that this pool has opened a file.
+        """
+        return self._files_opened
+
+    @property
+    def max_open_files(self):
+        """
+        Get the maximum number of file handles that this pool will keep open at once.
+        :return: the maximum number of file handles that this pool will keep open at once.
+        """
+        return self._max_open_files
+
+    @property
+    def output_directory(self):
+        """
+        Get the root directory that this pool writes server type directories to.
+        :return: the root directory that this pool writes server type directories to.
+        """
+        return self._output_directory
+
+    # Representation and Comparison
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return "<%s - %s (%s open)>" % (self.__class__.__name__, self.output_directory, len(self._handles))
@@ -6,11 +6,68 @@ import logging
 from datetime import datetime
 import os
 import shutil
+import sys
 
-from lib import CCResultParser, LavaUIFactory, ConfigManager, LavaLogFormatter, HitListParser
+from lib import CCResultParser, LavaUIFactory, ConfigManager, LavaLogFormatter, HitListParser, HitListService
+from lib import CoverageIndex
+from lib import convert_segments_in_directory, GRANULARITIES, OUTPUT_FORMATS, ProcessingManifest, STORES
+from lib import EXACT_GRANULARITY, FILES_STORE, TEXT_FORMAT
+from lib import get_run_metrics, PROFILERS, RunProfiler
+
+try:
+    input = raw_input
+except NameError:
+    pass
 
 logger = logging.getLogger(__name__)
 
+# The options that only apply when aggregating results, as tuples containing (1) the destination of the option,
+# (2) its value when it is not used, and (3) the warning to log when it is used without aggregating results.
+AGGREGATE_ONLY_OPTIONS = [
+    (
+        "workers",
+        1,
+        "Multiple workers are only supported when aggregating results. Processing files serially.",
+    ),
+    (
+        "ranked_output",
+        False,
+        "Ranked output is only supported when aggregating results. URL segments will be written unranked.",
+    ),
+    (
+        "output_format",
+        TEXT_FORMAT,
+        "Binary output is only supported when aggregating results. URL segments will be written as text.",
+    ),
+    (
+        "resume",
+        False,
+        "Resuming is only supported when aggregating results. All result files will be processed.",
+    ),
+    (
+        "granularity",
+        EXACT_GRANULARITY,
+        "Server type canonicalization is only supported when aggregating results. Results will be written "
+        "for every exact server type.",
+    ),
+    (
+        "family_rollup",
+        False,
+        "Server family rollup is only supported when aggregating results. Results will not be rolled up by "
+        "server family.",
+    ),
+    (
+        "store",
+        FILES_STORE,
+        "The sqlite store is only supported when aggregating results. Results will be written to files.",
+    ),
+    (
+        "memory_limit",
+        0,
+        "A memory limit is only supported when aggregating results. Results are written as they are read.",
+    ),
+]
+
 
 def configure_logging(log_level):
     """
@@ -46,13 +103,71 @@ def do_all(input_args):
     :param input_args: Arguments retrieved through parsing command line input.
     :return: None
     """
-    logger.info("Now processing Hadoop data and then generating hit lists.")
     input_args.processed_directory = input_args.output_directory
+    if input_args.fused and not input_args.aggregate:
+        logger.warning("A fused pipeline is only supported when aggregating results. Running steps in succession.")
+    elif not input_args.persist_results and not input_args.fused:
+        logger.warning("Processed results are always written when not fused. Running steps in succession.")
+    if input_args.fused and input_args.aggregate:
+        do_fused_all(input_args)
+        return
+    logger.info("Now processing Hadoop data and then generating hit lists.")
     do_process_hadoop_results(input_args)
     do_generate_hit_lists(input_args)
     logger.info("Hadoop data processed and hit lists generated!")
 
 
+def do_convert_segments(input_args):
+    """
+    Convert the URL segments files processed from Hadoop results to the referenced format.
+    :param input_args: Arguments retrieved through parsing command line input.
+    :return: None
+    """
+    logger.info(
+        "Now converting URL segments files for all server types found in directory %s to %s."
+        % (input_args.processed_directory, input_args.output_format)
+    )
+    converted_count = convert_segments_in_directory(
+        results_directory=input_args.processed_directory,
+        to_format=input_args.output_format,
+    )
+    logger.info(
+        "%s URL segments files in directory %s were converted to %s."
+        % (converted_count, input_args.processed_directory, input_args.output_format)
+    )
+
+
+def do_fused_all(input_args):
+    """
+    Process the contents of the referenced Hadoop results and generate hit lists straight from the aggregated
+    counts of every server type, writing processed results in the background.
+    :param input_args: Arguments retrieved through parsing command line input.
+    :return: None
+    """
+    logger.info(
+        "Now processing Hadoop data and generating hit lists from the aggregated results. Thresholds will be "
+        "%s. Processed results will %sbe written."
+        % (", ".join([str(x) for x in input_args.thresholds]), "" if input_args.persist_results else "not ")
+    )
+    hit_list_parser = HitListParser(
+        results_directory=input_args.output_directory,
+        engine=input_args.engine,
+        include_coerced=input_args.include_coerced,
+        coerced_hit_lists=input_args.coerced_hit_lists,
+        store=input_args.store,
+    )
+
+    def generate_hit_lists(aggregated_servers):
+        hit_list_parser.generate_hit_lists_from_aggregated_servers(
+            aggregated_servers=aggregated_servers,
+            thresholds=input_args.thresholds,
+            hit_list_preamble=input_args.hit_list_preamble,
+        )
+
+    if do_process_hadoop_results(input_args, server_consumer=generate_hit_lists):
+        logger.info("Hadoop data processed and hit lists generated!")
+
+
 def do_generate_hit_lists(input_args):
     """
     Process the contents of the cleaned URL segments and counts processed from Hadoop results into hit lists
@@ -69,11 +184,18 @@ def do_generate_hit_lists(input_args):
             input_args.hit_list_preamble,
         )
     )
-    hit_list_parser = HitListParser(results_directory=input_args.processed_directory)
+    hit_list_parser = HitListParser(
+        results_directory=input_args.processed_directory,
+        engine=input_args.engine,
+        include_coerced=input_args.include_coerced,
+        coerced_hit_lists=input_args.coerced_hit_lists,
+        store=input_args.store,
+    )
     logger.info("Now starting hit list generation.")
     hit_list_parser.generate_hit_lists_for_all_servers(
         thresholds=input_args.thresholds,
         hit_list_preamble=input_args.hit_list_preamble,
+        workers=input_args.workers,
     )
     logger.info(
         "Hit lists generated for all server types found in directory %s."
@@ -81,25 +203,41 @@ def do_generate_hit_lists(input_args):
     )
 
 
-def do_process_hadoop_results(input_args):
+def do_process_hadoop_results(input_args, server_consumer=None):
     """
     Process the contents of the referenced Hadoop results.
     :param input_args: Arguments retrieved through parsing command line input.
-    :return: None
+    :param server_consumer: A function to hand the aggregated results of every server type to (see
+    CCResultParser.aggregate_files_in_directory), or None.
+    :return: Whether or not the Hadoop results were processed.
     """
     logger.info(
-        "Now processing Hadoop results stored in directory %s. Ignore threshold is %s, and report interval is %s. "
-        "Parsed results will be stored at %s."
+        "Now processing Hadoop results stored in directory %s. Ignore threshold is %s, progress is reported every "
+        "%s seconds, and %s worker processes will be used. Parsed results will be stored at %s."
         % (
             input_args.results_directory,
             input_args.ignore_threshold,
             input_args.report_interval,
+            input_args.workers,
             input_args.output_directory,
         )
     )
-    if os.path.isdir(input_args.output_directory):
-        logger.info("Output directory at %s already exists. Delete it?\n")
-        response = raw_input("Delete directory %s? [Y/n]: " % input_args.output_directory)
+    warn_about_aggregate_only_options(input_args)
+    manifest = ProcessingManifest(output_directory=input_args.output_directory)
+    incremental = input_args.aggregate and not input_args.memory_limit
+    if incremental and not input_args.rebuild and manifest.exists:
+        logger.info(
+            "Found a processing manifest at %s. Only new or changed Hadoop results files will be processed."
+            % (manifest.manifest_path,)
+        )
+    elif incremental and input_args.resume and os.path.isdir(manifest.state_directory):
+        logger.info(
+            "Resuming processing from the checkpoints stored in %s."
+            % (manifest.state_directory,)
+        )
+    elif os.path.isdir(input_args.output_directory):
+        logger.info("Output directory at %s already exists. Delete it?\n" % (input_args.output_directory,))
+        response = input("Delete directory %s? [Y/n]: " % input_args.output_directory)
         if response in ["", "y", "Y"]:
             shutil.rmtree(input_args.output_directory)
             print("")
@@ -113,21 +251,69 @@ def do_process_hadoop_results(input_args):
                 "Not deleting results directory at %s. Please choose a different output directory and try again."
                 % (input_args.output_directory,)
             )
-            return
+            return False
     results_parser = CCResultParser(input_args.results_directory)
     logger.info(
         "Now processing the contents of Hadoop results stored in %s. This will take a while."
         % (input_args.results_directory,)
     )
-    results_parser.process_files_in_directory(
-        ignore_threshold=input_args.ignore_threshold,
-        report_interval=input_args.report_interval,
-        output_directory=input_args.output_directory,
-    )
+    if input_args.aggregate:
+        results_parser.aggregate_files_in_directory(
+            ignore_threshold=input_args.ignore_threshold,
+            report_interval=input_args.report_interval,
+            output_directory=input_args.output_directory,
+            max_open_files=input_args.max_open_files,
+            workers=input_args.workers,
+            use_mmap=input_args.use_mmap,
+            ranked_output=input_args.ranked_output,
+            output_format=input_args.output_format,
+            resume=input_args.resume,
+            checkpoint_interval=input_args.checkpoint_interval,
+            granularity=input_args.granularity,
+            family_rollup=input_args.family_rollup,
+            store=input_args.store,
+            server_consumer=server_consumer,
+            persist_results=getattr(input_args, "persist_results", True),
+            memory_limit=input_args.memory_limit,
+        )
+    else:
+        results_parser.process_files_in_directory(
+            ignore_threshold=input_args.ignore_threshold,
+            report_interval=input_args.report_interval,
+            output_directory=input_args.output_directory,
+            max_open_files=input_args.max_open_files,
+            use_mmap=input_args.use_mmap,
+        )
     logger.info(
         "All Hadoop results stored in %s were successfully processed!"
         % (input_args.results_directory,)
     )
+    return True
+
+
+def do_serve(input_args):
+    """
+    Load the ranked URL segments of all server types found in the processed results directory into a
+    coverage index, and answer hit list requests from it over HTTP or standard input and output.
+    :param input_args: Arguments retrieved through parsing command line input.
+    :return: None
+    """
+    logger.info(
+        "Now loading ranked URL segments for all server types found in directory %s."
+        % (input_args.processed_directory,)
+    )
+    hit_list_parser = HitListParser(
+        results_directory=input_args.processed_directory,
+        include_coerced=input_args.include_coerced,
+        store=input_args.store,
+    )
+    coverage_index = CoverageIndex.from_hit_list_parser(hit_list_parser=hit_list_parser)
+    service = HitListService(coverage_index=coverage_index, cache_size=input_args.cache_size)
+    if input_args.stdio:
+        logger.info("Coverage index loaded (%s). Now reading requests from standard input." % (coverage_index,))
+        service.serve_stream(input_stream=sys.stdin, output_stream=sys.stdout)
+    else:
+        service.serve_http(host=input_args.host, port=input_args.port)
 
 
 def main():
@@ -135,18 +321,34 @@ def main():
     Handle the main software invocation.
     :return: None
     """
-    print_greeting()
     args = parse_arguments()
+    if not getattr(args, "stdio", False):
+        print_greeting()
     configure_logging(args.log_level)
+    ConfigManager.S3_ENDPOINT_URL = args.s3_endpoint_url
     start_time = datetime.now()
     logger.info(
         "Script invocation starting at time %s."
         % (start_time.strftime("%m/%d/%Y %H:%M:%S"))
     )
+    metrics_path = args.metrics_path
+    if metrics_path is None and args.profiler is not None:
+        metrics_path = ConfigManager.METRICS_FILE_NAME
+    profiler = None
+    if args.profiler is not None:
+        profiler = RunProfiler(profiler=args.profiler)
+        profiler.start()
+    interrupted = False
     try:
         args.func(args)
     except KeyboardInterrupt:
+        interrupted = True
         logger.warning("Keyboard interrupt received!")
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if metrics_path is not None:
+            write_metrics(metrics_path=metrics_path, interrupted=interrupted, profiler=profiler)
     end_time = datetime.now()
     elapsed = end_time - start_time
     logger.info(
@@ -180,6 +382,43 @@ def parse_arguments():
         default="DEBUG",
         type=str
     )
+    parser.add_argument(
+        "--s3-endpoint-url",
+        required=False,
+        help="The URL of an S3-compatible endpoint (ex: MinIO) to read s3:// results directories from instead "
+             "of AWS.",
+        action="store",
+        dest="s3_endpoint_url",
+        metavar="<endpoint URL>",
+        default=ConfigManager.S3_ENDPOINT_URL,
+        type=str
+    )
+    parser.add_argument(
+        "--metrics-out",
+        required=False,
+        help="The file to write a JSON report of run metrics to once the invocation finishes (including when it "
+             "is interrupted). The report contains per-stage timings, per-file read statistics, the number of URL "
+             "segments written for every server type, hit list timings, and peak memory usage.",
+        action="store",
+        dest="metrics_path",
+        metavar="<metrics file>",
+        default=None,
+        type=str
+    )
+    parser.add_argument(
+        "--profile",
+        required=False,
+        help="Profile the main process with the given profiler and include its top results in the metrics "
+             "report. If no metrics file is given, the report is written to %s. cProfile statistics are also "
+             "dumped next to the report with a %s suffix for use with pstats."
+             % (ConfigManager.METRICS_FILE_NAME, ConfigManager.PROFILE_DUMP_SUFFIX),
+        action="store",
+        dest="profiler",
+        metavar="<%s>" % ("|".join(PROFILERS),),
+        choices=PROFILERS,
+        default=None,
+        type=str
+    )
     results_parser = subparsers.add_parser(
         "process-results",
         help="Process the results retrieved via Hadoop from analyzing the contents of the Common Crawl "
@@ -190,7 +429,7 @@ def parse_arguments():
         "-r",
         required=True,
         help="The local file path to the directory that contains the Hadoop results file "
-             "(ex: part-00000, part-00001, etc).",
+             "(ex: part-00000, part-00001, etc), or an s3:// URL of the bucket or prefix that contains them.",
         action="store",
         dest="results_directory",
         type=str,
@@ -213,11 +452,12 @@ def parse_arguments():
         "--report-interval",
         "-v",
         required=False,
-        help="The interval upon which the Hadoop results processing should echo progress to the console.",
+        help="The number of seconds between reports of how far through the Hadoop results processing is, "
+             "including the throughput and the estimated time remaining. Set to 0 to disable progress reports.",
         action="store",
         dest="report_interval",
-        type=int,
-        metavar="<report interval>",
+        type=float,
+        metavar="<seconds>",
         default=ConfigManager.REPORT_INTERVAL,
     )
     results_parser.add_argument(
@@ -231,6 +471,141 @@ def parse_arguments():
         metavar="<output directory>",
         default=ConfigManager.OUTPUT_DIRECTORY,
     )
+    results_parser.add_argument(
+        "--max-open-files",
+        required=False,
+        help="The maximum number of processed result files to keep open at once while writing results.",
+        action="store",
+        dest="max_open_files",
+        type=int,
+        metavar="<max open files>",
+        default=ConfigManager.MAX_OPEN_FILES,
+    )
+    results_parser.add_argument(
+        "--no-aggregate",
+        required=False,
+        help="Process and write every Hadoop results file on its own instead of merging counts across all "
+             "results files before applying the ignore threshold.",
+        action="store_false",
+        dest="aggregate",
+        default=ConfigManager.AGGREGATE_RESULTS,
+    )
+    results_parser.add_argument(
+        "--workers",
+        "-w",
+        required=False,
+        help="The number of worker processes to aggregate Hadoop results files with.",
+        action="store",
+        dest="workers",
+        type=int,
+        metavar="<workers>",
+        default=ConfigManager.WORKER_COUNT,
+    )
+    results_parser.add_argument(
+        "--mmap",
+        required=False,
+        help="Scan Hadoop results files through a read-only memory map instead of reading them in blocks.",
+        action="store_true",
+        dest="use_mmap",
+        default=ConfigManager.USE_MMAP,
+    )
+    results_parser.add_argument(
+        "--memory-limit",
+        required=False,
+        help="The number of megabytes of counts to hold in memory while aggregating. Counts past the limit "
+             "are spilled to sorted files in the output directory and merged once every Hadoop results file "
+             "has been read. Every results file is processed when a limit is set. Use 0 for no limit.",
+        action="store",
+        dest="memory_limit",
+        type=float,
+        metavar="<megabytes>",
+        default=ConfigManager.MEMORY_LIMIT,
+    )
+    results_parser.add_argument(
+        "--ranked-output",
+        required=False,
+        help="Write every server type's URL segments sorted by descending count, preceded by a header, so "
+             "that hit list generation can stream them instead of loading and sorting them.",
+        action="store_true",
+        dest="ranked_output",
+        default=ConfigManager.RANKED_OUTPUT,
+    )
+    results_parser.add_argument(
+        "--output-format",
+        required=False,
+        help="The format to write every server type's URL segments in. The binary format can be memory "
+             "mapped by hit list generation instead of being parsed.",
+        action="store",
+        dest="output_format",
+        type=str,
+        choices=OUTPUT_FORMATS,
+        metavar="<text|binary>",
+        default=ConfigManager.OUTPUT_FORMAT,
+    )
+    results_parser.add_argument(
+        "--rebuild",
+        required=False,
+        help="Ignore the processing manifest in the output directory and process every Hadoop results file "
+             "from scratch. By default, only results files that are new or have changed since the last run "
+             "are processed.",
+        action="store_true",
+        dest="rebuild",
+        default=False,
+    )
+    results_parser.add_argument(
+        "--resume",
+        required=False,
+        help="Resume Hadoop results files that were partially processed by an interrupted run from their last "
+             "checkpoint instead of processing them from the start.",
+        action="store_true",
+        dest="resume",
+        default=False,
+    )
+    results_parser.add_argument(
+        "--checkpoint-interval",
+        required=False,
+        help="The number of bytes to read from a Hadoop results file between checkpoints. Use 0 to disable "
+             "checkpointing.",
+        action="store",
+        dest="checkpoint_interval",
+        type=int,
+        metavar="<checkpoint interval>",
+        default=ConfigManager.CHECKPOINT_INTERVAL,
+    )
+    results_parser.add_argument(
+        "--granularity",
+        required=False,
+        help="The granularity to aggregate server types at. The version granularity merges server types by "
+             "server family and version (ex: Apache/2.4.7), and the family granularity merges them by server "
+             "family (ex: Apache).",
+        action="store",
+        dest="granularity",
+        type=str,
+        choices=GRANULARITIES,
+        metavar="<exact|version|family>",
+        default=ConfigManager.SERVER_TYPE_GRANULARITY,
+    )
+    results_parser.add_argument(
+        "--family-rollup",
+        required=False,
+        help="Also write results merged by server family to the %s directory of the output directory, so that "
+             "hit lists are generated for every server family as well." % (ConfigManager.FAMILY_DIRECTORY_NAME,),
+        action="store_true",
+        dest="family_rollup",
+        default=ConfigManager.FAMILY_ROLLUP,
+    )
+    results_parser.add_argument(
+        "--store",
+        required=False,
+        help="Where processed results are stored. The sqlite store keeps every URL segment in a single indexed "
+             "SQLite database (%s) in the output directory." % (ConfigManager.SQLITE_DATABASE_NAME,),
+        action="store",
+        dest="store",
+        type=str,
+        choices=STORES,
+        metavar="<files|sqlite>",
+        default=ConfigManager.RESULT_STORE,
+    )
     results_parser.set_defaults(func=do_process_hadoop_results)
     hit_list_parser = subparsers.add_parser(
         "generate-hit-lists",
@@ -271,6 +646,59 @@ def parse_arguments():
         metavar="<hit_list_>",
         default=ConfigManager.HIT_LIST_FILE_PREAMBLE,
     )
+    hit_list_parser.add_argument(
+        "--engine",
+        required=False,
+        help="The engine to rank URL segments and find hit list thresholds with. The numpy engine requires "
+             "NumPy, and the auto engine uses NumPy when it is installed.",
+        action="store",
+        dest="engine",
+        type=str,
+        choices=HitListParser.ENGINES,
+        metavar="<auto|numpy|python>",
+        default=ConfigManager.HIT_LIST_ENGINE,
+    )
+    hit_list_parser.add_argument(
+        "--workers",
+        "-w",
+        required=False,
+        help="The number of worker processes to spread server types across while generating hit lists.",
+        action="store",
+        dest="workers",
+        type=int,
+        metavar="<workers>",
+        default=ConfigManager.WORKER_COUNT,
+    )
+    hit_list_parser.add_argument(
+        "--include-coerced",
+        required=False,
+        help="Include URL segments that contain coerced values (ex: [[INTEGER]]) in hit lists instead of "
+             "leaving them out.",
+        action="store_true",
+        dest="include_coerced",
+        default=ConfigManager.INCLUDE_COERCED,
+    )
+    hit_list_parser.add_argument(
+        "--coerced-hit-lists",
+        required=False,
+        help="Also generate hit lists made up of only the URL segments that contain coerced values, for "
+             "templated paths.",
+        action="store_true",
+        dest="coerced_hit_lists",
+        default=ConfigManager.COERCED_HIT_LISTS,
+    )
+    hit_list_parser.add_argument(
+        "--store",
+        required=False,
+        help="Where processed results are stored. The sqlite store keeps every URL segment in a single indexed "
+             "SQLite database (%s) in the processed results directory." % (ConfigManager.SQLITE_DATABASE_NAME,),
+        action="store",
+        dest="store",
+        type=str,
+        choices=STORES,
+        metavar="<files|sqlite>",
+        default=ConfigManager.RESULT_STORE,
+    )
     hit_list_parser.set_defaults(func=do_generate_hit_lists)
     do_all_parser = subparsers.add_parser(
         "do-all",
@@ -283,7 +711,7 @@ def parse_arguments():
         "-r",
         required=True,
         help="The local file path to the directory that contains the Hadoop results file "
-             "(ex: part-00000, part-00001, etc).",
+             "(ex: part-00000, part-00001, etc), or an s3:// URL of the bucket or prefix that contains them.",
         action="store",
         dest="results_directory",
         type=str,
@@ -306,11 +734,12 @@ def parse_arguments():
         "--report-interval",
         "-v",
         required=False,
-        help="The interval upon which the Hadoop results processing should echo progress to the console.",
+        help="The number of seconds between reports of how far through the Hadoop results processing is, "
+             "including the throughput and the estimated time remaining. Set to 0 to disable progress reports.",
         action="store",
         dest="report_interval",
-        type=int,
-        metavar="<report interval>",
+        type=float,
+        metavar="<seconds>",
         default=ConfigManager.REPORT_INTERVAL,
     )
     do_all_parser.add_argument(
@@ -324,6 +753,141 @@ def parse_arguments():
         metavar="<output directory>",
         default=ConfigManager.OUTPUT_DIRECTORY,
     )
+    do_all_parser.add_argument(
+        "--max-open-files",
+        required=False,
+        help="The maximum number of processed result files to keep open at once while writing results.",
+        action="store",
+        dest="max_open_files",
+        type=int,
+        metavar="<max open files>",
+        default=ConfigManager.MAX_OPEN_FILES,
+    )
+    do_all_parser.add_argument(
+        "--no-aggregate",
+        required=False,
+        help="Process and write every Hadoop results file on its own instead of merging counts across all "
+             "results files before applying the ignore threshold.",
+        action="store_false",
+        dest="aggregate",
+        default=ConfigManager.AGGREGATE_RESULTS,
+    )
+    do_all_parser.add_argument(
+        "--workers",
+        "-w",
+        required=False,
+        help="The number of worker processes to aggregate Hadoop results files and generate hit lists with.",
+        action="store",
+        dest="workers",
+        type=int,
+        metavar="<workers>",
+        default=ConfigManager.WORKER_COUNT,
+    )
+    do_all_parser.add_argument(
+        "--mmap",
+        required=False,
+        help="Scan Hadoop results files through a read-only memory map instead of reading them in blocks.",
+        action="store_true",
+        dest="use_mmap",
+        default=ConfigManager.USE_MMAP,
+    )
+    do_all_parser.add_argument(
+        "--memory-limit",
+        required=False,
+        help="The number of megabytes of counts to hold in memory while aggregating. Counts past the limit "
+             "are spilled to sorted files in the output directory and merged once every Hadoop results file "
+             "has been read. Every results file is processed when a limit is set. Use 0 for no limit.",
+        action="store",
+        dest="memory_limit",
+        type=float,
+        metavar="<megabytes>",
+        default=ConfigManager.MEMORY_LIMIT,
+    )
+    do_all_parser.add_argument(
+        "--ranked-output",
+        required=False,
+        help="Write every server type's URL segments sorted by descending count, preceded by a header, so "
+             "that hit list generation can stream them instead of loading and sorting them.",
+        action="store_true",
+        dest="ranked_output",
+        default=ConfigManager.RANKED_OUTPUT,
+    )
+    do_all_parser.add_argument(
+        "--output-format",
+        required=False,
+        help="The format to write every server type's URL segments in. The binary format can be memory "
+             "mapped by hit list generation instead of being parsed.",
+        action="store",
+        dest="output_format",
+        type=str,
+        choices=OUTPUT_FORMATS,
+        metavar="<text|binary>",
+        default=ConfigManager.OUTPUT_FORMAT,
+    )
+    do_all_parser.add_argument(
+        "--rebuild",
+        required=False,
+        help="Ignore the processing manifest in the output directory and process every Hadoop results file "
+             "from scratch. By default, only results files that are new or have changed since the last run "
+             "are processed.",
+        action="store_true",
+        dest="rebuild",
+        default=False,
+    )
+    do_all_parser.add_argument(
+        "--resume",
+        required=False,
+        help="Resume Hadoop results files that were partially processed by an interrupted run from their last "
+             "checkpoint instead of processing them from the start.",
+        action="store_true",
+        dest="resume",
+        default=False,
+    )
+    do_all_parser.add_argument(
+        "--checkpoint-interval",
+        required=False,
+        help="The number of bytes to read from a Hadoop results file between checkpoints. Use 0 to disable "
+             "checkpointing.",
+        action="store",
+        dest="checkpoint_interval",
+        type=int,
+        metavar="<checkpoint interval>",
+        default=ConfigManager.CHECKPOINT_INTERVAL,
+    )
+    do_all_parser.add_argument(
+        "--granularity",
+        required=False,
+        help="The granularity to aggregate server types at. The version granularity merges server types by "
+             "server family and version (ex: Apache/2.4.7), and the family granularity merges them by server "
+             "family (ex: Apache).",
+        action="store",
+        dest="granularity",
+        type=str,
+        choices=GRANULARITIES,
+        metavar="<exact|version|family>",
+        default=ConfigManager.SERVER_TYPE_GRANULARITY,
+    )
+    do_all_parser.add_argument(
+        "--family-rollup",
+        required=False,
+        help="Also write results merged by server family to the %s directory of the output directory, so that "
+             "hit lists are generated for every server family as well." % (ConfigManager.FAMILY_DIRECTORY_NAME,),
+        action="store_true",
+        dest="family_rollup",
+        default=ConfigManager.FAMILY_ROLLUP,
+    )
+    do_all_parser.add_argument(
+        "--store",
+        required=False,
+        help="Where processed results are stored. The sqlite store keeps every URL segment in a single indexed "
+             "SQLite database (%s) in the output directory." % (ConfigManager.SQLITE_DATABASE_NAME,),
+        action="store",
+        dest="store",
+        type=str,
+        choices=STORES,
+        metavar="<files|sqlite>",
+        default=ConfigManager.RESULT_STORE,
+    )
     do_all_parser.add_argument(
         "--thresholds",
         "-t",
@@ -348,10 +912,190 @@ def parse_arguments():
         metavar="<hit_list_>",
         default=ConfigManager.HIT_LIST_FILE_PREAMBLE,
     )
+    do_all_parser.add_argument(
+        "--engine",
+        required=False,
+        help="The engine to rank URL segments and find hit list thresholds with. The numpy engine requires "
+             "NumPy, and the auto engine uses NumPy when it is installed.",
+        action="store",
+        dest="engine",
+        type=str,
+        choices=HitListParser.ENGINES,
+        metavar="<auto|numpy|python>",
+        default=ConfigManager.HIT_LIST_ENGINE,
+    )
+    do_all_parser.add_argument(
+        "--include-coerced",
+        required=False,
+        help="Include URL segments that contain coerced values (ex: [[INTEGER]]) in hit lists instead of "
+             "leaving them out.",
+        action="store_true",
+        dest="include_coerced",
+        default=ConfigManager.INCLUDE_COERCED,
+    )
+    do_all_parser.add_argument(
+        "--coerced-hit-lists",
+        required=False,
+        help="Also generate hit lists made up of only the URL segments that contain coerced values, for "
+             "templated paths.",
+        action="store_true",
+        dest="coerced_hit_lists",
+        default=ConfigManager.COERCED_HIT_LISTS,
+    )
+    do_all_parser.add_argument(
+        "--fused",
+        required=False,
+        help="Generate hit lists straight from the aggregated counts of every server type instead of writing "
+             "processed results out and reading them back. Processed results are written in the background.",
+        action="store_true",
+        dest="fused",
+        default=ConfigManager.FUSED_PIPELINE,
+    )
+    do_all_parser.add_argument(
+        "--no-intermediate",
+        required=False,
+        help="When fused, do not write processed results at all. Only hit lists and the processing manifest "
+             "are written, so generate-hit-lists can not be run against the output directory afterwards.",
+        action="store_false",
+        dest="persist_results",
+        default=True,
+    )
     do_all_parser.set_defaults(func=do_all)
+    convert_parser = subparsers.add_parser(
+        "convert-segments",
+        help="Convert the URL segments files of all processed server types between the text and binary formats.",
+    )
+    convert_parser.add_argument(
+        "--processed-directory",
+        "-p",
+        required=False,
+        help="The directory where the results of processing Hadoop results reside.",
+        action="store",
+        dest="processed_directory",
+        type=str,
+        metavar="<processed directory>",
+        default=ConfigManager.OUTPUT_DIRECTORY,
+    )
+    convert_parser.add_argument(
+        "--to",
+        required=True,
+        help="The format to convert URL segments files to.",
+        action="store",
+        dest="output_format",
+        type=str,
+        choices=OUTPUT_FORMATS,
+        metavar="<text|binary>",
+    )
+    convert_parser.set_defaults(func=do_convert_segments)
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Answer requests for hit lists at any coverage threshold, or for the top URL segments of a server "
+             "type, over HTTP or standard input and output.",
+    )
+    serve_parser.add_argument(
+        "--processed-directory",
+        "-p",
+        required=False,
+        help="The directory where the results of processing Hadoop results reside.",
+        action="store",
+        dest="processed_directory",
+        type=str,
+        metavar="<processed directory>",
+        default=ConfigManager.OUTPUT_DIRECTORY,
+    )
+    serve_parser.add_argument(
+        "--include-coerced",
+        required=False,
+        help="Include URL segments that contain coerced values (ex: [[INTEGER]]) in hit lists instead of "
+             "leaving them out.",
+        action="store_true",
+        dest="include_coerced",
+        default=ConfigManager.INCLUDE_COERCED,
+    )
+    serve_parser.add_argument(
+        "--store",
+        required=False,
+        help="Where processed results are stored. The sqlite store keeps every URL segment in a single indexed "
+             "SQLite database (%s) in the processed results directory." % (ConfigManager.SQLITE_DATABASE_NAME,),
+        action="store",
+        dest="store",
+        type=str,
+        choices=STORES,
+        metavar="<files|sqlite>",
+        default=ConfigManager.RESULT_STORE,
+    )
+    serve_parser.add_argument(
+        "--host",
+        required=False,
+        help="The host to listen for HTTP requests on.",
+        action="store",
+        dest="host",
+        type=str,
+        metavar="<host>",
+        default=ConfigManager.SERVICE_HOST,
+    )
+    serve_parser.add_argument(
+        "--port",
+        required=False,
+        help="The port to listen for HTTP requests on.",
+        action="store",
+        dest="port",
+        type=int,
+        metavar="<port>",
+        default=ConfigManager.SERVICE_PORT,
+    )
+    serve_parser.add_argument(
+        "--cache-size",
+        required=False,
+        help="The number of rendered responses to keep in the response cache.",
+        action="store",
+        dest="cache_size",
+        type=int,
+        metavar="<cache size>",
+        default=ConfigManager.SERVICE_CACHE_SIZE,
+    )
+    serve_parser.add_argument(
+        "--stdio",
+        required=False,
+        help="Read requests from standard input, one per line, and write responses to standard output instead "
+             "of serving them over HTTP.",
+        action="store_true",
+        dest="stdio",
+        default=False,
+    )
+    serve_parser.set_defaults(func=do_serve)
     return parser.parse_args()
 
 
+def warn_about_aggregate_only_options(input_args):
+    """
+    Log a warning for every option that only applies when aggregating results (see AGGREGATE_ONLY_OPTIONS) if
+    it is used without aggregating results.
+    :param input_args: Arguments retrieved through parsing command line input.
+    :return: None
+    """
+    if input_args.aggregate:
+        return
+    for destination, unused_value, warning in AGGREGATE_ONLY_OPTIONS:
+        if getattr(input_args, destination) != unused_value:
+            logger.warning(warning)
+
+
+def write_metrics(metrics_path=None, interrupted=False, profiler=None):
+    """
+    Write the metrics collected during this invocation, and the results of the given profiler, to the
+    referenced file.
+    :param metrics_path: The file to write the metrics report to.
+    :param interrupted: Whether or not the invocation was interrupted before it finished.
+    :param profiler: The RunProfiler that profiled this invocation, or None.
+    :return: None
+    """
+    get_run_metrics().write_report(file_path=metrics_path, interrupted=interrupted, profiler=profiler)
+    if profiler is not None:
+        profiler.dump(file_path="%s%s" % (metrics_path, ConfigManager.PROFILE_DUMP_SUFFIX))
+    logger.info("Run metrics written to %s." % (metrics_path,))
+
+
 def print_greeting():
     """
     Print a colorized splash screen to welcome all the peeps.